@@ -0,0 +1,124 @@
+"""Time every pipeline stage on synthetic corpora and report machine-readable JSON.
+
+Each corpus size runs in a fresh subprocess so the reported peak RSS belongs to
+that size alone. Example::
+
+    PYTHONPATH=src python benchmarks/bench_pipeline.py --sizes 10000 100000 1000000 \
+        --questions 200 --out benchmarks/results.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+from bio_rag.config import load_config
+from bio_rag.dataset import parse_dataset
+from bio_rag.evaluation import evaluate_run
+from bio_rag.instrumentation import Instrumentation
+from bio_rag.pico import extract_pico_batch, pico_mismatch_scores
+from bio_rag.retrieval import build_bm25, retrieve_top_k
+from bio_rag.snippets import build_candidate_snippets, score_snippets, select_top_snippets
+from bio_rag.stressors import detect_conflicts, inject_noise, remove_supporting_snippets
+
+from synthetic import SyntheticCorpus, generate_questions
+
+
+def bench_size(n_docs: int, n_questions: int, config: Dict[str, Any], seed: int) -> Dict[str, Any]:
+    inst = Instrumentation(enabled=True)
+    with inst.stage("generate"):
+        synthetic = SyntheticCorpus(n_docs, seed=seed)
+        corpus = list(synthetic)
+        questions = parse_dataset(generate_questions(synthetic, n_questions, seed + 1), keep_raw=False)
+    with inst.stage("index_build"):
+        bm25, _ = build_bm25(corpus, config["retrieval"]["bm25_k1"], config["retrieval"]["bm25_b"])
+
+    predictions = []
+    pico_cache: Dict[str, Dict[str, str]] = {}
+    for question in questions:
+        with inst.question():
+            with inst.stage("retrieval"):
+                retrieved = retrieve_top_k(question["body"], corpus, bm25, config["retrieval"]["top_k"])
+            with inst.stage("snippet_candidates"):
+                candidates = build_candidate_snippets(retrieved, config["snippets"]["max_sentences_per_doc"])
+            with inst.stage("snippet_scoring"):
+                scored = score_snippets(question["body"], candidates)
+            with inst.stage("snippet_selection"):
+                selected = select_top_snippets(scored, config["snippets"]["snippet_k"], config["snippets"]["mmr_lambda"])
+        with inst.stage("stressor_noise"):
+            inject_noise(retrieved, corpus, config["stressors"]["noise"]["distractor_k"])
+        with inst.stage("stressor_conflict"):
+            detect_conflicts(selected, config["stressors"]["conflict"]["similarity_threshold"])
+        with inst.stage("stressor_unanswerable"):
+            remove_supporting_snippets(selected, config["stressors"]["unanswerable"]["remove_top_n"])
+        with inst.stage("stressor_pico_mismatch"):
+            question_pico = extract_pico_batch([question["body"]], cache=pico_cache)[0]
+            snippet_picos = extract_pico_batch([s["sentence"] for s in selected], cache=pico_cache)
+            pico_mismatch_scores(question_pico, snippet_picos)
+        predictions.append(
+            {"question_id": question["id"], "retrieved_pmids": [d["pmid"] for d in retrieved], "snippets": selected}
+        )
+
+    with inst.stage("evaluation"):
+        evaluate_run(questions, predictions)
+
+    summary = inst.summary()
+    stages = {}
+    for name, stats in summary["stages"].items():
+        items = n_docs if name in ("generate", "index_build") else stats["calls"]
+        stages[name] = {**stats, "throughput_per_s": items / stats["total_s"] if stats["total_s"] else None}
+    stages["evaluation"]["throughput_per_s"] = n_questions / stages["evaluation"]["total_s"]
+    return {
+        "docs": n_docs,
+        "questions": n_questions,
+        "postings": int(len(bm25.doc_ids)),
+        "vocabulary": len(bm25.vocab),
+        "stages": stages,
+        "latency": summary["latency"],
+        "peak_rss_mb": summary["peak_rss_mb"],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--out", default=None, help="Write results JSON here (default: stdout)")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        result = bench_size(args.sizes[0], args.questions, load_config(args.config), args.seed)
+        json.dump(result, sys.stdout)
+        return 0
+
+    results: List[Dict[str, Any]] = []
+    for size in args.sizes:
+        command = [sys.executable, __file__, "--single", "--sizes", str(size), "--questions", str(args.questions)]
+        command += ["--seed", str(args.seed)] + (["--config", args.config] if args.config else [])
+        print(f"benchmarking {size} docs", file=sys.stderr)
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output))
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
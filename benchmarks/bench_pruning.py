@@ -0,0 +1,125 @@
+"""Compare dynamic-pruning top-k retrieval with exhaustive BM25 scoring.
+
+For every corpus size and ``top_k`` the same questions are ranked both ways;
+rankings and scores must be identical, and the report gives per-query latency
+and the speedup of the pruned path. Example::
+
+    PYTHONPATH=src python benchmarks/bench_pruning.py --sizes 100000 1000000 \
+        --questions 300 --top-k 1 10 100 --out benchmarks/pruning.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from bio_rag.config import load_config
+from bio_rag.retrieval import build_bm25
+
+from synthetic import SyntheticCorpus, generate_questions
+
+
+def time_queries(bm25, queries: Sequence[np.ndarray], top_k: int, pruning: bool):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(bm25.top_k(query, top_k, pruning=pruning))
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000.0, results
+
+
+def bench_size(n_docs: int, n_questions: int, top_k_values: Sequence[int], config: Dict[str, Any], seed: int):
+    synthetic = SyntheticCorpus(n_docs, seed=seed)
+    build_start = time.perf_counter()
+    bm25, _ = build_bm25(list(synthetic), config["retrieval"]["bm25_k1"], config["retrieval"]["bm25_b"])
+    build_s = time.perf_counter() - build_start
+    bounds_start = time.perf_counter()
+    bounds = bm25.bounds
+    bounds_s = time.perf_counter() - bounds_start
+    queries = [bm25.vocab.encode_text(q["body"]) for q in generate_questions(synthetic, n_questions, seed + 1)]
+
+    runs = []
+    for top_k in top_k_values:
+        exhaustive_ms, exhaustive = time_queries(bm25, queries, top_k, pruning=False)
+        pruned_ms, pruned = time_queries(bm25, queries, top_k, pruning=True)
+        mismatches = sum(
+            not (np.array_equal(a_rows, b_rows) and np.array_equal(a_scores, b_scores))
+            for (a_rows, a_scores), (b_rows, b_scores) in zip(exhaustive, pruned)
+        )
+        runs.append(
+            {
+                "top_k": top_k,
+                "exhaustive_ms": {"mean": float(exhaustive_ms.mean()), "p95": float(np.percentile(exhaustive_ms, 95))},
+                "pruned_ms": {"mean": float(pruned_ms.mean()), "p95": float(np.percentile(pruned_ms, 95))},
+                "speedup": float(exhaustive_ms.sum() / pruned_ms.sum()),
+                "mismatches": int(mismatches),
+            }
+        )
+    return {
+        "docs": n_docs,
+        "questions": n_questions,
+        "postings": int(len(bm25.doc_ids)),
+        "block_size": bm25.block_size,
+        "block_entries": int(len(bounds.block_ids)),
+        "index_build_s": build_s,
+        "bounds_build_s": bounds_s,
+        "runs": runs,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--questions", type=int, default=300)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--out", default=None, help="Write results JSON here (default: stdout)")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        result = bench_size(args.sizes[0], args.questions, args.top_k, load_config(args.config), args.seed)
+        json.dump(result, sys.stdout)
+        return 0
+
+    results: List[Dict[str, Any]] = []
+    for size in args.sizes:
+        command = [sys.executable, __file__, "--single", "--sizes", str(size), "--questions", str(args.questions)]
+        command += ["--top-k", *map(str, args.top_k), "--seed", str(args.seed)]
+        command += ["--config", args.config] if args.config else []
+        print(f"benchmarking {size} docs", file=sys.stderr)
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output)
+        for run in result["runs"]:
+            print(
+                f"  top_k={run['top_k']}: exhaustive {run['exhaustive_ms']['mean']:.2f} ms, "
+                f"pruned {run['pruned_ms']['mean']:.2f} ms, speedup {run['speedup']:.2f}x, "
+                f"mismatches {run['mismatches']}",
+                file=sys.stderr,
+            )
+        results.append(result)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Deterministic synthetic BioASQ-style datasets and PubMed-like corpora.
+
+Token frequencies follow a Zipf law over a fixed vocabulary whose head is made of
+common biomedical words, so postings lengths and IDF spread resemble PubMed.
+Abstracts have 6-14 sentences of roughly 10-40 tokens. Everything is derived from
+``seed``, so two runs with the same arguments produce identical data.
+
+Run as a script to write ``dataset.json``, ``corpus.jsonl`` and a
+``pubmed_cache.sqlite`` that the pipeline scripts can consume offline.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+HEAD_WORDS = (
+    "the of and in to with a for was were patients treatment study results is by that on as "
+    "from at or be this are an effect clinical cells disease risk therapy analysis group expression "
+    "associated protein cancer compared increased levels significantly observed response mice gene "
+    "children adults women men subjects participants trial randomized placebo dose drug survival "
+    "mortality outcome tumor receptor mutation kinase inhibitor insulin diabetes cohort infection"
+).split()
+
+SYLLABLES = (
+    "ab ac ad al am an ar as at ba be bi bo ca ce ci co cy da de di do du el em en er es ex "
+    "fa fe fi fo ga ge gi go ha he hi ho id il im in ir is ka ke ki ko la le li lo lu ly ma me "
+    "mi mo mu my na ne ni no nu ob oc ol om on op or os ox pa pe pi po pu ra re ri ro ru sa se "
+    "si so su ta te ti to tu ty ul um un ur us va ve vi vo xa xe xi yl za ze zi zo"
+).split()
+
+
+def build_vocabulary(size: int, seed: int = 0) -> List[str]:
+    rng = np.random.default_rng(seed)
+    words = list(HEAD_WORDS)
+    seen = set(words)
+    while len(words) < size:
+        n_syllables = int(rng.integers(2, 5))
+        word = "".join(SYLLABLES[int(i)] for i in rng.integers(0, len(SYLLABLES), n_syllables))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words[:size]
+
+
+def zipf_cdf(size: int, exponent: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    return np.cumsum(weights / weights.sum())
+
+
+class SyntheticCorpus:
+    """Generate PubMed-like documents on demand without materializing the corpus."""
+
+    def __init__(
+        self,
+        n_docs: int,
+        seed: int = 13,
+        vocab_size: int = 50000,
+        zipf_exponent: float = 1.07,
+        first_pmid: int = 10000000,
+    ) -> None:
+        self.n_docs = n_docs
+        self.seed = seed
+        self.vocab = build_vocabulary(vocab_size, seed)
+        self.cdf = zipf_cdf(vocab_size, zipf_exponent)
+        self.first_pmid = first_pmid
+
+    def pmid(self, idx: int) -> str:
+        return str(self.first_pmid + idx * 3)
+
+    def document(self, idx: int) -> Dict[str, str]:
+        rng = np.random.default_rng([self.seed, idx])
+        n_sentences = int(rng.integers(6, 15)) + 1
+        lengths = np.clip(rng.lognormal(3.0, 0.35, n_sentences), 6, 60).astype(np.int64)
+        ids = np.minimum(np.searchsorted(self.cdf, rng.random(int(lengths.sum()))), len(self.vocab) - 1)
+        words = [self.vocab[i] for i in ids.tolist()]
+        sentences = []
+        start = 0
+        for length in lengths.tolist():
+            sentences.append(" ".join(words[start : start + length]).capitalize() + ".")
+            start += length
+        title, abstract = sentences[0], " ".join(sentences[1:])
+        return {
+            "pmid": self.pmid(idx),
+            "title": title,
+            "abstract": abstract,
+            "text": f"{title} {abstract}",
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        for idx in range(self.n_docs):
+            yield self.document(idx)
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+
+def generate_questions(corpus: SyntheticCorpus, n_questions: int, seed: int = 29) -> List[Dict[str, object]]:
+    """Questions whose bodies paraphrase sentences of 1-5 gold documents."""
+    rng = np.random.default_rng(seed)
+    questions = []
+    for qid in range(n_questions):
+        gold_idx = rng.choice(corpus.n_docs, size=int(rng.integers(1, 6)), replace=False)
+        gold_docs = [corpus.document(int(idx)) for idx in gold_idx]
+        sentences = [doc["abstract"].split(". ")[0].rstrip(".") for doc in gold_docs]
+        words = " ".join(sentences).split()
+        keep = rng.choice(len(words), size=min(len(words), int(rng.integers(6, 16))), replace=False)
+        body = " ".join(words[int(i)] for i in sorted(keep)).capitalize() + "?"
+        questions.append(
+            {
+                "id": f"synthetic_{qid:06d}",
+                "body": body,
+                "type": "factoid",
+                "documents": [f"http://www.ncbi.nlm.nih.gov/pubmed/{doc['pmid']}" for doc in gold_docs],
+                "snippets": [
+                    {"document": f"http://www.ncbi.nlm.nih.gov/pubmed/{doc['pmid']}", "text": sentence + "."}
+                    for doc, sentence in zip(gold_docs, sentences)
+                ],
+                "exact_answer": words[0],
+                "ideal_answer": sentences[0] + ".",
+            }
+        )
+    return questions
+
+
+def write_synthetic(out_dir: Path, n_docs: int, n_questions: int, seed: int) -> None:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    corpus = SyntheticCorpus(n_docs, seed=seed)
+    with open(out_dir / "dataset.json", "w", encoding="utf-8") as handle:
+        json.dump({"questions": generate_questions(corpus, n_questions, seed + 1)}, handle)
+    with sqlite3.connect(out_dir / "pubmed_cache.sqlite") as conn, open(
+        out_dir / "corpus.jsonl", "w", encoding="utf-8"
+    ) as handle:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS pubmed (pmid TEXT PRIMARY KEY, title TEXT, abstract TEXT, text TEXT)"
+        )
+        batch = []
+        for doc in corpus:
+            handle.write(json.dumps(doc) + "\n")
+            batch.append((doc["pmid"], doc["title"], doc["abstract"], doc["text"]))
+            if len(batch) >= 10000:
+                conn.executemany("INSERT OR REPLACE INTO pubmed VALUES (?, ?, ?, ?)", batch)
+                batch = []
+        conn.executemany("INSERT OR REPLACE INTO pubmed VALUES (?, ?, ?, ?)", batch)
+        conn.commit()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out-dir", required=True)
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+    write_synthetic(Path(args.out_dir), args.docs, args.questions, args.seed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
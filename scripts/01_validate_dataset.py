@@ -6,8 +6,8 @@ import logging
 import sys
 
 from bio_rag.config import load_config
-from bio_rag.dataset import parse_dataset
-from bio_rag.utils import read_json, setup_logging
+from bio_rag.dataset import iter_dataset
+from bio_rag.utils import setup_logging
 
 LOGGER = logging.getLogger(__name__)
 
@@ -21,15 +21,18 @@ def main() -> int:
     config = load_config(args.config)
     setup_logging(config.get("logging", {}).get("level", "INFO"))
 
-    raw = read_json(args.dataset)
-    questions = parse_dataset(raw)
-    if not questions:
+    total = 0
+    missing = 0
+    for question in iter_dataset(args.dataset):
+        total += 1
+        if not question.get("id") or not question.get("body"):
+            missing += 1
+    if not total:
         LOGGER.error("No questions found in dataset")
         return 1
-    missing = [q for q in questions if not q.get("id") or not q.get("body")]
     if missing:
-        LOGGER.warning("%s questions missing id/body", len(missing))
-    LOGGER.info("Dataset looks valid with %s questions", len(questions))
+        LOGGER.warning("%s questions missing id/body", missing)
+    LOGGER.info("Dataset looks valid with %s questions", total)
     return 0
 
 
@@ -6,8 +6,9 @@ import logging
 import sys
 
 from bio_rag.config import load_config
-from bio_rag.dataset import extract_gold_pmids, parse_dataset
-from bio_rag.utils import read_json, setup_logging, write_json
+from bio_rag.dataset import extract_gold_pmids, iter_dataset
+from bio_rag.manifest import is_up_to_date, stage_manifest, write_manifest
+from bio_rag.utils import setup_logging, write_json
 
 LOGGER = logging.getLogger(__name__)
 
@@ -17,14 +18,19 @@ def main() -> int:
     parser.add_argument("--dataset", required=True)
     parser.add_argument("--out", required=True)
     parser.add_argument("--config", default=None)
+    parser.add_argument("--force", action="store_true", help="Rebuild even if inputs are unchanged")
     args = parser.parse_args()
 
     config = load_config(args.config)
     setup_logging(config.get("logging", {}).get("level", "INFO"))
 
-    questions = parse_dataset(read_json(args.dataset))
-    pmids = extract_gold_pmids(questions)
+    manifest = stage_manifest("gold_pmids", {"dataset": args.dataset}, modules=["dataset", "utils"])
+    if not args.force and is_up_to_date(args.out, manifest):
+        LOGGER.info("%s is up to date; skipping", args.out)
+        return 0
+    pmids = extract_gold_pmids(iter_dataset(args.dataset))
     write_json(args.out, pmids)
+    write_manifest(args.out, manifest)
     LOGGER.info("Saved PMIDs to %s", args.out)
     return 0
 
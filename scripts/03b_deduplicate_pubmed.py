@@ -0,0 +1,39 @@
+"""Mark near-duplicate PubMed records and corpus sentences with MinHash/LSH."""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+
+from bio_rag.config import load_config
+from bio_rag.dedup import deduplicate_pubmed
+from bio_rag.utils import setup_logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", required=True, help="PubMed cache SQLite; duplicate tables are stored alongside")
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--workers", type=int, default=None, help="Signature processes (default: dedup.workers)")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    setup_logging(config.get("logging", {}).get("level", "INFO"))
+
+    workers = args.workers or config["dedup"].get("workers", 1)
+    counts = deduplicate_pubmed(args.db, config, workers=workers)
+    LOGGER.info(
+        "%s/%s records and %s/%s sentences marked as duplicates in %s",
+        counts["duplicate_records"],
+        counts["records"],
+        counts["duplicate_sentences"],
+        counts["sentences"],
+        args.db,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
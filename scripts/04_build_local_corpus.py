@@ -3,10 +3,15 @@ from __future__ import annotations
 
 import argparse
 import logging
+import sqlite3
 import sys
+from pathlib import Path
 
 from bio_rag.config import load_config
-from bio_rag.corpus import build_corpus_from_cache
+from bio_rag.corpus import build_corpus_from_cache, new_records_from_cache
+from bio_rag.dedup import load_canonical_pmids
+from bio_rag.manifest import is_up_to_date, sqlite_table_sha256, stage_manifest, write_manifest
+from bio_rag.segments import append_segment, corpus_pmids
 from bio_rag.utils import setup_logging
 
 LOGGER = logging.getLogger(__name__)
@@ -17,12 +22,46 @@ def main() -> int:
     parser.add_argument("--db", required=True)
     parser.add_argument("--out", required=True)
     parser.add_argument("--config", default=None)
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the PubMed cache is unchanged")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Append records not yet in --out and index them as a delta segment instead of rebuilding",
+    )
     args = parser.parse_args()
 
     config = load_config(args.config)
     setup_logging(config.get("logging", {}).get("level", "INFO"))
 
-    build_corpus_from_cache(args.db, args.out)
+    dedup = config.get("dedup", {}).get("enabled", False)
+    if args.incremental and Path(args.out).exists():
+        # Only new records are read in full: known PMIDs come from the index's PMID list, and neither the PubMed
+        # cache nor the corpus is hashed, so the corpus manifest goes stale and the next full run rebuilds.
+        # Records changed in place are not detected, and duplicates of records already in the corpus are
+        # skipped without being listed on them; rebuild without --incremental to pick either up.
+        canonical = load_canonical_pmids(args.db) if dedup else {}
+        docs = new_records_from_cache(args.db, corpus_pmids(args.out) | set(canonical))
+        LOGGER.info("%s new records for %s", len(docs), args.out)
+        append_segment(args.out, docs)
+        return 0
+
+    # Hash only the tables read here: 04b_annotate_pico.py writes to the same database.
+    input_hashes = {"pubmed": sqlite_table_sha256(args.db, "pubmed", ["pmid", "title", "abstract", "text"], "pmid")}
+    canonical = {}
+    if dedup:
+        try:
+            columns = ["pmid", "canonical_pmid"]
+            input_hashes["pubmed_duplicates"] = sqlite_table_sha256(args.db, "pubmed_duplicates", columns, "pmid")
+        except sqlite3.OperationalError:
+            LOGGER.info("No pubmed_duplicates table; run 03b_deduplicate_pubmed.py to drop near-duplicates")
+        else:
+            canonical = load_canonical_pmids(args.db)
+    manifest = stage_manifest("corpus", {}, modules=["corpus", "utils"], input_hashes=input_hashes)
+    if not args.force and is_up_to_date(args.out, manifest):
+        LOGGER.info("%s is up to date; skipping", args.out)
+        return 0
+    build_corpus_from_cache(args.db, args.out, canonical)
+    write_manifest(args.out, manifest)
     return 0
 
 
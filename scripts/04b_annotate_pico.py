@@ -0,0 +1,49 @@
+"""Precompute PICO annotations for every corpus sentence."""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+
+from bio_rag.config import load_config
+from bio_rag.corpus import iter_corpus_sentences, load_corpus
+from bio_rag.llm import client_from_config
+from bio_rag.pico import annotate_corpus_pico
+from bio_rag.utils import load_env, safe_get_env, setup_logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", required=True, help="PubMed cache SQLite; annotations are stored alongside")
+    parser.add_argument("--corpus", required=True)
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--llm", action="store_true", help="Annotate with the LLM instead of the heuristic")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    setup_logging(config.get("logging", {}).get("level", "INFO"))
+    load_env()
+
+    client = None
+    if args.llm:
+        client = client_from_config(config, safe_get_env("OPENAI_API_KEY"))
+        if not client:
+            LOGGER.error("OPENAI_API_KEY must be set for --llm")
+            return 1
+
+    corpus = load_corpus(args.corpus)
+    sentences = iter_corpus_sentences(corpus, config["snippets"]["max_sentences_per_doc"])
+    try:
+        annotate_corpus_pico(args.db, sentences, client=client, workers=args.workers)
+    finally:
+        if client:
+            client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""Index every corpus sentence for corpus-wide snippet retrieval."""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+
+from bio_rag.config import load_config
+from bio_rag.corpus import load_corpus
+from bio_rag.passages import load_or_build_sentence_index
+from bio_rag.utils import setup_logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", required=True)
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the corpus is unchanged")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    setup_logging(config.get("logging", {}).get("level", "INFO"))
+    params = config["snippets"].get("sentence_index", {})
+
+    corpus = load_corpus(args.corpus)
+    sentences = load_or_build_sentence_index(
+        corpus,
+        args.corpus,
+        config["snippets"]["max_sentences_per_doc"],
+        params.get("bm25_k1", 1.2),
+        params.get("bm25_b", 0.75),
+        args.force,
+    )
+    LOGGER.info("%s sentences from %s docs", sentences.n_sentences, len(corpus))
+    if not params.get("enabled", False):
+        LOGGER.info("Set snippets.sentence_index.enabled in the config to use it for snippet selection")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,12 +6,19 @@ import logging
 import sys
 from pathlib import Path
 
+from bio_rag.cache import cache_from_config
 from bio_rag.config import load_config
 from bio_rag.corpus import load_corpus
-from bio_rag.dataset import parse_dataset
-from bio_rag.retrieval import build_bm25, retrieve_top_k
-from bio_rag.snippets import build_candidate_snippets, score_snippets, select_top_snippets
-from bio_rag.utils import ensure_dir, read_json, setup_logging, timestamp_run_id, write_json
+from bio_rag.dataset import iter_dataset
+from bio_rag.instrumentation import Instrumentation, profiled
+from bio_rag.manifest import find_completed_run, resumable
+from bio_rag.passages import sentence_index_from_config
+from bio_rag.pipeline import finish_run_manifest, run_baseline, run_manifest
+from bio_rag.retrieval import Retriever, load_or_build_bm25
+from bio_rag.runs import RunWriter
+from bio_rag.service import RetrievalClient
+from bio_rag.shards import sharded_retriever_from_config
+from bio_rag.utils import ensure_dir, setup_logging, timestamp_run_id
 
 LOGGER = logging.getLogger(__name__)
 
@@ -19,40 +26,77 @@ LOGGER = logging.getLogger(__name__)
 def main() -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument("--dataset", required=True)
-    parser.add_argument("--corpus", required=True)
+    parser.add_argument("--corpus", default=None)
+    parser.add_argument("--server", default=None, help="Retrieval service address (http://host:port or unix:/path)")
+    parser.add_argument("--shards", default=None, help="Shard directory from 10_build_shards.py; queries shard workers")
     parser.add_argument("--config", default=None)
     parser.add_argument("--run_id", default=None)
+    parser.add_argument("--resume", default=None, metavar="RUN_ID", help="Resume an interrupted run, skipping finished questions")
+    parser.add_argument("--profile", action="store_true", help="Write cProfile stats to the run directory")
+    parser.add_argument("--trace-memory", action="store_true", help="Record tracemalloc peak memory per stage")
+    parser.add_argument("--force", action="store_true", help="Run even if an identical completed run exists")
     args = parser.parse_args()
+    if not (args.corpus or args.server or args.shards):
+        parser.error("one of --corpus, --server or --shards is required")
 
     config = load_config(args.config)
     setup_logging(config.get("logging", {}).get("level", "INFO"))
 
-    questions = parse_dataset(read_json(args.dataset))
-    corpus = load_corpus(args.corpus)
+    runs_dir = Path(config["paths"]["runs_dir"])
+    # Runs served by a retrieval service or shard workers cannot be fingerprinted by corpus.
+    remote = args.server or args.shards
+    manifest = run_manifest("baseline", args.dataset, args.corpus, config) if not remote else None
+    if manifest and not (args.force or args.resume or args.run_id):
+        existing = find_completed_run(runs_dir, manifest)
+        if existing:
+            LOGGER.info("Baseline inputs unchanged; reusing %s (pass --force to rerun)", existing)
+            return 0
 
-    bm25, _ = build_bm25(corpus, config["retrieval"]["bm25_k1"], config["retrieval"]["bm25_b"])
-
-    run_id = args.run_id or timestamp_run_id("baseline")
-    run_dir = Path(config["paths"]["runs_dir"]) / run_id
+    run_id = args.resume or args.run_id or timestamp_run_id("baseline")
+    run_dir = runs_dir / run_id
+    if args.resume and manifest and not resumable(run_dir, manifest):
+        LOGGER.error("Cannot resume %s: it was started with different inputs, config or code", run_id)
+        return 1
     ensure_dir(run_dir)
+    inst = Instrumentation(config.get("instrumentation", {}).get("enabled", True), args.trace_memory)
+
+    cache = None
+    with profiled(run_dir / "profile.pstats" if args.profile else None):
+        if args.server:
+            retriever = RetrievalClient(args.server)
+        elif args.shards:
+            retriever = sharded_retriever_from_config(args.shards, config)
+        else:
+            with inst.stage("load_corpus"):
+                corpus = load_corpus(args.corpus)
+            with inst.stage("build_bm25"):
+                bm25 = load_or_build_bm25(
+                    corpus,
+                    args.corpus,
+                    config["retrieval"]["bm25_k1"],
+                    config["retrieval"]["bm25_b"],
+                    args.force,
+                    config["retrieval"].get("max_segments"),
+                )
+            with inst.stage("build_sentence_index"):
+                sentences = sentence_index_from_config(corpus, args.corpus, config, args.force)
+            cache = cache_from_config(config)
+            retriever = Retriever(corpus, bm25, cache, config["retrieval"].get("pruning", False), sentences)
+
+        meta = {"dataset": args.dataset, "corpus": args.corpus, "server": args.server, "shards": args.shards}
+        if manifest:
+            meta["fingerprint"] = manifest["fingerprint"]
+        with RunWriter(run_dir, stressor="baseline", resume=bool(args.resume), meta=meta) as writer:
+            questions = writer.pending(iter_dataset(args.dataset))
+            run_baseline(questions, writer, retriever, corpus=None, config=config, api_key=None, inst=inst)
 
-    predictions = []
-    for question in questions:
-        retrieved = retrieve_top_k(question["body"], corpus, bm25, config["retrieval"]["top_k"])
-        candidates = build_candidate_snippets(retrieved, config["snippets"]["max_sentences_per_doc"])
-        scored = score_snippets(question["body"], candidates)
-        selected = select_top_snippets(scored, config["snippets"]["snippet_k"], config["snippets"]["mmr_lambda"])
-        predictions.append(
-            {
-                "question_id": question["id"],
-                "retrieved_pmids": [d["pmid"] for d in retrieved],
-                "snippets": selected,
-                "predicted_exact": None,
-                "predicted_ideal": None,
-            }
-        )
-
-    write_json(run_dir / "predictions.json", predictions)
+    if cache:
+        cache.close()
+    if args.shards:
+        retriever.close()
+    if manifest:
+        finish_run_manifest(run_dir, manifest)
+    inst.write(run_dir / "timings.json")
     LOGGER.info("Saved predictions to %s", run_dir)
     return 0
 
@@ -6,12 +6,11 @@ import logging
 import sys
 from pathlib import Path
 
-import pandas as pd
-
 from bio_rag.config import load_config
-from bio_rag.dataset import parse_dataset
-from bio_rag.evaluation import evaluate_run
-from bio_rag.utils import read_json, setup_logging, write_json
+from bio_rag.corpus import SentenceTable, canonical_pmids
+from bio_rag.dataset import iter_dataset
+from bio_rag.pipeline import evaluate_run_dirs, write_aggregate_report
+from bio_rag.utils import iter_jsonl, setup_logging
 
 LOGGER = logging.getLogger(__name__)
 
@@ -20,35 +19,35 @@ def main() -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument("--dataset", required=True)
     parser.add_argument("--runs_dir", required=True)
+    parser.add_argument("--corpus", default=None, help="Corpus JSONL used to resolve compact snippet references")
     parser.add_argument("--config", default=None)
+    parser.add_argument("--profile", action="store_true", help="Write cProfile stats for evaluation to each run directory")
+    parser.add_argument("--trace-memory", action="store_true", help="Record tracemalloc peak memory per stage")
+    parser.add_argument("--force", action="store_true", help="Re-evaluate runs whose reports are up to date")
     args = parser.parse_args()
 
     config = load_config(args.config)
     setup_logging(config.get("logging", {}).get("level", "INFO"))
 
-    dataset = parse_dataset(read_json(args.dataset))
     runs_dir = Path(args.runs_dir)
-
-    reports = []
-    for run_path in runs_dir.iterdir():
-        if not run_path.is_dir():
-            continue
-        predictions_path = run_path / "predictions.json"
-        if not predictions_path.exists():
-            continue
-        predictions = read_json(predictions_path)
-        summary, detail_df = evaluate_run(dataset, predictions)
-        report = {"run_id": run_path.name, **summary}
-        reports.append(report)
-        write_json(run_path / "report.json", report)
-        detail_df.to_csv(run_path / "report.csv", index=False)
-        LOGGER.info("Saved report for %s", run_path.name)
-
-    if reports:
-        summary_df = pd.DataFrame(reports)
-        summary_df.to_csv(runs_dir / "report.csv", index=False)
-        write_json(runs_dir / "report.json", reports)
-        LOGGER.info("Saved aggregate report to %s", runs_dir)
+    corpus_path = args.corpus or config["paths"]["corpus_jsonl"]
+    has_corpus = Path(corpus_path).exists()
+    sentences = SentenceTable.from_jsonl(corpus_path) if has_corpus else None
+    canonical = canonical_pmids(iter_jsonl(corpus_path)) if has_corpus else None
+    inputs = {"dataset": args.dataset, **({"corpus": corpus_path} if has_corpus else {})}
+
+    evaluate_run_dirs(
+        sorted(runs_dir.iterdir()),
+        lambda: iter_dataset(args.dataset),
+        sentences,
+        config,
+        profile=args.profile,
+        trace_memory=args.trace_memory,
+        inputs=inputs,
+        force=args.force,
+        canonical=canonical,
+    )
+    write_aggregate_report(runs_dir)
     return 0
 
 
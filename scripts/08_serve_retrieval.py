@@ -0,0 +1,69 @@
+"""Serve BM25 retrieval and snippet selection from a long-running process."""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import sys
+
+from bio_rag.cache import cache_from_config
+from bio_rag.config import load_config
+from bio_rag.corpus import load_corpus
+from bio_rag.retrieval import load_or_build_bm25
+from bio_rag.service import RetrievalService
+from bio_rag.utils import setup_logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", required=True)
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--unix", default=None, metavar="PATH", help="Listen on a Unix socket instead of TCP")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    setup_logging(config.get("logging", {}).get("level", "INFO"))
+    service_cfg = config.get("service", {})
+
+    corpus = load_corpus(args.corpus)
+    bm25 = load_or_build_bm25(
+        corpus,
+        args.corpus,
+        config["retrieval"]["bm25_k1"],
+        config["retrieval"]["bm25_b"],
+        max_segments=config["retrieval"].get("max_segments"),
+    )
+    cache = cache_from_config(config)
+    LOGGER.info("Indexed %s documents", len(corpus))
+
+    service = RetrievalService(
+        corpus,
+        bm25,
+        config,
+        max_batch=service_cfg.get("max_batch", 32),
+        max_wait_ms=service_cfg.get("max_wait_ms", 5.0),
+        workers=service_cfg.get("workers", 4),
+        cache=cache,
+    )
+    try:
+        asyncio.run(
+            service.serve(
+                host=args.host or service_cfg.get("host", "127.0.0.1"),
+                port=args.port or service_cfg.get("port", 8765),
+                unix_socket=args.unix,
+            )
+        )
+    except KeyboardInterrupt:
+        LOGGER.info("Retrieval service stopped")
+    finally:
+        if cache:
+            cache.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""Sweep BM25 k1/b/top_k and score retrieval against gold PMIDs."""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+from bio_rag.config import load_config
+from bio_rag.corpus import load_corpus
+from bio_rag.dataset import iter_dataset
+from bio_rag.instrumentation import Instrumentation
+from bio_rag.retrieval import load_or_build_bm25
+from bio_rag.sweep import DEFAULT_B, DEFAULT_K1, DEFAULT_TOP_K, best_setting, sweep_bm25
+from bio_rag.utils import ensure_dir, setup_logging, write_json
+
+LOGGER = logging.getLogger(__name__)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", required=True)
+    parser.add_argument("--corpus", required=True)
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--k1", type=float, nargs="+", default=None, help="k1 grid (default: sweep.k1 in config)")
+    parser.add_argument("--b", type=float, nargs="+", default=None, help="b grid (default: sweep.b in config)")
+    parser.add_argument("--top_k", type=int, nargs="+", default=None, help="Cut-offs (default: sweep.top_k in config)")
+    parser.add_argument("--metric", default=None, help="Metric used to pick the best setting (default: map@<first top_k>)")
+    parser.add_argument("--out", default=None, help="Output CSV (default: <runs_dir>/bm25_sweep.csv)")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    setup_logging(config.get("logging", {}).get("level", "INFO"))
+    sweep_cfg = config.get("sweep", {}) or {}
+    k1_values = args.k1 or sweep_cfg.get("k1", DEFAULT_K1)
+    b_values = args.b or sweep_cfg.get("b", DEFAULT_B)
+    top_k_values = sorted(args.top_k or sweep_cfg.get("top_k", DEFAULT_TOP_K))
+    metric = args.metric or f"map@{top_k_values[0]}"
+
+    inst = Instrumentation(config.get("instrumentation", {}).get("enabled", True))
+    with inst.stage("load_corpus"):
+        corpus = load_corpus(args.corpus)
+    with inst.stage("build_bm25"):
+        bm25 = load_or_build_bm25(
+            corpus,
+            args.corpus,
+            config["retrieval"]["bm25_k1"],
+            config["retrieval"]["bm25_b"],
+            max_segments=config["retrieval"].get("max_segments"),
+        )
+    results = sweep_bm25(bm25, corpus, iter_dataset(args.dataset), k1_values, b_values, top_k_values, inst)
+    if not results:
+        return 1
+
+    import pandas as pd
+
+    table = pd.DataFrame(results).sort_values(metric, ascending=False)
+    out = Path(args.out) if args.out else Path(config["paths"]["runs_dir"]) / "bm25_sweep.csv"
+    ensure_dir(out.parent)
+    table.to_csv(out, index=False)
+    write_json(out.with_suffix(".timings.json"), inst.summary())
+    print(table.to_string(index=False, float_format=lambda value: f"{value:.4f}"))
+    best = best_setting(results, metric)
+    LOGGER.info("Best %s=%.4f at k1=%s b=%s; table saved to %s", metric, best[metric], best["k1"], best["b"], out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""Split the corpus into PMID-range shards and index them in parallel."""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+
+from bio_rag.config import load_config
+from bio_rag.shards import build_shards, shard_dir_for
+from bio_rag.utils import setup_logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", required=True)
+    parser.add_argument("--out", default=None, help="Shard directory (default: <corpus>.shards)")
+    parser.add_argument("--shards", type=int, default=None, help="Number of PMID ranges (default: shards.n_shards)")
+    parser.add_argument("--workers", type=int, default=None, help="Indexing processes (default: shards.workers)")
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the corpus is unchanged")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    setup_logging(config.get("logging", {}).get("level", "INFO"))
+    shard_cfg = config.get("shards", {})
+
+    layout = build_shards(
+        args.corpus,
+        args.out or shard_dir_for(args.corpus),
+        args.shards or shard_cfg.get("n_shards", 8),
+        workers=args.workers or shard_cfg.get("workers"),
+        force=args.force,
+    )
+    for shard in layout["shards"]:
+        LOGGER.info(
+            "shard %s: PMIDs %s-%s, %s docs", shard["shard"], shard["pmid_min"], shard["pmid_max"], shard["n_docs"]
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
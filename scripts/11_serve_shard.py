@@ -0,0 +1,54 @@
+"""Serve one corpus shard to ShardedRetriever clients on other hosts.
+
+Clients and workers must share the key in the BIO_RAG_SHARD_KEY environment variable;
+the worker refuses to start without it. Requests are unpickled, so only bind to
+interfaces reachable by trusted clients (the default is loopback only).
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+
+from bio_rag.config import load_config
+from bio_rag.shards import default_authkey, serve_shard
+from bio_rag.utils import load_env, setup_logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", required=True, help="Shard directory written by 10_build_shards.py")
+    parser.add_argument("--shard", type=int, required=True)
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: loopback only)")
+    parser.add_argument("--port", type=int, default=None, help="Default: shards.port + shard")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    setup_logging(config.get("logging", {}).get("level", "INFO"))
+    load_env()
+
+    try:
+        authkey = default_authkey()
+    except RuntimeError as exc:
+        parser.error(str(exc))
+    port = args.port or config.get("shards", {}).get("port", 9100) + args.shard
+    try:
+        serve_shard(
+            args.shards,
+            args.shard,
+            (args.host, port),
+            authkey,
+            k1=config["retrieval"]["bm25_k1"],
+            b=config["retrieval"]["bm25_b"],
+            pruning=config["retrieval"].get("pruning", False),
+        )
+    except KeyboardInterrupt:
+        LOGGER.info("Shard %s stopped", args.shard)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
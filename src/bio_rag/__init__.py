@@ -1,16 +1,29 @@
 """BioRAG stress testing toolkit."""
 
 __all__ = [
+    "cache",
     "config",
     "corpus",
     "dataset",
+    "dedup",
     "evaluation",
+    "instrumentation",
+    "llm",
+    "manifest",
+    "passages",
     "pico",
+    "pipeline",
     "pubmed",
     "retrieval",
+    "runs",
+    "segments",
+    "service",
+    "shards",
     "snippets",
     "stressors",
+    "sweep",
     "utils",
+    "vocab",
 ]
 
 __version__ = "0.1.0"
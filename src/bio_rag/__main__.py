@@ -0,0 +1,142 @@
+"""Command line entry point: ``python -m bio_rag run``.
+
+Runs the baseline, the enabled stressors and the evaluation in one process, so
+the corpus, BM25 index and per-question retrieval results are loaded or
+computed once and shared between stages; the dataset is streamed again for each
+stage. Pipeline modules are imported only
+once a command runs, keeping ``--help`` fast.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+LOGGER = logging.getLogger("bio_rag")
+
+
+def run(args: argparse.Namespace) -> int:
+    from .cache import cache_from_config
+    from .config import load_config
+    from .corpus import SentenceTable, canonical_pmids, load_corpus
+    from .dataset import iter_dataset
+    from .instrumentation import Instrumentation, profiled
+    from .manifest import find_completed_run
+    from .passages import sentence_index_from_config
+    from .pipeline import (
+        STRESSORS,
+        PipelineMemo,
+        evaluate_run_dirs,
+        finish_run_manifest,
+        run_baseline,
+        run_manifest,
+        write_aggregate_report,
+    )
+    from .retrieval import Retriever, load_or_build_bm25
+    from .runs import RunWriter
+    from .utils import load_env, safe_get_env, setup_logging, timestamp_run_id
+
+    config = load_config(args.config)
+    setup_logging(config.get("logging", {}).get("level", "INFO"))
+    load_env()
+    api_key = safe_get_env("OPENAI_API_KEY")
+    runs_dir = Path(config["paths"]["runs_dir"])
+
+    if args.stressors is None:
+        stressors = [name for name in STRESSORS if config["stressors"][name]["enabled"]]
+    else:
+        stressors = args.stressors
+    run_dirs = []
+    jobs = []
+    for name in (["baseline"] if not args.skip_baseline else []) + stressors:
+        manifest = run_manifest(name, args.dataset, args.corpus, config)
+        existing = find_completed_run(runs_dir, manifest) if not args.force else None
+        if existing:
+            LOGGER.info("%s inputs unchanged; reusing %s (pass --force to rerun)", name, existing)
+            run_dirs.append(existing)
+        else:
+            jobs.append((name, run_baseline if name == "baseline" else STRESSORS[name], manifest))
+
+    setup = Instrumentation(config.get("instrumentation", {}).get("enabled", True), args.trace_memory)
+    with setup.stage("load_corpus"):
+        corpus = load_corpus(args.corpus)
+    if jobs:
+        with setup.stage("build_bm25"):
+            bm25 = load_or_build_bm25(
+                corpus,
+                args.corpus,
+                config["retrieval"]["bm25_k1"],
+                config["retrieval"]["bm25_b"],
+                args.force,
+                config["retrieval"].get("max_segments"),
+            )
+        with setup.stage("build_sentence_index"):
+            sentences = sentence_index_from_config(corpus, args.corpus, config, args.force)
+        cache = cache_from_config(config)
+        retriever = Retriever(corpus, bm25, cache, config["retrieval"].get("pruning", False), sentences)
+
+    memo: PipelineMemo = {}
+    for name, stage, manifest in jobs:
+        run_dir = runs_dir / timestamp_run_id(name)
+        meta = {"dataset": args.dataset, "corpus": args.corpus, "fingerprint": manifest["fingerprint"]}
+        inst = setup.fork()
+        with RunWriter(run_dir, stressor=name, meta=meta) as writer:
+            with profiled(run_dir / "profile.pstats" if args.profile else None), inst.stage(name):
+                stage(iter_dataset(args.dataset), writer, retriever, corpus, config, api_key, inst, memo)
+        finish_run_manifest(run_dir, manifest)
+        inst.write(run_dir / "timings.json")
+        run_dirs.append(run_dir)
+        LOGGER.info("%s run saved to %s", name, run_dir)
+
+    if jobs and cache:
+        cache.close()
+
+    if not args.skip_evaluation:
+        evaluate_run_dirs(
+            run_dirs,
+            lambda: iter_dataset(args.dataset),
+            SentenceTable(corpus),
+            config,
+            profile=args.profile,
+            trace_memory=args.trace_memory,
+            inputs={"dataset": args.dataset, "corpus": args.corpus},
+            force=args.force,
+            canonical=canonical_pmids(corpus),
+        )
+        write_aggregate_report(runs_dir)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m bio_rag")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run baseline, stress tests and evaluation in one process")
+    run_parser.add_argument("--dataset", required=True)
+    run_parser.add_argument("--corpus", required=True)
+    run_parser.add_argument("--config", default=None)
+    run_parser.add_argument(
+        "--stressors",
+        nargs="*",
+        default=None,
+        choices=["noise", "conflict", "unanswerable", "pico_mismatch"],
+        help="Stressors to run (default: those enabled in the config)",
+    )
+    run_parser.add_argument("--skip-baseline", action="store_true")
+    run_parser.add_argument("--skip-evaluation", action="store_true")
+    run_parser.add_argument("--force", action="store_true", help="Recompute stages whose inputs are unchanged")
+    run_parser.add_argument("--profile", action="store_true", help="Write cProfile stats to each run directory")
+    run_parser.add_argument("--trace-memory", action="store_true", help="Record tracemalloc peak memory per stage")
+    run_parser.set_defaults(handler=run)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
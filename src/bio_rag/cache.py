@@ -0,0 +1,229 @@
+"""Persistent cache of BM25 top-k results and selected snippets.
+
+Entries are keyed by the normalized query, the index fingerprint, k1, b and
+top_k (plus the snippet settings and the retrieved documents' text for snippet
+entries). Values are compact
+numpy records: ``(row, score)`` for retrieval, and ``(doc, sentence, score)``
+for snippets, where ``doc`` indexes the retrieved list. A bounded in-memory LRU
+sits in front of an optional SQLite tier.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .utils import TOKEN_RE, ensure_dir, normalize_whitespace, simple_sentence_split
+
+LOGGER = logging.getLogger(__name__)
+
+
+RETRIEVAL_DTYPE = np.dtype([("row", "<i4"), ("score", "<f8")])
+SNIPPET_DTYPE = np.dtype([("doc", "<i4"), ("sentence", "<i4"), ("score", "<f8")])
+
+RETRIEVAL = "retrieval"
+SNIPPETS = "snippets"
+
+
+def normalize_query(query: str) -> str:
+    """The token sequence BM25 sees; queries that normalize equally score equally."""
+    return " ".join(TOKEN_RE.findall((query or "").lower()))
+
+
+def _key(*parts: Any) -> str:
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class RetrievalCache:
+    """LRU of packed result arrays, backed by an SQLite table when ``path`` is set.
+
+    ``get``/``put`` are guarded by a lock so the retrieval service's worker
+    threads can share one cache.
+    """
+
+    def __init__(self, path: Optional[str | Path] = None, max_entries: int = 10000, commit_every: int = 100) -> None:
+        self.path = Path(path) if path else None
+        self.max_entries = max(1, max_entries)
+        self.commit_every = max(1, commit_every)
+        self.memory: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.conn: Optional[sqlite3.Connection] = None
+        if self.path is not None:
+            ensure_dir(self.path.parent)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS retrieval_cache (
+                    namespace TEXT,
+                    key TEXT,
+                    value BLOB,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+
+    def get(self, namespace: str, key: str, dtype: np.dtype) -> Optional[np.ndarray]:
+        with self._lock:
+            value = self._get(namespace, key)
+        return np.frombuffer(value, dtype=dtype) if value is not None else None
+
+    def _get(self, namespace: str, key: str) -> Optional[bytes]:
+        value = self.memory.get((namespace, key))
+        if value is not None:
+            self.memory.move_to_end((namespace, key))
+            self.stats["memory_hits"] += 1
+            return value
+        if self.conn is not None:
+            row = self.conn.execute(
+                "SELECT value FROM retrieval_cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is not None:
+                self.stats["disk_hits"] += 1
+                value = bytes(row[0])
+                self._remember(namespace, key, value)
+                return value
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, namespace: str, key: str, records: np.ndarray) -> None:
+        value = records.tobytes()
+        with self._lock:
+            self._remember(namespace, key, value)
+            if self.conn is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO retrieval_cache (namespace, key, value) VALUES (?, ?, ?)",
+                    (namespace, key, value),
+                )
+                self._pending += 1
+                if self._pending >= self.commit_every:
+                    self.conn.commit()
+                    self._pending = 0
+
+    def _remember(self, namespace: str, key: str, value: bytes) -> None:
+        self.memory[(namespace, key)] = value
+        self.memory.move_to_end((namespace, key))
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self.conn is not None and self._pending:
+                self.conn.commit()
+                self._pending = 0
+
+    def close(self) -> None:
+        self.flush()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        LOGGER.info("Retrieval cache: %s", self.stats)
+
+    def __enter__(self) -> "RetrievalCache":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    # Retrieval results
+
+    def retrieval_key(self, bm25, query: str, top_k: int) -> str:
+        return _key(RETRIEVAL, normalize_query(query), bm25.fingerprint, bm25.k1, bm25.b, top_k)
+
+    def get_top_k(self, bm25, query: str, top_k: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        records = self.get(RETRIEVAL, self.retrieval_key(bm25, query, top_k), RETRIEVAL_DTYPE)
+        if records is None:
+            return None
+        return records["row"].astype(np.int64), records["score"]
+
+    def put_top_k(self, bm25, query: str, top_k: int, rows: np.ndarray, scores: np.ndarray) -> None:
+        records = np.empty(len(rows), dtype=RETRIEVAL_DTYPE)
+        records["row"] = rows
+        records["score"] = scores
+        self.put(RETRIEVAL, self.retrieval_key(bm25, query, top_k), records)
+
+    # Selected snippets
+
+    def snippets_key(
+        self,
+        bm25,
+        query: str,
+        top_k: int,
+        snippet_cfg: Dict[str, Any],
+        retrieved: List[Dict[str, Any]],
+        duplicates=None,
+    ) -> str:
+        settings = [snippet_cfg["max_sentences_per_doc"], snippet_cfg["snippet_k"], snippet_cfg["mmr_lambda"]]
+        # Cached sentence ids are resolved against the retrieved text, which the index
+        # fingerprint misses when an edit tokenizes the same (case, punctuation, sentence breaks).
+        texts = hashlib.sha1()
+        for doc in retrieved:
+            texts.update((doc.get("text") or "").encode("utf-8"))
+            texts.update(b"\0")
+        # Selection collapses near-duplicate sentences, so it depends on the duplicate mapping.
+        dedup = duplicates.fingerprint if duplicates else None
+        # Snippet scores use the raw question text (TF-IDF), not just BM25 tokens.
+        return _key(SNIPPETS, query, bm25.fingerprint, bm25.k1, bm25.b, top_k, settings, dedup, texts.hexdigest())
+
+    def get_snippets(
+        self,
+        bm25,
+        query: str,
+        top_k: int,
+        snippet_cfg: Dict[str, Any],
+        retrieved: List[Dict[str, Any]],
+        duplicates=None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        key = self.snippets_key(bm25, query, top_k, snippet_cfg, retrieved, duplicates)
+        records = self.get(SNIPPETS, key, SNIPPET_DTYPE)
+        if records is None:
+            return None
+        snippets = []
+        split: Dict[int, List[str]] = {}
+        for doc_idx, sentence_id, score in records.tolist():
+            doc = retrieved[doc_idx]
+            if doc_idx not in split:
+                split[doc_idx] = simple_sentence_split(doc.get("text") or "")[: snippet_cfg["max_sentences_per_doc"]]
+            snippets.append(
+                {
+                    "pmid": doc.get("pmid"),
+                    "sentence_id": sentence_id,
+                    "sentence": normalize_whitespace(split[doc_idx][sentence_id]),
+                    "doc_score": doc.get("score", 0.0),
+                    "score": score,
+                }
+            )
+        return snippets
+
+    def put_snippets(
+        self,
+        bm25,
+        query: str,
+        top_k: int,
+        snippet_cfg: Dict[str, Any],
+        retrieved: List[Dict[str, Any]],
+        selected: List[Dict[str, Any]],
+        duplicates=None,
+    ) -> None:
+        position = {doc.get("pmid"): idx for idx, doc in enumerate(retrieved)}
+        records = np.empty(len(selected), dtype=SNIPPET_DTYPE)
+        for idx, snippet in enumerate(selected):
+            records[idx] = (position[snippet["pmid"]], snippet["sentence_id"], snippet["score"])
+        self.put(SNIPPETS, self.snippets_key(bm25, query, top_k, snippet_cfg, retrieved, duplicates), records)
+
+
+def cache_from_config(config: Dict[str, Any]) -> Optional[RetrievalCache]:
+    cache_cfg = config.get("cache", {}) or {}
+    if not cache_cfg.get("enabled", False):
+        return None
+    return RetrievalCache(cache_cfg.get("path"), max_entries=cache_cfg.get("max_entries", 10000))
@@ -3,29 +3,115 @@ from __future__ import annotations
 
 import logging
 import sqlite3
-from typing import Dict, Iterable, List
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from .utils import read_jsonl, write_jsonl
+from .utils import iter_jsonl, normalize_whitespace, read_jsonl, simple_sentence_split, write_jsonl
 
 LOGGER = logging.getLogger(__name__)
 
 
-def build_corpus_from_cache(db_path: str, out_path: str) -> List[Dict[str, str]]:
+def build_corpus_from_cache(
+    db_path: str,
+    out_path: str,
+    canonical: Optional[Dict[str, str]] = None,
+) -> List[Dict[str, str]]:
+    """Write every cached record to ``out_path``.
+
+    ``canonical`` maps duplicate PMIDs to their canonical PMID (see
+    ``dedup.load_canonical_pmids``): duplicates are left out and listed under
+    ``duplicate_pmids`` of the canonical record instead.
+    """
+    canonical = canonical or {}
     with sqlite3.connect(db_path) as conn:
-        rows = conn.execute("SELECT pmid, title, abstract, text FROM pubmed").fetchall()
-    docs = [
-        {
+        rows = conn.execute("SELECT pmid, title, abstract, text FROM pubmed ORDER BY rowid").fetchall()
+    duplicates: Dict[str, List[str]] = {}
+    for pmid, target in canonical.items():
+        duplicates.setdefault(target, []).append(pmid)
+    docs = []
+    for row in rows:
+        if row[0] in canonical:
+            continue
+        doc = {
             "pmid": row[0],
             "title": row[1],
             "abstract": row[2],
             "text": row[3],
         }
-        for row in rows
-    ]
+        if row[0] in duplicates:
+            doc["duplicate_pmids"] = sorted(duplicates[row[0]])
+        docs.append(doc)
     write_jsonl(out_path, docs)
+    if canonical:
+        LOGGER.info("Left out %s near-duplicate records", len(rows) - len(docs))
     LOGGER.info("Wrote %s docs to %s", len(docs), out_path)
     return docs
 
 
+def new_records_from_cache(db_path: str, known_pmids: Collection[str]) -> List[Dict[str, str]]:
+    """Cached records whose PMID is not in ``known_pmids``, in ``build_corpus_from_cache`` order.
+
+    New records are inserted last, so appending them to a corpus built earlier
+    gives the corpus a full rebuild would write.
+    """
+    with sqlite3.connect(db_path) as conn:
+        pmids = [row[0] for row in conn.execute("SELECT pmid FROM pubmed ORDER BY rowid")]
+        new = [pmid for pmid in pmids if pmid not in known_pmids]
+        docs = []
+        for start in range(0, len(new), 500):
+            chunk = new[start : start + 500]
+            placeholders = ",".join("?" for _ in chunk)
+            query = f"SELECT pmid, title, abstract, text FROM pubmed WHERE pmid IN ({placeholders}) ORDER BY rowid"
+            docs += [
+                {"pmid": row[0], "title": row[1], "abstract": row[2], "text": row[3]}
+                for row in conn.execute(query, chunk)
+            ]
+    return docs
+
+
 def load_corpus(path: str) -> List[Dict[str, str]]:
     return read_jsonl(path)
+
+
+def canonical_pmids(corpus: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+    """Near-duplicate PMID -> PMID of the corpus record listing it under ``duplicate_pmids``."""
+    return {pmid: doc.get("pmid") for doc in corpus for pmid in doc.get("duplicate_pmids") or []}
+
+
+def iter_corpus_sentences(
+    corpus: Iterable[Dict[str, str]],
+    max_sentences_per_doc: Optional[int] = None,
+) -> Iterator[Tuple[str, int, str]]:
+    """Yield (pmid, sentence_id, sentence) using the same split as snippet selection."""
+    for doc in corpus:
+        sentences = simple_sentence_split(doc.get("text") or "")
+        if max_sentences_per_doc is not None:
+            sentences = sentences[:max_sentences_per_doc]
+        for sentence_id, sent in enumerate(sentences):
+            yield doc.get("pmid"), sentence_id, normalize_whitespace(sent)
+
+
+class SentenceTable:
+    """Resolve (pmid, sentence_id) references back to sentence text.
+
+    Sentence ids follow ``iter_corpus_sentences``: the position of the sentence in
+    the document's split text. Documents are split lazily on first lookup.
+    """
+
+    def __init__(self, corpus: Iterable[Dict[str, str]]) -> None:
+        self.texts = {doc.get("pmid"): doc.get("text") or "" for doc in corpus}
+        self._split: Dict[str, List[str]] = {}
+
+    @classmethod
+    def from_jsonl(cls, path: str) -> "SentenceTable":
+        return cls({"pmid": row.get("pmid"), "text": row.get("text")} for row in iter_jsonl(path))
+
+    def sentences(self, pmid: str) -> List[str]:
+        sentences = self._split.get(pmid)
+        if sentences is None:
+            sentences = [normalize_whitespace(sent) for sent in simple_sentence_split(self.texts.get(pmid, ""))]
+            self._split[pmid] = sentences
+        return sentences
+
+    def get(self, pmid: str, sentence_id: int) -> str:
+        sentences = self.sentences(pmid)
+        return sentences[sentence_id] if 0 <= sentence_id < len(sentences) else ""
@@ -1,9 +1,11 @@
 """Dataset parsing utilities for BioASQ-style JSON."""
 from __future__ import annotations
 
+import json
 import logging
 import re
-from typing import Any, Dict, Iterable, List
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, TextIO
 
 from .utils import normalize_whitespace
 
@@ -13,7 +15,29 @@ LOGGER = logging.getLogger(__name__)
 PMID_RE = re.compile(r"(\d{6,})")
 
 
-def parse_dataset(raw: Any) -> List[Dict[str, Any]]:
+def normalize_question(entry: Dict[str, Any], keep_raw: bool = True) -> Dict[str, Any]:
+    qid = str(entry.get("id") or entry.get("qid") or entry.get("question_id") or "")
+    body = normalize_whitespace(entry.get("body") or entry.get("question") or "")
+    q_type = entry.get("type") or entry.get("question_type")
+    documents = entry.get("documents") or []
+    snippets = entry.get("snippets") or []
+    exact_answer = entry.get("exact_answer")
+    ideal_answer = entry.get("ideal_answer")
+    question = {
+        "id": qid,
+        "body": body,
+        "type": q_type,
+        "documents": documents,
+        "snippets": snippets,
+        "exact_answer": exact_answer,
+        "ideal_answer": ideal_answer,
+    }
+    if keep_raw:
+        question["raw"] = entry
+    return question
+
+
+def parse_dataset(raw: Any, keep_raw: bool = True) -> List[Dict[str, Any]]:
     if isinstance(raw, dict):
         if "questions" in raw:
             items = raw["questions"]
@@ -28,29 +52,124 @@ def parse_dataset(raw: Any) -> List[Dict[str, Any]]:
     for entry in items:
         if not isinstance(entry, dict):
             continue
-        qid = str(entry.get("id") or entry.get("qid") or entry.get("question_id") or "")
-        body = normalize_whitespace(entry.get("body") or entry.get("question") or "")
-        q_type = entry.get("type") or entry.get("question_type")
-        documents = entry.get("documents") or []
-        snippets = entry.get("snippets") or []
-        exact_answer = entry.get("exact_answer")
-        ideal_answer = entry.get("ideal_answer")
-        questions.append(
-            {
-                "id": qid,
-                "body": body,
-                "type": q_type,
-                "documents": documents,
-                "snippets": snippets,
-                "exact_answer": exact_answer,
-                "ideal_answer": ideal_answer,
-                "raw": entry,
-            }
-        )
+        questions.append(normalize_question(entry, keep_raw=keep_raw))
     LOGGER.info("Loaded %s questions", len(questions))
     return questions
 
 
+class _JsonStream:
+    """Decode consecutive JSON values from a file without loading it whole."""
+
+    def __init__(self, handle: TextIO, chunk_size: int = 1 << 20) -> None:
+        self.handle = handle
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.handle.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in dataset JSON at offset {self.pos}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A scalar ending exactly at the buffer edge may be truncated.
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def array_items(self) -> Iterator[Any]:
+        """Yield elements of the array whose ``[`` was just consumed."""
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+def iter_dataset(path: str | Path, keep_raw: bool = False) -> Iterator[Dict[str, Any]]:
+    """Yield normalized questions one at a time from a BioASQ-style JSON file.
+
+    Only the current question is held in memory, so the combined training set
+    can be processed without loading it whole. Accepts the same layouts as
+    ``parse_dataset``: ``{"questions": [...]}``, a bare list, or a dict of entries.
+    """
+    count = 0
+    with open(path, "r", encoding="utf-8") as handle:
+        stream = _JsonStream(handle)
+        first = stream.peek()
+        if first == "[":
+            stream.pos += 1
+            entries = stream.array_items()
+        elif first == "{":
+            stream.pos += 1
+            entries = _iter_top_level(stream)
+        else:
+            raise ValueError("Unsupported dataset format")
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            count += 1
+            yield normalize_question(entry, keep_raw=keep_raw)
+    LOGGER.info("Loaded %s questions", count)
+
+
+def _iter_top_level(stream: _JsonStream) -> Iterator[Any]:
+    values = []
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key == "questions" and stream.peek() == "[":
+            stream.pos += 1
+            yield from stream.array_items()
+            return
+        values.append(stream.value())
+        if stream.peek() == ",":
+            stream.pos += 1
+            continue
+        stream.expect("}")
+        break
+    # No "questions" array: every top-level value is an entry, as in parse_dataset.
+    yield from values
+
+
 def extract_gold_pmids(questions: Iterable[Dict[str, Any]]) -> List[str]:
     pmids = []
     for question in questions:
@@ -0,0 +1,392 @@
+"""Near-duplicate detection for PubMed records and corpus sentences.
+
+Texts are shingled into word n-grams and summarized by MinHash signatures
+(multiply-shift hashes over 32-bit shingle hashes, computed in numpy and spread
+over a process pool). Locality-sensitive hashing over signature bands yields
+candidate pairs in near-linear time; candidates whose estimated Jaccard
+similarity reaches the threshold are merged with union-find. Each cluster keeps
+one canonical member (the lowest PMID for records, the first occurrence for
+sentences) and the other members are stored in the ``pubmed_duplicates`` and
+``sentence_duplicates`` tables of the PubMed cache.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import sqlite3
+from multiprocessing import Pool
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .corpus import iter_corpus_sentences
+
+LOGGER = logging.getLogger(__name__)
+
+
+# Bytes that ``utils.TOKEN_RE`` (``[A-Za-z0-9]+``) matches in lowercased UTF-8 text.
+_TOKEN_BYTES = np.zeros(256, dtype=bool)
+_TOKEN_BYTES[np.frombuffer(b"abcdefghijklmnopqrstuvwxyz0123456789", dtype=np.uint8)] = True
+# Odd base of the polynomial token hash, and its inverse modulo 2**64.
+_BASE = 0x100000001B3
+_BASE_INVERSE = pow(_BASE, -1, 1 << 64)
+# Odd 64-bit multipliers combining the token hashes of a shingle.
+_SHINGLE_MULTIPLIERS = np.array(
+    [0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD],
+    dtype=np.uint64,
+)
+
+
+def _permutations(num_perm: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Parameters ``(a, b)`` of ``h(x) = (a * x + b) >> 32``; ``a`` is odd."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, np.iinfo(np.int64).max, num_perm, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+    b = rng.integers(0, np.iinfo(np.int64).max, num_perm, dtype=np.int64).astype(np.uint64)
+    return a, b
+
+
+def _powers(base: int, n: int) -> np.ndarray:
+    """``base ** i mod 2**64`` for ``i < n``."""
+    powers = np.full(n, base, dtype=np.uint64)
+    if n:
+        powers[0] = 1
+    return np.cumprod(powers, dtype=np.uint64)
+
+
+def token_hashes(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """64-bit hashes of the ``utils.tokenize`` tokens of all texts, plus the text index of each token.
+
+    Tokens are found and hashed on the concatenated UTF-8 bytes with numpy:
+    the polynomial prefix hash of the bytes gives every token's hash from its
+    span, with no Python work per token.
+    """
+    encoded = [(text or "").lower().encode("utf-8") for text in texts]
+    data = np.frombuffer(b"\n".join(encoded), dtype=np.uint8)
+    edges = np.diff(np.r_[False, _TOKEN_BYTES[data], False].astype(np.int8))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    prefix = np.zeros(len(data) + 1, dtype=np.uint64)
+    np.cumsum((data.astype(np.uint64) + np.uint64(1)) * _powers(_BASE, len(data)), dtype=np.uint64, out=prefix[1:])
+    hashes = (prefix[ends] - prefix[starts]) * _powers(_BASE_INVERSE, len(data) + 1)[starts]
+    text_ends = np.cumsum([len(item) + 1 for item in encoded])
+    return hashes, np.searchsorted(text_ends, starts, side="right")
+
+
+def _signature_chunk(task: Tuple[Sequence[str], int, int, int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Pool worker: MinHash signatures of a chunk of texts plus a mask of texts long enough to compare.
+
+    Texts with fewer than ``max(min_tokens, shingle_size)`` tokens are never
+    reported as duplicates.
+    """
+    texts, num_perm, shingle_size, min_tokens, seed = task
+    a, b = _permutations(num_perm, seed)
+    signatures = np.full((len(texts), num_perm), 0xFFFFFFFF, dtype=np.uint32)
+    hashes, owner = token_hashes(texts)
+    size = max(1, min(shingle_size, len(_SHINGLE_MULTIPLIERS)))
+    valid = np.bincount(owner, minlength=len(texts)) >= max(min_tokens, size, 1)
+    n_shingles = max(len(hashes) - size + 1, 0)
+    shingles = np.zeros(n_shingles, dtype=np.uint64)
+    for offset in range(size):
+        shingles ^= hashes[offset : offset + n_shingles] * _SHINGLE_MULTIPLIERS[offset]
+    # Keep shingles inside one text.
+    keep = (owner[:n_shingles] == owner[size - 1 : size - 1 + n_shingles]) & valid[owner[:n_shingles]]
+    shingles, owner = shingles[keep] >> np.uint64(32), owner[:n_shingles][keep]
+    if not len(shingles):
+        return signatures, valid
+    starts = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+    bounds = np.r_[starts, len(shingles)]
+    # Hash in slices of texts to bound the (num_perm x shingles) block.
+    first = 0
+    while first < len(starts):
+        last = int(np.searchsorted(bounds, bounds[first] + (1 << 16), side="right")) - 1
+        last = min(max(last, first + 1), len(starts))
+        block = shingles[bounds[first] : bounds[last]]
+        values = (a[:, None] * block[None, :] + b[:, None]) >> np.uint64(32)
+        mins = np.minimum.reduceat(values, starts[first:last] - bounds[first], axis=1)
+        signatures[owner[starts[first:last]]] = mins.T.astype(np.uint32)
+        first = last
+    return signatures, valid
+
+
+def minhash_signatures(
+    texts: Iterable[str],
+    num_perm: int = 128,
+    shingle_size: int = 3,
+    min_tokens: int = 5,
+    seed: int = 13,
+    workers: int = 1,
+    chunk_size: int = 2000,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """``(n x num_perm)`` uint32 signatures and a mask of texts with at least ``min_tokens`` tokens."""
+
+    def tasks() -> Iterator[Tuple[List[str], int, int, int, int]]:
+        chunk: List[str] = []
+        for text in texts:
+            chunk.append(text)
+            if len(chunk) >= chunk_size:
+                yield chunk, num_perm, shingle_size, min_tokens, seed
+                chunk = []
+        if chunk:
+            yield chunk, num_perm, shingle_size, min_tokens, seed
+
+    if workers > 1:
+        with Pool(workers) as pool:
+            parts = list(pool.imap(_signature_chunk, tasks()))
+    else:
+        parts = [_signature_chunk(task) for task in tasks()]
+    if not parts:
+        return np.zeros((0, num_perm), dtype=np.uint32), np.zeros(0, dtype=bool)
+    return np.concatenate([part[0] for part in parts]), np.concatenate([part[1] for part in parts])
+
+
+def lsh_candidates(signatures: np.ndarray, valid: np.ndarray, bands: int) -> np.ndarray:
+    """Pairs ``(i, j)`` sharing at least one band of their signatures.
+
+    Every bucket member is paired with the bucket's first member only, so the
+    number of candidates stays linear even for large buckets; union-find still
+    joins the whole bucket when the members are similar.
+    """
+    rows = signatures.shape[1] // bands
+    members = np.flatnonzero(valid)
+    pairs = []
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[members, band * rows : (band + 1) * rows])
+        keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * rows))).ravel()
+        _, inverse = np.unique(keys, return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        buckets = inverse[order]
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        heads = np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+        follower = np.arange(len(order)) != heads
+        pairs.append(np.stack([members[order[heads[follower]]], members[order[follower]]], axis=1))
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def estimated_similarity(signatures: np.ndarray, pairs: np.ndarray, chunk_size: int = 1 << 16) -> np.ndarray:
+    """Estimated Jaccard similarity (fraction of equal MinHash values) of each pair."""
+    similarity = np.zeros(len(pairs))
+    for start in range(0, len(pairs), chunk_size):
+        chunk = pairs[start : start + chunk_size]
+        similarity[start : start + chunk_size] = (signatures[chunk[:, 0]] == signatures[chunk[:, 1]]).mean(axis=1)
+    return similarity
+
+
+class UnionFind:
+    """Disjoint sets over ``0..n-1`` with path halving and union by size."""
+
+    def __init__(self, n: int) -> None:
+        self.parent = np.arange(n)
+        self.size = np.ones(n, dtype=np.int64)
+
+    def find(self, item: int) -> int:
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return int(item)
+
+    def union(self, a: int, b: int) -> None:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+
+    def roots(self, items: Optional[Iterable[int]] = None) -> np.ndarray:
+        """Root of every element; only ``items`` are looked up, the rest must be singletons."""
+        roots = np.arange(len(self.parent))
+        for item in range(len(self.parent)) if items is None else items:
+            roots[item] = self.find(item)
+        return roots
+
+
+def cluster_duplicates(
+    signatures: np.ndarray,
+    valid: np.ndarray,
+    rank: np.ndarray,
+    bands: int = 16,
+    threshold: float = 0.8,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Canonical index of every item (itself when unique) and its estimated similarity to the canonical.
+
+    The canonical member of a cluster is the one with the lowest ``rank``.
+    """
+    n_items = len(signatures)
+    canonical = np.arange(n_items)
+    similarity = np.ones(n_items)
+    pairs = lsh_candidates(signatures, valid, bands)
+    pairs = pairs[estimated_similarity(signatures, pairs) >= threshold]
+    if not len(pairs):
+        return canonical, similarity
+    sets = UnionFind(n_items)
+    for a, b in pairs.tolist():
+        sets.union(a, b)
+    roots = sets.roots(np.unique(pairs).tolist())
+    order = np.lexsort((rank, roots))
+    first = np.r_[True, roots[order][1:] != roots[order][:-1]]
+    best_of_root = dict(zip(roots[order][first].tolist(), order[first].tolist()))
+    canonical = np.array([best_of_root[root] for root in roots.tolist()], dtype=np.int64)
+    duplicates = np.flatnonzero(canonical != np.arange(n_items))
+    similarity[duplicates] = estimated_similarity(signatures, np.stack([duplicates, canonical[duplicates]], axis=1))
+    return canonical, similarity
+
+
+def _pmid_rank(pmid: Any) -> int:
+    """Numeric PMID, so the earliest record of a cluster is canonical; others rank last."""
+    try:
+        return int(pmid)
+    except (TypeError, ValueError):
+        return np.iinfo(np.int64).max
+
+
+def init_duplicate_tables(db_path: str) -> None:
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pubmed_duplicates (
+                pmid TEXT PRIMARY KEY,
+                canonical_pmid TEXT,
+                similarity REAL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sentence_duplicates (
+                pmid TEXT,
+                sentence_id INTEGER,
+                canonical_pmid TEXT,
+                canonical_sentence_id INTEGER,
+                similarity REAL,
+                PRIMARY KEY (pmid, sentence_id)
+            )
+            """
+        )
+        conn.commit()
+
+
+def deduplicate_pubmed(db_path: str, config: Dict[str, Any], workers: int = 1) -> Dict[str, int]:
+    """Cluster near-duplicate records and corpus sentences of the PubMed cache and store the mappings.
+
+    Sentences follow ``iter_corpus_sentences`` and are taken from canonical
+    records only, since duplicate records are dropped from the corpus.
+    """
+    params = config["dedup"]
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT pmid, text FROM pubmed ORDER BY rowid").fetchall()
+    pmids = [row[0] for row in rows]
+    signatures, valid = minhash_signatures(
+        (row[1] for row in rows),
+        params["num_perm"],
+        params["shingle_size"],
+        params["min_tokens"],
+        params["seed"],
+        workers,
+    )
+    rank = np.array([_pmid_rank(pmid) for pmid in pmids], dtype=np.int64)
+    canonical, similarity = cluster_duplicates(signatures, valid, rank, params["bands"], params["threshold"])
+    duplicates = np.flatnonzero(canonical != np.arange(len(pmids)))
+    doc_rows = [(pmids[idx], pmids[canonical[idx]], float(similarity[idx])) for idx in duplicates]
+    clusters = len({row[1] for row in doc_rows})
+    LOGGER.info("%s of %s records are near-duplicates (%s clusters)", len(doc_rows), len(pmids), clusters)
+
+    kept = [{"pmid": row[0], "text": row[1]} for idx, row in enumerate(rows) if canonical[idx] == idx]
+    keys, texts = [], []
+    for pmid, sentence_id, sentence in iter_corpus_sentences(kept, config["snippets"]["max_sentences_per_doc"]):
+        keys.append((pmid, sentence_id))
+        texts.append(sentence)
+    signatures, valid = minhash_signatures(
+        texts, params["sentence_num_perm"], params["shingle_size"], params["min_tokens"], params["seed"], workers
+    )
+    canonical, similarity = cluster_duplicates(
+        signatures, valid, np.arange(len(keys)), params["sentence_bands"], params["sentence_threshold"]
+    )
+    sentence_rows = [
+        (*keys[idx], *keys[canonical[idx]], float(similarity[idx]))
+        for idx in np.flatnonzero(canonical != np.arange(len(keys)))
+    ]
+    LOGGER.info("%s of %s sentences are near-duplicates", len(sentence_rows), len(keys))
+
+    init_duplicate_tables(db_path)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM pubmed_duplicates")
+        conn.execute("DELETE FROM sentence_duplicates")
+        conn.executemany("INSERT INTO pubmed_duplicates (pmid, canonical_pmid, similarity) VALUES (?, ?, ?)", doc_rows)
+        conn.executemany(
+            "INSERT INTO sentence_duplicates "
+            "(pmid, sentence_id, canonical_pmid, canonical_sentence_id, similarity) VALUES (?, ?, ?, ?, ?)",
+            sentence_rows,
+        )
+        conn.commit()
+    return {
+        "records": len(pmids),
+        "duplicate_records": len(doc_rows),
+        "sentences": len(keys),
+        "duplicate_sentences": len(sentence_rows),
+    }
+
+
+def _has_table(conn: sqlite3.Connection, table: str) -> bool:
+    return conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone() is not None
+
+
+def load_canonical_pmids(db_path: str) -> Dict[str, str]:
+    """Duplicate PMID -> canonical PMID; empty when ``03b_deduplicate_pubmed.py`` has not run."""
+    with sqlite3.connect(db_path) as conn:
+        if not _has_table(conn, "pubmed_duplicates"):
+            return {}
+        return dict(conn.execute("SELECT pmid, canonical_pmid FROM pubmed_duplicates").fetchall())
+
+
+class DuplicateMap:
+    """Canonical ids of duplicate records and sentences; ids not listed are their own canonical."""
+
+    def __init__(
+        self,
+        pmids: Optional[Dict[str, str]] = None,
+        sentences: Optional[Dict[Tuple[str, int], Tuple[str, int]]] = None,
+    ) -> None:
+        self.pmids = pmids or {}
+        self.sentences = sentences or {}
+        self._fingerprint: Optional[str] = None
+
+    @classmethod
+    def from_db(cls, db_path: str) -> "DuplicateMap":
+        sentences: Dict[Tuple[str, int], Tuple[str, int]] = {}
+        with sqlite3.connect(db_path) as conn:
+            if _has_table(conn, "sentence_duplicates"):
+                query = "SELECT pmid, sentence_id, canonical_pmid, canonical_sentence_id FROM sentence_duplicates"
+                for pmid, sentence_id, canonical_pmid, canonical_sentence_id in conn.execute(query):
+                    sentences[(pmid, sentence_id)] = (canonical_pmid, canonical_sentence_id)
+        return cls(load_canonical_pmids(db_path), sentences)
+
+    def __bool__(self) -> bool:
+        return bool(self.pmids or self.sentences)
+
+    @property
+    def fingerprint(self) -> str:
+        """Content hash of both mappings, for cache keys."""
+        if self._fingerprint is None:
+            sha = hashlib.sha256()
+            for pmid, canonical in sorted(self.pmids.items()):
+                sha.update(f"{pmid}\t{canonical}\n".encode("utf-8"))
+            for (pmid, sentence_id), (canonical, canonical_id) in sorted(self.sentences.items()):
+                sha.update(f"{pmid}\t{sentence_id}\t{canonical}\t{canonical_id}\n".encode("utf-8"))
+            self._fingerprint = sha.hexdigest()[:16]
+        return self._fingerprint
+
+    def canonical_pmid(self, pmid: str) -> str:
+        return self.pmids.get(pmid, pmid)
+
+    def canonical_sentence(self, pmid: str, sentence_id: int) -> Tuple[str, int]:
+        return self.sentences.get((pmid, sentence_id), (pmid, sentence_id))
+
+    def same_snippet(self, a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+        """True when two snippets come from duplicate records or are duplicate sentences."""
+        if self.canonical_pmid(a["pmid"]) == self.canonical_pmid(b["pmid"]):
+            return True
+        canonical_a = self.canonical_sentence(a["pmid"], a["sentence_id"])
+        return canonical_a == self.canonical_sentence(b["pmid"], b["sentence_id"])
@@ -2,23 +2,36 @@
 from __future__ import annotations
 
 import logging
-from typing import Dict, Iterable, List, Tuple
+from typing import TYPE_CHECKING, Dict, Iterable, List, Mapping, Optional, Tuple
 
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
 
+from .corpus import SentenceTable
+from .instrumentation import NULL_INSTRUMENTATION, Instrumentation
+from .runs import snippet_texts
 from .utils import tokenize
+from .vocab import Vocabulary
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 LOGGER = logging.getLogger(__name__)
 
 
-def recall_at_k(gold: List[str], retrieved: List[str], k: int = 10) -> float:
+def recall_at_k(
+    gold: List[str],
+    retrieved: List[str],
+    k: int = 10,
+    canonical: Optional[Mapping[str, str]] = None,
+) -> float:
+    """Share of gold PMIDs in the top ``k``; a PMID mapped by ``canonical`` also counts via its canonical record."""
     gold_set = set(gold)
     if not gold_set:
         return 0.0
     retrieved_set = set(retrieved[:k])
-    return len(gold_set & retrieved_set) / float(len(gold_set))
+    canonical = canonical or {}
+    found = [pmid for pmid in gold_set if pmid in retrieved_set or canonical.get(pmid) in retrieved_set]
+    return len(found) / float(len(gold_set))
 
 
 def token_overlap_f1(gold: str, pred: str) -> float:
@@ -33,17 +46,35 @@ def token_overlap_f1(gold: str, pred: str) -> float:
     return 2 * precision * recall / (precision + recall)
 
 
+def _id_set_f1(gold_ids: np.ndarray, pred_ids: np.ndarray) -> float:
+    if not len(gold_ids) or not len(pred_ids):
+        return 0.0
+    overlap = len(np.intersect1d(gold_ids, pred_ids, assume_unique=True))
+    if overlap == 0:
+        return 0.0
+    precision = overlap / len(pred_ids)
+    recall = overlap / len(gold_ids)
+    return 2 * precision * recall / (precision + recall)
+
+
 def snippets_overlap_f1(gold_snippets: List[str], pred_snippets: List[str]) -> float:
     if not gold_snippets or not pred_snippets:
         return 0.0
+    # Tokenize every snippet once into a set of token ids instead of once per pair.
+    vocab = Vocabulary()
+    gold_sets = [np.unique(vocab.encode_text(text, grow=True)) for text in gold_snippets]
+    pred_sets = [np.unique(vocab.encode_text(text, grow=True)) for text in pred_snippets]
     scores = []
-    for gold in gold_snippets:
-        best = max(token_overlap_f1(gold, pred) for pred in pred_snippets)
+    for gold_ids in gold_sets:
+        best = max(_id_set_f1(gold_ids, pred_ids) for pred_ids in pred_sets)
         scores.append(best)
     return float(sum(scores) / len(scores)) if scores else 0.0
 
 
 def groundedness_score(pred_texts: List[str], snippets: List[str]) -> float:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
     if not snippets:
         return 0.0
     if not pred_texts:
@@ -74,51 +105,78 @@ def abstention_accuracy(abstain_flags: List[bool], predictions: List[str]) -> fl
     return correct / len(abstain_flags)
 
 
+def _question_row(
+    qid: str,
+    gold_docs: List[str],
+    gold_snippets: List[str],
+    pred: Dict[str, object],
+    sentences,
+    canonical: Optional[Mapping[str, str]] = None,
+) -> Dict[str, object]:
+    retrieved = pred.get("retrieved_pmids") or []
+    pred_snippets = snippet_texts(pred, sentences)
+
+    pred_texts = []
+    if pred.get("predicted_exact"):
+        pred_texts.append(str(pred["predicted_exact"]))
+    if pred.get("predicted_ideal"):
+        pred_texts.append(str(pred["predicted_ideal"]))
+
+    abstain_flag = pred.get("is_unanswerable", False)
+    abstain_pred = pred.get("predicted_exact") or ""
+    return {
+        "question_id": qid,
+        "recall@10": recall_at_k(gold_docs, retrieved, canonical=canonical),
+        "snippet_f1": snippets_overlap_f1(gold_snippets, pred_snippets),
+        "groundedness": groundedness_score(pred_texts, pred_snippets),
+        "abstain_accuracy": 1.0 if abstain_flag and abstain_pred.lower() == "insufficient evidence" else 0.0,
+    }
+
+
 def evaluate_run(
-    dataset: List[Dict[str, object]],
-    predictions: List[Dict[str, object]],
+    dataset: Iterable[Dict[str, object]],
+    predictions: Iterable[Dict[str, object]],
+    sentences: Optional[SentenceTable] = None,
+    inst: Instrumentation = NULL_INSTRUMENTATION,
+    canonical: Optional[Mapping[str, str]] = None,
 ) -> Tuple[Dict[str, float], pd.DataFrame]:
-    pred_map = {p["question_id"]: p for p in predictions}
-    metrics = {
-        "recall@10": [],
-        "snippet_f1": [],
-        "groundedness": [],
-        "abstain_accuracy": [],
-    }
-    rows = []
+    """Score a run, streaming over its predictions.
+
+    Only the gold PMIDs and snippet texts of the dataset are kept in memory.
+    ``sentences`` resolves compact (pmid, sentence_id, score) snippet references.
+    ``canonical`` maps near-duplicate PMIDs left out of the corpus to their
+    canonical record, so retrieving that record credits them too.
+    Questions without a prediction score zero on every metric.
+    """
+    import pandas as pd
+
+    order: List[str] = []
+    gold: Dict[str, Tuple[List[str], List[str]]] = {}
     for question in dataset:
         qid = question["id"]
-        pred = pred_map.get(qid, {})
+        order.append(qid)
         gold_docs = []
         for doc in question.get("documents") or []:
             if isinstance(doc, str):
                 gold_docs.append(doc.split("/")[-1])
-        retrieved = pred.get("retrieved_pmids") or []
-        metrics["recall@10"].append(recall_at_k(gold_docs, retrieved))
-
         gold_snippets = [s.get("text") for s in question.get("snippets") or [] if isinstance(s, dict)]
-        pred_snippets = [s["sentence"] for s in pred.get("snippets") or []]
-        metrics["snippet_f1"].append(snippets_overlap_f1(gold_snippets, pred_snippets))
+        gold[qid] = (gold_docs, gold_snippets)
 
-        pred_texts = []
-        if pred.get("predicted_exact"):
-            pred_texts.append(str(pred["predicted_exact"]))
-        if pred.get("predicted_ideal"):
-            pred_texts.append(str(pred["predicted_ideal"]))
-        metrics["groundedness"].append(groundedness_score(pred_texts, pred_snippets))
-
-        abstain_flag = pred.get("is_unanswerable", False)
-        abstain_pred = pred.get("predicted_exact") or ""
-        metrics["abstain_accuracy"].append(1.0 if abstain_flag and abstain_pred.lower() == "insufficient evidence" else 0.0)
-
-        rows.append(
-            {
-                "question_id": qid,
-                "recall@10": metrics["recall@10"][-1],
-                "snippet_f1": metrics["snippet_f1"][-1],
-                "groundedness": metrics["groundedness"][-1],
-                "abstain_accuracy": metrics["abstain_accuracy"][-1],
-            }
-        )
-    summary = {k: float(sum(v) / len(v)) if v else 0.0 for k, v in metrics.items()}
+    rows_by_qid: Dict[str, Dict[str, object]] = {}
+    for pred in predictions:
+        qid = pred.get("question_id")
+        if qid in gold:
+            with inst.question("evaluation"):
+                rows_by_qid[qid] = _question_row(qid, *gold[qid], pred, sentences, canonical)
+
+    metric_names = ["recall@10", "snippet_f1", "groundedness", "abstain_accuracy"]
+    rows = []
+    for qid in order:
+        row = rows_by_qid.get(qid)
+        if row is None:
+            row = _question_row(qid, *gold[qid], {}, sentences, canonical)
+        rows.append(row)
+    summary = {
+        name: float(sum(row[name] for row in rows) / len(rows)) if rows else 0.0 for name in metric_names
+    }
     return summary, pd.DataFrame(rows)
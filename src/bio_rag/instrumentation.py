@@ -0,0 +1,165 @@
+"""Lightweight stage timers, counters and optional profiling for pipeline runs."""
+from __future__ import annotations
+
+import cProfile
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .utils import read_json, write_json
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+LOGGER = logging.getLogger(__name__)
+
+
+_NULL_CONTEXT = nullcontext()
+
+# Peak traced bytes of each open stage, outermost first, across all instances:
+# tracemalloc keeps a single global peak, which every stage resets on entry.
+_PEAK_STACK: List[int] = []
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class Instrumentation:
+    """Accumulate per-stage wall time, call counts and per-question latency.
+
+    When disabled every hook returns a shared no-op context, so instrumented
+    code pays a single attribute check per call. With ``trace_memory`` each
+    stage also records the tracemalloc peak reached while it ran; nested
+    stages report the peak of their whole extent.
+    """
+
+    def __init__(self, enabled: bool = True, trace_memory: bool = False) -> None:
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+        self.latencies: Dict[str, List[float]] = {}
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def fork(self) -> "Instrumentation":
+        """New instance seeded with the stages recorded so far (e.g. shared setup)."""
+        child = Instrumentation(self.enabled, self.trace_memory)
+        child.stages = {name: dict(stats) for name, stats in self.stages.items()}
+        child.counters = dict(self.counters)
+        return child
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name: str) -> Iterator[None]:
+        if self.trace_memory:
+            # Save the enclosing stage's running peak before resetting it for this one.
+            if _PEAK_STACK:
+                _PEAK_STACK[-1] = max(_PEAK_STACK[-1], tracemalloc.get_traced_memory()[1])
+            _PEAK_STACK.append(0)
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = self.stages.setdefault(name, {"total_s": 0.0, "calls": 0})
+            stats["total_s"] += elapsed
+            stats["calls"] += 1
+            if self.trace_memory:
+                peak = max(_PEAK_STACK.pop(), tracemalloc.get_traced_memory()[1])
+                if _PEAK_STACK:
+                    _PEAK_STACK[-1] = max(_PEAK_STACK[-1], peak)
+                stats["peak_traced_mb"] = max(stats.get("peak_traced_mb", 0.0), peak / (1024.0 * 1024.0))
+
+    def question(self, name: str = "question"):
+        """Time one question end to end for latency percentiles."""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._question(name)
+
+    @contextmanager
+    def _question(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+
+    def count(self, name: str, value: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> Dict[str, Any]:
+        latency = {}
+        for name, values in self.latencies.items():
+            latency[name] = {
+                "count": len(values),
+                "mean_s": sum(values) / len(values) if values else 0.0,
+                "p50_s": percentile(values, 50),
+                "p95_s": percentile(values, 95),
+                "p99_s": percentile(values, 99),
+                "max_s": max(values) if values else 0.0,
+            }
+        return {
+            "stages": self.stages,
+            "counters": self.counters,
+            "latency": latency,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    def write(self, path: str | Path, merge: bool = False) -> None:
+        """Write ``timings.json``; with ``merge`` add to the stages already on disk."""
+        if not self.enabled:
+            return
+        payload = self.summary()
+        path = Path(path)
+        if merge and path.exists():
+            existing = read_json(path)
+            for key in ("stages", "counters", "latency"):
+                existing.setdefault(key, {}).update(payload[key])
+            existing["peak_rss_mb"] = max(existing.get("peak_rss_mb") or 0.0, payload["peak_rss_mb"] or 0.0)
+            payload = existing
+        write_json(path, payload)
+
+
+NULL_INSTRUMENTATION = Instrumentation(enabled=False)
+
+
+@contextmanager
+def profiled(path: Optional[str | Path]) -> Iterator[None]:
+    """Run the block under cProfile and dump stats to ``path`` (no-op when None)."""
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(str(path))
+        LOGGER.info("Wrote profile to %s", path)
@@ -0,0 +1,159 @@
+"""Async batched client for OpenAI-compatible chat completion endpoints."""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .utils import safe_get_env
+
+LOGGER = logging.getLogger(__name__)
+
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+DEFAULT_MODEL = "gpt-4o-mini"
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMRequestError(RuntimeError):
+    """Raised when a chat completion fails after all retries."""
+
+
+class AsyncLLMClient:
+    """Send many chat completions concurrently over a pooled keep-alive session.
+
+    Requests run on a dedicated thread pool sized to ``max_in_flight`` and are
+    orchestrated with asyncio, so a whole batch of prompts is in flight at once
+    while the number of open connections stays bounded. Rate-limit and transient
+    server errors are retried with exponential backoff, honouring ``Retry-After``.
+    Point ``base_url`` at a local mock server to exercise the client offline.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = DEFAULT_BASE_URL,
+        model: str = DEFAULT_MODEL,
+        max_in_flight: int = 8,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 30.0,
+        timeout: float = 30.0,
+    ) -> None:
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Authorization": f"Bearer {api_key}"})
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="llm")
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self) -> "AsyncLLMClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def build_payload(self, messages: List[Dict[str, str]], response_format: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": messages,
+            "response_format": response_format,
+            "temperature": 0,
+        }
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.max_backoff_seconds)
+                except ValueError:
+                    pass
+        delay = self.backoff_seconds * (2**attempt)
+        return min(delay, self.max_backoff_seconds) * (0.5 + random.random() / 2)
+
+    async def complete_json(
+        self,
+        messages: List[Dict[str, str]],
+        response_format: Dict[str, Any],
+        semaphore: asyncio.Semaphore,
+    ) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        payload = self.build_payload(messages, response_format)
+        url = f"{self.base_url}/chat/completions"
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            response = None
+            async with semaphore:
+                try:
+                    response = await loop.run_in_executor(
+                        self._executor,
+                        lambda: self.session.post(url, json=payload, timeout=self.timeout),
+                    )
+                except (requests.ConnectionError, requests.Timeout) as exc:
+                    last_error = exc
+            if response is not None:
+                if response.status_code not in RETRYABLE_STATUS:
+                    response.raise_for_status()
+                    content = response.json()["choices"][0]["message"]["content"]
+                    return json.loads(content)
+                last_error = requests.HTTPError(f"{response.status_code} from {url}", response=response)
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt, response)
+                LOGGER.debug("Retrying LLM request in %.2fs after %s", delay, last_error)
+                await asyncio.sleep(delay)
+        raise LLMRequestError(f"LLM request failed after {self.max_retries + 1} attempts: {last_error}")
+
+    async def _gather(
+        self,
+        conversations: Sequence[List[Dict[str, str]]],
+        response_format: Dict[str, Any],
+    ) -> List[Any]:
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        tasks = [self.complete_json(messages, response_format, semaphore) for messages in conversations]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    def complete_json_batch(
+        self,
+        conversations: Sequence[List[Dict[str, str]]],
+        response_format: Dict[str, Any],
+    ) -> List[Any]:
+        """Run all conversations concurrently; failed entries hold their exception."""
+        if not conversations:
+            return []
+        return asyncio.run(self._gather(conversations, response_format))
+
+
+def client_from_config(config: Dict[str, Any], api_key: Optional[str]) -> Optional[AsyncLLMClient]:
+    if not api_key:
+        return None
+    llm_cfg = config.get("llm", {}) or {}
+    base_url = safe_get_env("OPENAI_BASE_URL") or llm_cfg.get("base_url") or DEFAULT_BASE_URL
+    return AsyncLLMClient(
+        api_key,
+        base_url=base_url,
+        model=llm_cfg.get("model", DEFAULT_MODEL),
+        max_in_flight=llm_cfg.get("max_in_flight", 8),
+        max_retries=llm_cfg.get("max_retries", 5),
+        backoff_seconds=llm_cfg.get("backoff_seconds", 1.0),
+        max_backoff_seconds=llm_cfg.get("max_backoff_seconds", 30.0),
+        timeout=llm_cfg.get("timeout", 30.0),
+    )
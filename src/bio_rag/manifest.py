@@ -0,0 +1,209 @@
+"""Stage manifests: input hashes, config sections and code version next to outputs.
+
+A stage builds a manifest before doing any work and compares its fingerprint
+with the one stored beside the previous outputs. When they match and the
+recorded outputs are still intact, the stage can be skipped.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+from .runs import read_run_meta, write_json_atomic
+from .utils import read_json
+
+LOGGER = logging.getLogger(__name__)
+
+
+MANIFEST_SUFFIX = ".manifest.json"
+RUN_MANIFEST_FILE = "manifest.json"
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+
+_HASH_CACHE: Dict[Tuple[str, int, int], str] = {}
+
+
+def file_sha256(path: str | Path, chunk_size: int = 1 << 20) -> str:
+    """Content hash of a file, memoized per (path, size, mtime) within the process."""
+    path = Path(path)
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    digest = _HASH_CACHE.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as handle:
+            for block in iter(lambda: handle.read(chunk_size), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+        _HASH_CACHE[key] = digest
+    return digest
+
+
+_RANGE_HASH_CACHE: Dict[Tuple[str, int, int, int, int], str] = {}
+
+
+def range_sha256(path: str | Path, start: int, end: int, chunk_size: int = 1 << 20) -> str:
+    """Content hash of bytes ``start:end`` of a file, memoized like ``file_sha256``."""
+    path = Path(path)
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns, start, end)
+    digest = _RANGE_HASH_CACHE.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as handle:
+            handle.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                block = handle.read(min(chunk_size, remaining))
+                if not block:
+                    break
+                sha.update(block)
+                remaining -= len(block)
+        digest = sha.hexdigest()
+        _RANGE_HASH_CACHE[key] = digest
+    return digest
+
+
+def sqlite_table_sha256(db_path: str | Path, table: str, columns: Sequence[str], order_by: str) -> str:
+    """Hash the rows of one table, ignoring other tables that share the database file."""
+    sha = hashlib.sha256()
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY {order_by}")
+        for row in cursor:
+            sha.update(json.dumps(row, ensure_ascii=False).encode("utf-8"))
+            sha.update(b"\n")
+    return sha.hexdigest()
+
+
+def code_version(modules: Iterable[str]) -> str:
+    """Hash of the ``bio_rag`` module sources a stage depends on."""
+    sha = hashlib.sha256()
+    for module in sorted(set(modules)):
+        sha.update(module.encode("utf-8"))
+        sha.update((PACKAGE_DIR / f"{module}.py").read_bytes())
+    return sha.hexdigest()[:16]
+
+
+def _digest(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def stage_manifest(
+    stage: str,
+    inputs: Mapping[str, str | Path],
+    config: Optional[Mapping[str, Any]] = None,
+    modules: Iterable[str] = (),
+    params: Optional[Mapping[str, Any]] = None,
+    input_hashes: Optional[Mapping[str, str]] = None,
+) -> Dict[str, Any]:
+    """Describe one stage invocation.
+
+    ``inputs`` maps names to files hashed by content; ``input_hashes`` supplies
+    precomputed hashes (e.g. ``sqlite_table_sha256``). The fingerprint covers
+    hashes, config, code version and params, but not input paths or sizes.
+    """
+    hashes = {name: file_sha256(path) for name, path in inputs.items()}
+    hashes.update(input_hashes or {})
+    records = {name: {"path": str(inputs.get(name, "")), "sha256": digest} for name, digest in hashes.items()}
+    for name, path in inputs.items():
+        records[name]["bytes"] = Path(path).stat().st_size
+    manifest = {
+        "stage": stage,
+        "inputs": records,
+        "config": dict(config or {}),
+        "params": dict(params or {}),
+        "code_version": code_version(modules),
+    }
+    manifest["fingerprint"] = _digest(
+        {
+            "stage": stage,
+            "inputs": hashes,
+            "config": manifest["config"],
+            "params": manifest["params"],
+            "code_version": manifest["code_version"],
+        }
+    )
+    return manifest
+
+
+def manifest_path(output: str | Path) -> Path:
+    """``<file>.manifest.json`` for file outputs, ``<dir>/manifest.json`` for run directories."""
+    output = Path(output)
+    if output.is_dir():
+        return output / RUN_MANIFEST_FILE
+    return output.with_name(output.name + MANIFEST_SUFFIX)
+
+
+def read_manifest(output: str | Path) -> Dict[str, Any]:
+    path = manifest_path(output)
+    return read_json(path) if path.exists() else {}
+
+
+def write_manifest(output: str | Path, manifest: Mapping[str, Any], outputs: Sequence[str | Path] = ()) -> None:
+    """Store ``manifest`` with content hashes of ``outputs`` (default: ``output`` itself)."""
+    output = Path(output)
+    files = [Path(path) for path in outputs] or [output]
+    payload = dict(manifest)
+    payload["outputs"] = {str(path.name): file_sha256(path) for path in files}
+    payload["created"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    write_json_atomic(manifest_path(output), payload)
+
+
+def update_manifest(
+    output: str | Path,
+    manifest: Mapping[str, Any],
+    outputs: Sequence[str | Path],
+    changed: Sequence[str | Path],
+) -> None:
+    """Like ``write_manifest``, but reuse the stored digests of ``outputs`` not listed in ``changed``.
+
+    For outputs extended by adding files, so the unchanged ones are not hashed again.
+    """
+    stored = read_manifest(output).get("outputs") or {}
+    changed_names = {Path(path).name for path in changed}
+    payload = dict(manifest)
+    payload["outputs"] = {
+        path.name: stored[path.name] if path.name in stored and path.name not in changed_names else file_sha256(path)
+        for path in map(Path, outputs)
+    }
+    payload["created"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    write_json_atomic(manifest_path(output), payload)
+
+
+def is_up_to_date(output: str | Path, manifest: Mapping[str, Any]) -> bool:
+    """True when ``output`` was produced from the same fingerprint and is unmodified."""
+    output = Path(output)
+    stored = read_manifest(output) if output.exists() else {}
+    if not stored or stored.get("fingerprint") != manifest["fingerprint"]:
+        return False
+    base = output if output.is_dir() else output.parent
+    for name, digest in (stored.get("outputs") or {}).items():
+        path = base / name
+        if not path.exists() or file_sha256(path) != digest:
+            return False
+    return True
+
+
+def resumable(run_dir: str | Path, manifest: Mapping[str, Any]) -> bool:
+    """True when the run in ``run_dir`` was started under ``manifest``'s fingerprint.
+
+    The fingerprint is recorded in ``run.json`` when a run starts, so an
+    interrupted run is only finished under the inputs, config and code it began with.
+    """
+    return read_run_meta(run_dir).get("fingerprint") == manifest["fingerprint"]
+
+
+def find_completed_run(runs_dir: str | Path, manifest: Mapping[str, Any]) -> Optional[Path]:
+    """Most recent complete run directory whose manifest matches ``manifest``."""
+    runs_dir = Path(runs_dir)
+    if not runs_dir.is_dir():
+        return None
+    for run_dir in sorted((path for path in runs_dir.iterdir() if path.is_dir()), reverse=True):
+        if read_run_meta(run_dir).get("status") == "complete" and is_up_to_date(run_dir, manifest):
+            return run_dir
+    return None
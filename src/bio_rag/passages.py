@@ -0,0 +1,377 @@
+"""Sentence-level BM25 index for corpus-wide snippet retrieval.
+
+Every corpus sentence, split as in ``iter_corpus_sentences``, is indexed as a
+BM25 document of its own, so the best sentences for a question are found
+across the whole corpus instead of only inside the top ``retrieval.top_k``
+documents. Sentence rows are grouped by document: corpus row ``d`` owns
+sentence rows ``doc_ptr[d]:doc_ptr[d + 1]`` (sentence id = row - ``doc_ptr[d]``),
+and ``starts``/``ends`` are character offsets into the whitespace-normalized
+document text that ``simple_sentence_split`` splits.
+
+Documents appended to the corpus are indexed as delta segments
+(``corpus.jsonl.sentences.seg-0001.npz``, ...), keyed to the corpus bytes they
+were read from like the segments of the document index
+(``segments.append_segment``): the sentence log records the byte range and
+hash of the base and of every segment, and only the bytes past them are split
+and indexed on the next load. The vocabulary and collection statistics are
+shared, so rankings and scores equal those of a full rebuild.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .manifest import is_up_to_date, stage_manifest, update_manifest, write_manifest
+from .retrieval import BM25Index, CorpusStats
+from .runs import write_json_atomic
+from .segments import (
+    SegmentedIndex,
+    base_corpus_state,
+    corpus_ranges_sha256,
+    delta_postings,
+    extend_corpus_state,
+    load_part,
+    part_stats,
+    save_part,
+    segment_lock,
+)
+from .utils import normalize_whitespace, read_json, simple_sentence_split
+from .vocab import TokenizedCorpus, Vocabulary
+
+LOGGER = logging.getLogger(__name__)
+
+
+def split_sentences(
+    corpus: Sequence[Dict[str, str]],
+    max_sentences_per_doc: Optional[int] = None,
+) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """Sentences of ``corpus`` with their character offsets and per-document row pointers."""
+    sentences: List[str] = []
+    starts: List[int] = []
+    ends: List[int] = []
+    doc_ptr = np.zeros(len(corpus) + 1, dtype=np.int64)
+    for row, doc in enumerate(corpus):
+        text = normalize_whitespace(doc.get("text") or "")
+        split = simple_sentence_split(text)
+        if max_sentences_per_doc is not None:
+            split = split[:max_sentences_per_doc]
+        cursor = 0
+        for sentence in split:
+            start = text.index(sentence, cursor)
+            cursor = start + len(sentence)
+            sentences.append(sentence)
+            starts.append(start)
+            ends.append(cursor)
+        doc_ptr[row + 1] = len(sentences)
+    return sentences, np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64), doc_ptr
+
+
+def _save_rows(path: Path, doc_ptr: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> Path:
+    rows_path = path.with_name(path.name + ".rows.npz")
+    with open(rows_path, "wb") as handle:
+        np.savez(handle, doc_ptr=doc_ptr, starts=starts, ends=ends)
+    return rows_path
+
+
+class SentenceIndex:
+    """BM25 over corpus sentences plus the (document, sentence id, offsets) of every sentence row.
+
+    ``bm25`` is a ``BM25Index``, or a ``segments.SegmentedIndex`` once documents
+    have been appended.
+    """
+
+    def __init__(self, bm25: BM25Index, doc_ptr: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> None:
+        self.bm25 = bm25
+        self.doc_ptr = np.asarray(doc_ptr, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+
+    @property
+    def n_sentences(self) -> int:
+        return self.bm25.n_docs
+
+    @classmethod
+    def build(
+        cls,
+        corpus: Sequence[Dict[str, str]],
+        max_sentences_per_doc: Optional[int] = None,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ) -> "SentenceIndex":
+        sentences, starts, ends, doc_ptr = split_sentences(corpus, max_sentences_per_doc)
+        vocab = Vocabulary()
+        bm25 = BM25Index.from_tokenized(TokenizedCorpus.from_texts(sentences, vocab), vocab, k1=k1, b=b)
+        return cls(bm25, doc_ptr, starts, ends)
+
+    def save(self, path: str | Path) -> List[Path]:
+        """Write the BM25 postings to ``path`` and sentence locations to ``<path>.rows.npz``."""
+        path = Path(path)
+        vocab_path = self.bm25.save(path)
+        return [path, vocab_path, _save_rows(path, self.doc_ptr, self.starts, self.ends)]
+
+    @classmethod
+    def load(cls, path: str | Path, k1: float = 1.2, b: float = 0.75) -> "SentenceIndex":
+        path = Path(path)
+        bm25 = BM25Index.load(path, k1=k1, b=b)
+        with np.load(path.with_name(path.name + ".rows.npz")) as data:
+            return cls(bm25, data["doc_ptr"], data["starts"], data["ends"])
+
+    def locate(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Corpus rows and sentence ids of sentence ``rows``."""
+        owners = np.searchsorted(self.doc_ptr, rows, side="right") - 1
+        return owners, rows - self.doc_ptr[owners]
+
+    def rows_of(self, doc_rows: Sequence[int]) -> np.ndarray:
+        """Sentence rows of the given corpus rows."""
+        ranges = [np.arange(self.doc_ptr[row], self.doc_ptr[row + 1]) for row in doc_rows]
+        return np.concatenate(ranges).astype(np.int64) if ranges else np.zeros(0, dtype=np.int64)
+
+    def top_n(self, query: str, top_n: int = 100, pruning: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and BM25 scores of the best ``top_n`` sentences in the corpus."""
+        return self.bm25.top_k(self.bm25.vocab.encode_text(query), top_n, pruning=pruning)
+
+
+def _scaled(scores: np.ndarray) -> np.ndarray:
+    top = float(scores.max()) if len(scores) else 0.0
+    return scores / top if top > 0 else np.zeros(len(scores))
+
+
+def search_snippets(
+    query: str,
+    sentences: SentenceIndex,
+    corpus: Sequence[Dict[str, str]],
+    bm25,
+    retrieved: List[Dict[str, Any]],
+    rows_of_pmid: Mapping[str, int],
+    top_n: int = 100,
+    doc_weight: float = 0.3,
+    pruning: bool = False,
+    injected: Sequence[Dict[str, Any]] = (),
+) -> List[Dict[str, Any]]:
+    """Candidate snippets: the corpus-wide ``top_n`` sentences plus every sentence of ``injected``.
+
+    ``injected`` are distractor documents added to ``retrieved`` by the noise
+    stressor; their sentences stay candidates so they compete as with
+    per-document candidates, while the per-question cost does not grow with
+    ``retrieval.top_k``. ``score`` fuses the sentence and document BM25 scores,
+    each scaled by its maximum over the candidates:
+    ``(1 - doc_weight) * sentence + doc_weight * document``. Documents without a
+    score in ``retrieved`` are scored on ``bm25`` for their rows only.
+    """
+    query_ids = sentences.bm25.vocab.encode_text(query)
+    rows, _ = sentences.bm25.top_k(query_ids, top_n, pruning=pruning)
+    injected_rows = [rows_of_pmid[doc["pmid"]] for doc in injected if doc.get("pmid") in rows_of_pmid]
+    rows = np.union1d(rows, sentences.rows_of(injected_rows)).astype(np.int64)
+    if not len(rows):
+        return []
+    sentence_scores = sentences.bm25.score_rows(query_ids, rows)
+    owners, sentence_ids = sentences.locate(rows)
+
+    doc_scores = {
+        rows_of_pmid[doc["pmid"]]: float(doc["score"])
+        for doc in retrieved
+        if "score" in doc and doc.get("pmid") in rows_of_pmid
+    }
+    missing = sorted(set(owners.tolist()) - set(doc_scores))
+    if missing:
+        scores = bm25.score_rows(bm25.vocab.encode_text(query), missing)
+        doc_scores.update(zip(missing, scores.tolist()))
+    owner_scores = np.array([doc_scores[row] for row in owners.tolist()])
+    fused = (1 - doc_weight) * _scaled(sentence_scores) + doc_weight * _scaled(owner_scores)
+
+    texts: Dict[int, str] = {}
+    snippets: List[Dict[str, Any]] = []
+    for idx, (row, owner) in enumerate(zip(rows.tolist(), owners.tolist())):
+        if owner not in texts:
+            texts[owner] = normalize_whitespace(corpus[owner].get("text") or "")
+        start, end = int(sentences.starts[row]), int(sentences.ends[row])
+        snippets.append(
+            {
+                "pmid": corpus[owner].get("pmid"),
+                "sentence_id": int(sentence_ids[idx]),
+                "sentence": texts[owner][start:end],
+                "offsets": [start, end],
+                "doc_score": float(owner_scores[idx]),
+                "sentence_score": float(sentence_scores[idx]),
+                "score": float(fused[idx]),
+            }
+        )
+    return snippets
+
+
+def sentence_index_path(corpus_path: str | Path) -> Path:
+    corpus_path = Path(corpus_path)
+    return corpus_path.with_name(corpus_path.name + ".sentences.npz")
+
+
+def _log_path(path: Path) -> Path:
+    return path.with_name(path.name + ".segments.json")
+
+
+def _stats_path(path: Path) -> Path:
+    return path.with_name(path.name + ".stats.npz")
+
+
+def _segment_path(path: Path, number: int) -> Path:
+    return path.with_name(f"{path.name[: -len('.npz')]}.seg-{number:04d}.npz")
+
+
+def _sentence_manifest(corpus_sha256: str, max_sentences_per_doc: Optional[int]) -> Dict[str, Any]:
+    return stage_manifest(
+        "sentence_index",
+        {},
+        modules=["passages", "retrieval", "segments", "vocab", "utils"],
+        params={"max_sentences_per_doc": max_sentences_per_doc},
+        input_hashes={"corpus": corpus_sha256},
+    )
+
+
+def _outputs(path: Path, log: Dict[str, Any]) -> List[Path]:
+    outputs = [path, path.with_name(path.name + ".vocab.json"), path.with_name(path.name + ".rows.npz")]
+    outputs.append(_log_path(path))
+    if log["segments"]:
+        outputs.append(_stats_path(path))
+    for entry in log["segments"]:
+        segment = path.with_name(entry["file"])
+        outputs += [segment, segment.with_name(segment.name + ".rows.npz")]
+    return outputs
+
+
+def _load_sentence_index(path: Path, log: Dict[str, Any], k1: float, b: float) -> SentenceIndex:
+    if not log["segments"]:
+        return SentenceIndex.load(path, k1, b)
+    vocab = Vocabulary.load(path.with_name(path.name + ".vocab.json"))
+    stats = CorpusStats.load(_stats_path(path))
+    parts, offsets, doc_ptrs, starts, ends = [], [], [np.zeros(1, dtype=np.int64)], [], []
+    for part_path in [path] + [path.with_name(entry["file"]) for entry in log["segments"]]:
+        offsets.append(sum(part.n_docs for part in parts))
+        parts.append(load_part(part_path, vocab, stats, k1, b))
+        with np.load(part_path.with_name(part_path.name + ".rows.npz")) as data:
+            doc_ptrs.append(data["doc_ptr"][1:] + offsets[-1])
+            starts.append(data["starts"])
+            ends.append(data["ends"])
+    bm25 = SegmentedIndex(parts, offsets)
+    return SentenceIndex(bm25, np.concatenate(doc_ptrs), np.concatenate(starts), np.concatenate(ends))
+
+
+def _append_sentence_segment(
+    corpus: Sequence[Dict[str, str]],
+    corpus_path: Path,
+    path: Path,
+    log: Dict[str, Any],
+    max_sentences_per_doc: Optional[int],
+) -> Optional[Dict[str, Any]]:
+    """Index the corpus bytes past ``log["corpus"]`` as a new segment; ``None`` if they do not match ``corpus``."""
+    start_bytes = log["corpus"]["bytes"]
+    with open(corpus_path, "rb") as handle:
+        handle.seek(start_bytes)
+        data = handle.read()
+    end_bytes = start_bytes + len(data)
+    if not data.endswith(b"\n"):
+        return None
+    first_row = log["base_docs"] + sum(entry["n_docs"] for entry in log["segments"])
+    docs = [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+    if first_row + len(docs) != len(corpus):
+        return None
+
+    start = time.perf_counter()
+    vocab = Vocabulary.load(path.with_name(path.name + ".vocab.json"))
+    stats = CorpusStats.load(_stats_path(path)) if log["segments"] else part_stats(path)
+    sentences, starts, ends, doc_ptr = split_sentences(docs, max_sentences_per_doc)
+    tokenized, term_ptr, doc_ids, tfs, stats = delta_postings(sentences, vocab, stats)
+    number = max((entry["number"] for entry in log["segments"]), default=0) + 1
+    segment = _segment_path(path, number)
+    entry = {
+        "number": number,
+        "file": segment.name,
+        "first_row": first_row,
+        "n_docs": len(docs),
+        "n_sentences": len(sentences),
+        "corpus_bytes": [start_bytes, end_bytes],
+        "corpus_sha256": hashlib.sha256(data).hexdigest(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    save_part(segment, tokenized, term_ptr, doc_ids, tfs)
+    rows_path = _save_rows(segment, doc_ptr, starts, ends)
+    vocab.save(path.with_name(path.name + ".vocab.json"))
+    stats.save(_stats_path(path))
+    log = dict(log, segments=log["segments"] + [entry])
+    log["corpus"] = extend_corpus_state(log["corpus"], entry["corpus_sha256"], end_bytes)
+    write_json_atomic(_log_path(path), log)
+    changed = [segment, rows_path, path.with_name(path.name + ".vocab.json"), _stats_path(path), _log_path(path)]
+    manifest = _sentence_manifest(log["corpus"]["sha256"], max_sentences_per_doc)
+    update_manifest(path, manifest, outputs=_outputs(path, log), changed=changed)
+    LOGGER.info(
+        "Indexed %s sentences of %s appended docs as sentence segment %s in %.2fs",
+        len(sentences),
+        len(docs),
+        number,
+        time.perf_counter() - start,
+    )
+    return log
+
+
+def load_or_build_sentence_index(
+    corpus: Sequence[Dict[str, str]],
+    corpus_path: str | Path,
+    max_sentences_per_doc: Optional[int] = None,
+    k1: float = 1.2,
+    b: float = 0.75,
+    force: bool = False,
+) -> SentenceIndex:
+    """Reuse the sentence index persisted next to ``corpus_path``, indexing only documents appended since.
+
+    The index is rebuilt when any byte it was built from has changed.
+    """
+    corpus_path = Path(corpus_path)
+    path = sentence_index_path(corpus_path)
+    with segment_lock(corpus_path):
+        log = read_json(_log_path(path)) if _log_path(path).exists() else None
+        covered = corpus_ranges_sha256(corpus_path, log) if log and not force else None
+        if covered is not None and is_up_to_date(path, _sentence_manifest(covered, max_sentences_per_doc)):
+            current = log
+            if corpus_path.stat().st_size > log["corpus"]["bytes"]:
+                current = _append_sentence_segment(corpus, corpus_path, path, log, max_sentences_per_doc)
+            if current is not None:
+                LOGGER.info("Loading sentence index from %s with %s delta segments", path, len(current["segments"]))
+                return _load_sentence_index(path, current, k1, b)
+
+        for entry in log["segments"] if log else []:
+            segment = path.with_name(entry["file"])
+            segment.unlink(missing_ok=True)
+            segment.with_name(segment.name + ".rows.npz").unlink(missing_ok=True)
+        _stats_path(path).unlink(missing_ok=True)
+        sentences = SentenceIndex.build(corpus, max_sentences_per_doc, k1, b)
+        sentences.save(path)
+        log = {"base_docs": len(corpus), "corpus": base_corpus_state(corpus_path), "segments": []}
+        write_json_atomic(_log_path(path), log)
+        manifest = _sentence_manifest(log["corpus"]["sha256"], max_sentences_per_doc)
+        write_manifest(path, manifest, outputs=_outputs(path, log))
+    LOGGER.info("Saved sentence index of %s sentences to %s", sentences.n_sentences, path)
+    return sentences
+
+
+def sentence_index_from_config(
+    corpus: Sequence[Dict[str, str]],
+    corpus_path: str | Path,
+    config: Dict[str, Any],
+    force: bool = False,
+) -> Optional[SentenceIndex]:
+    """Sentence index for ``snippets.sentence_index``, or None when it is disabled."""
+    params = config["snippets"].get("sentence_index", {})
+    if not params.get("enabled", False):
+        return None
+    return load_or_build_sentence_index(
+        corpus,
+        corpus_path,
+        config["snippets"]["max_sentences_per_doc"],
+        params.get("bm25_k1", 1.2),
+        params.get("bm25_b", 0.75),
+        force,
+    )
@@ -1,15 +1,15 @@
 """PICO extraction and mismatch scoring."""
 from __future__ import annotations
 
-import json
 import logging
 import re
-from typing import Dict, Optional
+import sqlite3
+from multiprocessing import Pool
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
-import requests
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
 
+from .llm import AsyncLLMClient, LLMRequestError
 from .utils import normalize_whitespace
 
 LOGGER = logging.getLogger(__name__)
@@ -26,19 +26,24 @@ PICO_SCHEMA = {
 }
 
 
+POPULATION_RE = re.compile(r"(patients|adults|children|subjects|participants|women|men)[^,.]*", re.I)
+INTERVENTION_RE = re.compile(r"(treat|therapy|drug|intervention|procedure)[^,.]*", re.I)
+OUTCOME_RE = re.compile(r"(outcome|effect|response|survival|mortality)[^,.]*", re.I)
+
+
 def heuristic_pico(text: str) -> Dict[str, str]:
     text = normalize_whitespace(text)
     population = ""
     intervention = ""
     outcome = ""
 
-    pop_match = re.search(r"(patients|adults|children|subjects|participants|women|men)[^,.]*", text, re.I)
+    pop_match = POPULATION_RE.search(text)
     if pop_match:
         population = pop_match.group(0)
-    int_match = re.search(r"(treat|therapy|drug|intervention|procedure)[^,.]*", text, re.I)
+    int_match = INTERVENTION_RE.search(text)
     if int_match:
         intervention = int_match.group(0)
-    out_match = re.search(r"(outcome|effect|response|survival|mortality)[^,.]*", text, re.I)
+    out_match = OUTCOME_RE.search(text)
     if out_match:
         outcome = out_match.group(0)
 
@@ -49,49 +54,264 @@ def heuristic_pico(text: str) -> Dict[str, str]:
     }
 
 
-def llm_pico(text: str, api_key: str) -> Dict[str, str]:
-    payload = {
-        "model": "gpt-4o-mini",
-        "messages": [
-            {
-                "role": "system",
-                "content": "Extract PICO elements as JSON with keys population, intervention, outcome.",
-            },
-            {"role": "user", "content": text},
-        ],
-        "response_format": {"type": "json_schema", "json_schema": {"name": "pico", "schema": PICO_SCHEMA}},
-        "temperature": 0,
-    }
-    response = requests.post(
-        "https://api.openai.com/v1/chat/completions",
-        headers={"Authorization": f"Bearer {api_key}"},
-        json=payload,
-        timeout=30,
-    )
-    response.raise_for_status()
-    data = response.json()
-    content = data["choices"][0]["message"]["content"]
-    return json.loads(content)
-
-
-def extract_pico(text: str, api_key: Optional[str] = None) -> Dict[str, str]:
-    if api_key:
+PICO_RESPONSE_FORMAT = {"type": "json_schema", "json_schema": {"name": "pico", "schema": PICO_SCHEMA}}
+
+
+def pico_messages(text: str) -> List[Dict[str, str]]:
+    return [
+        {
+            "role": "system",
+            "content": "Extract PICO elements as JSON with keys population, intervention, outcome.",
+        },
+        {"role": "user", "content": text},
+    ]
+
+
+def llm_pico_batch(texts: Sequence[str], client: AsyncLLMClient) -> List[object]:
+    """Extract PICO for all texts concurrently; failed entries and non-object replies hold an exception."""
+    results = client.complete_json_batch([pico_messages(text) for text in texts], PICO_RESPONSE_FORMAT)
+    return [
+        result
+        if isinstance(result, (dict, Exception))
+        else LLMRequestError(f"LLM PICO reply is {type(result).__name__}, not a JSON object")
+        for result in results
+    ]
+
+
+def llm_pico(text: str, client: AsyncLLMClient) -> Dict[str, str]:
+    result = llm_pico_batch([text], client)[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def extract_pico(text: str, client: Optional[AsyncLLMClient] = None) -> Dict[str, str]:
+    """PICO for one text; ``client`` comes from ``llm.client_from_config`` and is reused across calls."""
+    if client:
         try:
-            return llm_pico(text, api_key)
+            return llm_pico(text, client)
         except Exception as exc:  # pylint: disable=broad-except
             LOGGER.warning("LLM PICO extraction failed: %s", exc)
     return heuristic_pico(text)
 
 
+def extract_pico_batch(
+    texts: Sequence[str],
+    client: Optional[AsyncLLMClient] = None,
+    cache: Optional[Dict[str, Dict[str, str]]] = None,
+) -> List[Dict[str, str]]:
+    """Extract PICO for many texts, memoized by normalized sentence.
+
+    Pass the same ``cache`` dict across calls so a sentence seen for an earlier
+    question is never re-extracted; only unseen texts reach the LLM.
+    """
+    if cache is None:
+        cache = {}
+    keys = [normalize_whitespace(text) for text in texts]
+    pending = list(dict.fromkeys(key for key in keys if key not in cache))
+    if pending:
+        if client:
+            for key, result in zip(pending, llm_pico_batch(pending, client)):
+                if isinstance(result, Exception):
+                    LOGGER.warning("LLM PICO extraction failed: %s", result)
+                    result = heuristic_pico(key)
+                cache[key] = result
+        else:
+            for key in pending:
+                cache[key] = heuristic_pico(key)
+    return [cache[key] for key in keys]
+
+
+def snippet_pico_batch(
+    snippets: Sequence[Dict[str, object]],
+    client: Optional[AsyncLLMClient] = None,
+    cache: Optional[Dict[str, Dict[str, str]]] = None,
+    db_path: Optional[str] = None,
+) -> List[Dict[str, str]]:
+    """PICO for snippets, read by sentence id from stored annotations when available.
+
+    Snippets without a stored annotation fall back to inline extraction.
+    """
+    method = "llm" if client else "heuristic"
+    keys = [(snippet.get("pmid"), snippet.get("sentence_id")) for snippet in snippets]
+    stored = load_pico_annotations(db_path, method, keys) if db_path else {}
+    missing = [snippet["sentence"] for snippet, key in zip(snippets, keys) if key not in stored]
+    extracted = iter(extract_pico_batch(missing, client, cache))
+    return [stored[key] if key in stored else next(extracted) for key in keys]
+
+
+PICO_FIELDS = ("population", "intervention", "outcome")
+
+
 def pico_similarity(a: str, b: str) -> float:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
     texts = [a or "", b or ""]
     vectorizer = TfidfVectorizer(stop_words="english")
-    vecs = vectorizer.fit_transform(texts)
+    try:
+        vecs = vectorizer.fit_transform(texts)
+    except ValueError:
+        return 0.0
     return float(cosine_similarity(vecs[0], vecs[1])[0, 0])
 
 
+def pico_mismatch_scores(question_pico: Dict[str, str], snippet_picos: Sequence[Dict[str, str]]) -> List[float]:
+    """Score every snippet against the question in one vectorizer pass.
+
+    All question and snippet P/I/O fields share one TF-IDF vocabulary; rows are
+    L2-normalized, so each field similarity is a row-wise dot product.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    if not snippet_picos:
+        return []
+    texts = [question_pico.get(field, "") or "" for field in PICO_FIELDS]
+    for snippet_pico in snippet_picos:
+        texts.extend(snippet_pico.get(field, "") or "" for field in PICO_FIELDS)
+    vectorizer = TfidfVectorizer(stop_words="english")
+    try:
+        vecs = vectorizer.fit_transform(texts)
+    except ValueError:
+        return [1.0] * len(snippet_picos)
+    n_fields = len(PICO_FIELDS)
+    total = np.zeros(len(snippet_picos))
+    for offset in range(n_fields):
+        snippet_vecs = vecs[n_fields + offset :: n_fields]
+        total += np.asarray(snippet_vecs.multiply(vecs[offset]).sum(axis=1)).ravel()
+    return [float(score) for score in 1.0 - total / n_fields]
+
+
 def pico_mismatch_score(question_pico: Dict[str, str], snippet_pico: Dict[str, str]) -> float:
-    p_sim = pico_similarity(question_pico.get("population", ""), snippet_pico.get("population", ""))
-    i_sim = pico_similarity(question_pico.get("intervention", ""), snippet_pico.get("intervention", ""))
-    o_sim = pico_similarity(question_pico.get("outcome", ""), snippet_pico.get("outcome", ""))
-    return float(1.0 - (p_sim + i_sim + o_sim) / 3.0)
+    return pico_mismatch_scores(question_pico, [snippet_pico])[0]
+
+
+def init_pico_table(db_path: str) -> None:
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pico_annotations (
+                pmid TEXT,
+                sentence_id INTEGER,
+                method TEXT,
+                population TEXT,
+                intervention TEXT,
+                outcome TEXT,
+                PRIMARY KEY (pmid, sentence_id, method)
+            )
+            """
+        )
+        conn.commit()
+
+
+def store_pico_annotations(
+    db_path: str,
+    method: str,
+    rows: Iterable[Tuple[str, int, Dict[str, str]]],
+) -> None:
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO pico_annotations "
+            "(pmid, sentence_id, method, population, intervention, outcome) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (pmid, sentence_id, method, pico.get("population"), pico.get("intervention"), pico.get("outcome"))
+                for pmid, sentence_id, pico in rows
+            ],
+        )
+        conn.commit()
+
+
+def load_pico_annotations(
+    db_path: str,
+    method: str,
+    keys: Iterable[Tuple[str, int]],
+) -> Dict[Tuple[str, int], Dict[str, str]]:
+    """Look up stored annotations for (pmid, sentence_id) keys; missing keys are omitted."""
+    wanted = set(keys)
+    pmids = sorted({pmid for pmid, _ in wanted})
+    if not pmids:
+        return {}
+    annotations: Dict[Tuple[str, int], Dict[str, str]] = {}
+    with sqlite3.connect(db_path) as conn:
+        if not conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='pico_annotations'").fetchone():
+            return {}
+        for start in range(0, len(pmids), 500):
+            chunk = pmids[start : start + 500]
+            placeholders = ",".join("?" for _ in chunk)
+            rows = conn.execute(
+                "SELECT pmid, sentence_id, population, intervention, outcome FROM pico_annotations "
+                f"WHERE method = ? AND pmid IN ({placeholders})",
+                [method, *chunk],
+            ).fetchall()
+            for pmid, sentence_id, population, intervention, outcome in rows:
+                if (pmid, sentence_id) in wanted:
+                    annotations[(pmid, sentence_id)] = {
+                        "population": population or "",
+                        "intervention": intervention or "",
+                        "outcome": outcome or "",
+                    }
+    return annotations
+
+
+def _heuristic_chunk(chunk: List[Tuple[str, int, str]]) -> List[Tuple[str, int, Dict[str, str]]]:
+    return [(pmid, sentence_id, heuristic_pico(sentence)) for pmid, sentence_id, sentence in chunk]
+
+
+def annotate_corpus_pico(
+    db_path: str,
+    sentences: Iterable[Tuple[str, int, str]],
+    client: Optional[AsyncLLMClient] = None,
+    workers: int = 1,
+    batch_size: int = 2000,
+) -> int:
+    """Annotate corpus sentences with PICO and store them next to the PubMed cache.
+
+    Heuristic extraction is spread over a process pool; LLM extraction is sent in
+    concurrent batches. Sentences already annotated with the same method are
+    skipped, so the stage can be re-run after the corpus grows; sentences whose
+    LLM request failed are left unannotated and retried on the next run.
+    """
+    method = "llm" if client else "heuristic"
+    init_pico_table(db_path)
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT pmid, sentence_id FROM pico_annotations WHERE method = ?", (method,))
+        done = set(rows.fetchall())
+    pool = Pool(workers) if not client and workers > 1 else None
+    written = 0
+    batch: List[Tuple[str, int, str]] = []
+
+    def flush(items: List[Tuple[str, int, str]]) -> int:
+        if client:
+            picos = llm_pico_batch([normalize_whitespace(sentence) for _, _, sentence in items], client)
+            rows = [
+                (pmid, sentence_id, pico)
+                for (pmid, sentence_id, _), pico in zip(items, picos)
+                if not isinstance(pico, Exception)
+            ]
+            if len(rows) < len(items):
+                LOGGER.warning("LLM PICO extraction failed for %s of %s sentences", len(items) - len(rows), len(items))
+        elif pool:
+            step = max(1, len(items) // (workers * 4))
+            chunks = [items[start : start + step] for start in range(0, len(items), step)]
+            rows = [row for part in pool.map(_heuristic_chunk, chunks) for row in part]
+        else:
+            rows = _heuristic_chunk(items)
+        store_pico_annotations(db_path, method, rows)
+        return len(rows)
+
+    try:
+        for pmid, sentence_id, sentence in sentences:
+            if (pmid, sentence_id) in done:
+                continue
+            batch.append((pmid, sentence_id, sentence))
+            if len(batch) >= batch_size:
+                written += flush(batch)
+                batch = []
+        if batch:
+            written += flush(batch)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    LOGGER.info("Stored %s %s PICO annotations in %s", written, method, db_path)
+    return written
@@ -0,0 +1,389 @@
+"""Baseline, stress and evaluation stages shared by the scripts and ``python -m bio_rag``."""
+from __future__ import annotations
+
+import logging
+import sqlite3
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from .dedup import DuplicateMap
+from .instrumentation import NULL_INSTRUMENTATION, Instrumentation, profiled
+from .llm import client_from_config
+from .manifest import is_up_to_date, sqlite_table_sha256, stage_manifest, write_manifest
+from .pico import extract_pico_batch, pico_mismatch_scores, snippet_pico_batch
+from .runs import LEGACY_PREDICTIONS_FILE, PREDICTIONS_FILE, RunWriter, has_predictions, iter_predictions
+from .snippets import build_candidate_snippets, collapse_duplicate_snippets, score_snippets, select_top_snippets
+from .stressors import detect_conflicts, inject_noise, judge_conflicts, remove_supporting_snippets
+from .utils import read_json, write_json
+
+LOGGER = logging.getLogger(__name__)
+
+# Question id -> (retrieved PMIDs, selected snippets) of the plain pipeline. Stages
+# run in one process share it, so only the noise stressor re-runs retrieval.
+PipelineMemo = Dict[str, Tuple[List[str], List[Dict[str, object]]]]
+
+
+def batched(items: Iterable[Dict[str, object]], size: int) -> Iterator[List[Dict[str, object]]]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, max(1, size)))
+        if not batch:
+            return
+        yield batch
+
+
+def retrieve_and_select(
+    question: Dict[str, object],
+    retriever,
+    corpus: List[Dict[str, str]],
+    config: Dict[str, object],
+    noise: bool = False,
+    inst: Instrumentation = NULL_INSTRUMENTATION,
+    memo: Optional[PipelineMemo] = None,
+    duplicates: Optional[DuplicateMap] = None,
+) -> Tuple[List[str], List[Dict[str, object]]]:
+    """Retrieved PMIDs and selected snippets; near-duplicate sentences in ``duplicates`` compete as one."""
+    if memo is not None and not noise and question["id"] in memo:
+        inst.count("memo_hits")
+        return memo[question["id"]]
+    top_k = config["retrieval"]["top_k"]
+    with inst.stage("retrieval"):
+        retrieved = retriever.retrieve(question["body"], top_k)
+    injected: List[Dict[str, str]] = []
+    if noise:
+        with inst.stage("noise_injection"):
+            noisy = inject_noise(retrieved, corpus, config["stressors"]["noise"]["distractor_k"])
+        injected = noisy[len(retrieved) :]
+        retrieved = noisy
+    # Only in-process retrievers carry a cache or a sentence index; noisy candidate sets are never
+    # cached, and neither are sentence-index candidates, which may come from documents outside ``retrieved``.
+    sentences = getattr(retriever, "sentences", None)
+    cache = getattr(retriever, "cache", None) if not noise and sentences is None else None
+    selected = None
+    if cache is not None:
+        with inst.stage("snippet_cache"):
+            selected = cache.get_snippets(
+                retriever.bm25, question["body"], top_k, config["snippets"], retrieved, duplicates
+            )
+    if selected is None:
+        if sentences is not None:
+            sentence_cfg = config["snippets"]["sentence_index"]
+            with inst.stage("sentence_retrieval"):
+                scored = retriever.retrieve_snippets(
+                    question["body"], retrieved, sentence_cfg["top_n"], sentence_cfg["doc_weight"], injected
+                )
+        else:
+            with inst.stage("snippet_candidates"):
+                candidates = build_candidate_snippets(retrieved, config["snippets"]["max_sentences_per_doc"])
+            with inst.stage("snippet_scoring"):
+                scored = score_snippets(question["body"], candidates)
+        with inst.stage("snippet_selection"):
+            if duplicates is not None:
+                scored = collapse_duplicate_snippets(scored, duplicates)
+            selected = select_top_snippets(scored, config["snippets"]["snippet_k"], config["snippets"]["mmr_lambda"])
+        if cache is not None:
+            cache.put_snippets(
+                retriever.bm25, question["body"], top_k, config["snippets"], retrieved, selected, duplicates
+            )
+    retrieved_pmids = [d["pmid"] for d in retrieved]
+    if memo is not None and not noise:
+        memo[question["id"]] = (retrieved_pmids, selected)
+    return retrieved_pmids, selected
+
+
+def run_pipeline(
+    question: Dict[str, object],
+    retriever,
+    corpus: List[Dict[str, str]],
+    config: Dict[str, object],
+    noise: bool = False,
+    unanswerable: bool = False,
+    inst: Instrumentation = NULL_INSTRUMENTATION,
+    memo: Optional[PipelineMemo] = None,
+    duplicates: Optional[DuplicateMap] = None,
+) -> Dict[str, object]:
+    retrieved_pmids, selected = retrieve_and_select(question, retriever, corpus, config, noise, inst, memo, duplicates)
+    if unanswerable:
+        with inst.stage("remove_supporting"):
+            selected = remove_supporting_snippets(selected, config["stressors"]["unanswerable"]["remove_top_n"])
+    return {
+        "question_id": question["id"],
+        "retrieved_pmids": list(retrieved_pmids),
+        "snippets": list(selected),
+        "predicted_exact": "insufficient evidence" if unanswerable else None,
+        "predicted_ideal": None,
+        "is_unanswerable": unanswerable,
+    }
+
+
+def duplicates_from_config(config: Dict[str, Any]) -> Optional[DuplicateMap]:
+    """Duplicate mapping written by ``03b_deduplicate_pubmed.py``, if enabled and present."""
+    db_path = config["paths"]["cache_db"]
+    if not config.get("dedup", {}).get("enabled", False) or not Path(db_path).exists():
+        return None
+    return DuplicateMap.from_db(db_path) or None
+
+
+def run_baseline(questions, writer: RunWriter, retriever, corpus, config, api_key, inst, memo=None) -> None:
+    duplicates = duplicates_from_config(config)
+    for question in questions:
+        with inst.question():
+            retrieved_pmids, selected = retrieve_and_select(
+                question, retriever, corpus, config, inst=inst, memo=memo, duplicates=duplicates
+            )
+            with inst.stage("write"):
+                writer.write(
+                    {
+                        "question_id": question["id"],
+                        "retrieved_pmids": retrieved_pmids,
+                        "snippets": selected,
+                        "predicted_exact": None,
+                        "predicted_ideal": None,
+                    }
+                )
+        inst.count("questions")
+
+
+def run_noise(questions, writer: RunWriter, retriever, corpus, config, api_key, inst, memo=None) -> None:
+    duplicates = duplicates_from_config(config)
+    for question in questions:
+        with inst.question():
+            pred = run_pipeline(question, retriever, corpus, config, noise=True, inst=inst, duplicates=duplicates)
+            writer.write(pred)
+
+
+def run_conflict(questions, writer: RunWriter, retriever, corpus, config, api_key, inst, memo=None) -> None:
+    judge = client_from_config(config, api_key) if config["stressors"]["conflict"]["llm_judge"] else None
+    duplicates = duplicates_from_config(config)
+    try:
+        for batch in batched(questions, config.get("llm", {}).get("batch_questions", 16)):
+            batch_preds = []
+            batch_conflicts = []
+            for question in batch:
+                with inst.question():
+                    pred = run_pipeline(
+                        question, retriever, corpus, config, inst=inst, memo=memo, duplicates=duplicates
+                    )
+                    with inst.stage("conflict_detection"):
+                        conflicts = detect_conflicts(
+                            pred["snippets"], config["stressors"]["conflict"]["similarity_threshold"], duplicates
+                        )
+                batch_preds.append(pred)
+                batch_conflicts.append(conflicts)
+            all_pairs = [pair for conflicts in batch_conflicts for pair in conflicts]
+            inst.count("conflict_pairs", len(all_pairs))
+            with inst.stage("conflict_judge"):
+                verdicts = judge_conflicts(all_pairs, judge) if judge else [True] * len(all_pairs)
+            offset = 0
+            for pred, conflicts in zip(batch_preds, batch_conflicts):
+                conflict_pairs = []
+                for (a, b), is_conflict in zip(conflicts, verdicts[offset : offset + len(conflicts)]):
+                    if is_conflict:
+                        conflict_pairs.append({"a": a, "b": b})
+                offset += len(conflicts)
+                pred["conflict_pairs"] = conflict_pairs
+                pred["is_conflict"] = len(conflict_pairs) > 0
+                writer.write(pred)
+    finally:
+        if judge:
+            judge.close()
+
+
+def run_unanswerable(questions, writer: RunWriter, retriever, corpus, config, api_key, inst, memo=None) -> None:
+    duplicates = duplicates_from_config(config)
+    for question in questions:
+        with inst.question():
+            pred = run_pipeline(
+                question, retriever, corpus, config, unanswerable=True, inst=inst, memo=memo, duplicates=duplicates
+            )
+            writer.write(pred)
+
+
+def run_pico_mismatch(questions, writer: RunWriter, retriever, corpus, config, api_key, inst, memo=None) -> None:
+    pico_client = client_from_config(config, api_key) if config["pico"]["llm_enabled"] else None
+    pico_cache: Dict[str, Dict[str, str]] = {}
+    annotations_db = config["paths"]["cache_db"] if config["pico"].get("use_annotations", True) else None
+    if annotations_db and not Path(annotations_db).exists():
+        annotations_db = None
+    duplicates = duplicates_from_config(config)
+    try:
+        for batch in batched(questions, config.get("llm", {}).get("batch_questions", 16)):
+            batch_preds = []
+            for question in batch:
+                with inst.question():
+                    pred = run_pipeline(
+                        question, retriever, corpus, config, inst=inst, memo=memo, duplicates=duplicates
+                    )
+                    batch_preds.append(pred)
+            with inst.stage("pico_extraction"):
+                question_picos = extract_pico_batch([question["body"] for question in batch], pico_client, pico_cache)
+                snippet_picos = snippet_pico_batch(
+                    [snippet for pred in batch_preds for snippet in pred["snippets"]],
+                    pico_client,
+                    pico_cache,
+                    annotations_db,
+                )
+            offset = 0
+            for pred, question_pico in zip(batch_preds, question_picos):
+                with inst.stage("pico_scoring"):
+                    mismatch_scores = pico_mismatch_scores(
+                        question_pico, snippet_picos[offset : offset + len(pred["snippets"])]
+                    )
+                offset += len(pred["snippets"])
+                avg_mismatch = float(sum(mismatch_scores) / len(mismatch_scores)) if mismatch_scores else 0.0
+                pred["pico_mismatch_score"] = avg_mismatch
+                pred["is_pico_mismatch"] = avg_mismatch >= config["stressors"]["pico_mismatch"]["mismatch_threshold"]
+                writer.write(pred)
+    finally:
+        if pico_client:
+            pico_client.close()
+
+
+STRESSORS: Dict[str, Callable[..., None]] = {
+    "noise": run_noise,
+    "conflict": run_conflict,
+    "unanswerable": run_unanswerable,
+    "pico_mismatch": run_pico_mismatch,
+}
+
+
+def run_manifest(
+    stage: str,
+    dataset_path: str | Path,
+    corpus_path: str | Path,
+    config: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Manifest of a baseline or stressor run: inputs, the config it reads and its code."""
+    # Pruning and segment compaction change retrieval speed, never rankings, so they do not invalidate runs.
+    retrieval = {key: value for key, value in config["retrieval"].items() if key not in ("pruning", "max_segments")}
+    sections: Dict[str, Any] = {"retrieval": retrieval, "snippets": config["snippets"]}
+    # Every module on the run path: loading the dataset and corpus, BM25 over base and delta
+    # segments, the result cache, snippet selection and the stressors with their imports.
+    modules = [
+        "cache",
+        "config",
+        "corpus",
+        "dataset",
+        "dedup",
+        "instrumentation",
+        "llm",
+        "manifest",
+        "pico",
+        "pipeline",
+        "retrieval",
+        "runs",
+        "segments",
+        "snippets",
+        "stressors",
+        "utils",
+        "vocab",
+    ]
+    if config["snippets"].get("sentence_index", {}).get("enabled", False):
+        modules.append("passages")
+    input_hashes = {}
+    if stage in STRESSORS:
+        sections["stressor"] = config["stressors"][stage]
+    if stage == "conflict" and config["stressors"]["conflict"]["llm_judge"]:
+        sections["llm_model"] = config.get("llm", {}).get("model")
+    db_path = config["paths"]["cache_db"]
+    # Snippet selection collapses duplicate sentences in every stage; conflict detection also skips them.
+    if config.get("dedup", {}).get("enabled", False) and Path(db_path).exists():
+        duplicate_tables = {
+            "pubmed_duplicates": (["pmid", "canonical_pmid"], "pmid"),
+            "sentence_duplicates": (["pmid", "sentence_id", "canonical_pmid", "canonical_sentence_id"], "pmid, sentence_id"),
+        }
+        for table, (columns, order_by) in duplicate_tables.items():
+            try:
+                input_hashes[table] = sqlite_table_sha256(db_path, table, columns, order_by)
+            except sqlite3.OperationalError:
+                pass
+    if stage == "pico_mismatch":
+        sections["pico"] = config["pico"]
+        if config["pico"]["llm_enabled"]:
+            sections["llm_model"] = config.get("llm", {}).get("model")
+        if config["pico"].get("use_annotations", True) and Path(db_path).exists():
+            columns = ["pmid", "sentence_id", "method", "population", "intervention", "outcome"]
+            try:
+                input_hashes["pico_annotations"] = sqlite_table_sha256(
+                    db_path, "pico_annotations", columns, "pmid, sentence_id, method"
+                )
+            except sqlite3.OperationalError:
+                pass
+    return stage_manifest(
+        stage,
+        {"dataset": dataset_path, "corpus": corpus_path},
+        config=sections,
+        modules=modules,
+        input_hashes=input_hashes,
+    )
+
+
+def finish_run_manifest(run_dir: Path, manifest: Mapping[str, Any]) -> None:
+    write_manifest(run_dir, manifest, outputs=[run_dir / PREDICTIONS_FILE])
+
+
+def evaluate_run_dirs(
+    run_dirs: Iterable[Path],
+    load_questions: Callable[[], Iterable[Dict[str, object]]],
+    sentences,
+    config: Dict[str, object],
+    profile: bool = False,
+    trace_memory: bool = False,
+    inputs: Optional[Mapping[str, str | Path]] = None,
+    force: bool = False,
+    canonical: Optional[Mapping[str, str]] = None,
+) -> List[Dict[str, object]]:
+    """Write ``report.json``/``report.csv`` for each run; ``load_questions`` is called once per run.
+
+    With ``inputs`` (dataset/corpus paths) each report gets a manifest, and runs
+    whose predictions, inputs and evaluation settings are unchanged are skipped.
+    ``canonical`` (``corpus.canonical_pmids``) credits gold PMIDs folded into a retrieved record.
+    """
+    from .evaluation import evaluate_run
+
+    reports = []
+    for run_path in run_dirs:
+        if not run_path.is_dir() or not has_predictions(run_path):
+            continue
+        manifest = None
+        if inputs is not None:
+            predictions_path = run_path / PREDICTIONS_FILE
+            if not predictions_path.exists():
+                predictions_path = run_path / LEGACY_PREDICTIONS_FILE
+            manifest = stage_manifest(
+                "evaluation",
+                {**inputs, "predictions": predictions_path},
+                config={"evaluation": config["evaluation"]},
+                modules=["corpus", "evaluation", "pipeline", "runs", "utils", "vocab"],
+            )
+            if not force and is_up_to_date(run_path / "report.json", manifest):
+                LOGGER.info("Report for %s is up to date", run_path.name)
+                reports.append(read_json(run_path / "report.json"))
+                continue
+        inst = Instrumentation(config.get("instrumentation", {}).get("enabled", True), trace_memory)
+        with profiled(run_path / "profile_eval.pstats" if profile else None), inst.stage("evaluation"):
+            summary, detail_df = evaluate_run(
+                load_questions(), iter_predictions(run_path), sentences, inst, canonical
+            )
+        inst.write(run_path / "timings.json", merge=True)
+        report = {"run_id": run_path.name, **summary}
+        reports.append(report)
+        write_json(run_path / "report.json", report)
+        detail_df.to_csv(run_path / "report.csv", index=False)
+        if manifest is not None:
+            write_manifest(run_path / "report.json", manifest, outputs=[run_path / "report.json", run_path / "report.csv"])
+        LOGGER.info("Saved report for %s", run_path.name)
+    return reports
+
+
+def write_aggregate_report(runs_dir: Path) -> List[Dict[str, object]]:
+    """Collect every run's ``report.json`` into ``runs_dir/report.{json,csv}``."""
+    import pandas as pd
+
+    reports = [read_json(path) for path in sorted(runs_dir.glob("*/report.json"))]
+    if reports:
+        pd.DataFrame(reports).to_csv(runs_dir / "report.csv", index=False)
+        write_json(runs_dir / "report.json", reports)
+        LOGGER.info("Saved aggregate report to %s", runs_dir)
+    return reports
@@ -1,33 +1,569 @@
 """Retrieval utilities."""
 from __future__ import annotations
 
+import copy
+import hashlib
 import logging
-from typing import Dict, List, Tuple
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Optional, Sequence, Tuple
 
-from rank_bm25 import BM25Okapi
+import numpy as np
 
-from .utils import tokenize
+from .manifest import is_up_to_date, stage_manifest, write_manifest
+from .vocab import TokenizedCorpus, Vocabulary
 
 LOGGER = logging.getLogger(__name__)
 
 
-def build_bm25(corpus: List[Dict[str, str]], k1: float = 1.2, b: float = 0.75) -> Tuple[BM25Okapi, List[List[str]]]:
-    tokenized = [tokenize(doc.get("text") or "") for doc in corpus]
-    bm25 = BM25Okapi(tokenized, k1=k1, b=b)
+class CorpusStats:
+    """Collection statistics BM25 weights depend on, shared by all parts of a split index.
+
+    ``doc_freqs`` is indexed by term id of the shared vocabulary.
+    """
+
+    def __init__(self, n_docs: int, total_length: int, doc_freqs: np.ndarray) -> None:
+        self.n_docs = int(n_docs)
+        self.total_length = int(total_length)
+        self.doc_freqs = np.asarray(doc_freqs, dtype=np.int64)
+
+    @property
+    def avgdl(self) -> float:
+        return float(self.total_length) / self.n_docs if self.n_docs else 0.0
+
+    def save(self, path: str | Path) -> None:
+        with open(path, "wb") as handle:
+            np.savez(handle, n_docs=self.n_docs, total_length=self.total_length, doc_freqs=self.doc_freqs)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "CorpusStats":
+        with np.load(path) as data:
+            return cls(int(data["n_docs"]), int(data["total_length"]), data["doc_freqs"])
+
+
+class BM25Index:
+    """Okapi BM25 over term postings built from integer token ids.
+
+    Postings are stored column-major: the documents containing term ``t`` are
+    ``doc_ids[term_ptr[t]:term_ptr[t + 1]]`` with matching raw term frequencies in
+    ``tfs``. IDF, the negative-IDF epsilon floor and length normalization follow
+    ``rank_bm25.BM25Okapi``, so scores match it up to floating point rounding.
+
+    ``top_k(..., pruning=True)`` uses MaxScore-style dynamic pruning over
+    per-term and per-block maximum weights (blocks of ``block_size`` consecutive
+    rows); it returns exactly the exhaustive ranking.
+
+    With ``stats`` the index covers only part of a collection (a shard or
+    segment): IDF and the average document length come from the whole
+    collection, so its scores equal those of one index over everything.
+    """
+
+    def __init__(
+        self,
+        vocab: Vocabulary,
+        doc_lengths: np.ndarray,
+        term_ptr: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        block_size: int = 8,
+        stats: Optional[CorpusStats] = None,
+    ) -> None:
+        self.vocab = vocab
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.int64)
+        self.term_ptr = np.asarray(term_ptr, dtype=np.int64)
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        self.tfs = np.asarray(tfs, dtype=np.int32)
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.n_docs = len(self.doc_lengths)
+        self.stats = stats
+        if stats is None:
+            self.total_docs = self.n_docs
+            self.avgdl = float(self.doc_lengths.sum()) / self.n_docs if self.n_docs else 0.0
+            self.idf = self._compute_idf(np.diff(self.term_ptr))
+        else:
+            self.total_docs = stats.n_docs
+            self.avgdl = stats.avgdl
+            self.idf = self._compute_idf(stats.doc_freqs)
+        self.weights = self._compute_weights()
+        self.block_size = max(1, block_size)
+        self._bounds: Optional[PruningBounds] = None
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def fingerprint(self) -> str:
+        """Content hash of the postings and vocabulary (independent of k1/b)."""
+        if self._fingerprint is None:
+            sha = hashlib.sha256()
+            for array in (self.doc_lengths, self.term_ptr, self.doc_ids, self.tfs):
+                sha.update(np.ascontiguousarray(array).data)
+            sha.update("\n".join(self.vocab.id_to_token).encode("utf-8"))
+            sha.update(repr(self.epsilon).encode("utf-8"))
+            if self.stats is not None:
+                sha.update(repr((self.stats.n_docs, self.stats.total_length)).encode("utf-8"))
+                sha.update(np.ascontiguousarray(self.stats.doc_freqs).data)
+            self._fingerprint = sha.hexdigest()[:16]
+        return self._fingerprint
+
+    @classmethod
+    def from_tokenized(
+        cls,
+        tokenized: TokenizedCorpus,
+        vocab: Vocabulary,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ) -> "BM25Index":
+        term_ptr, doc_ids, tfs = build_postings(tokenized, len(vocab))
+        return cls(vocab, tokenized.lengths, term_ptr, doc_ids, tfs, k1=k1, b=b)
+
+    def reweighted(self, k1: float, b: float) -> "BM25Index":
+        """Same postings and IDF with BM25 weights recomputed for another (k1, b)."""
+        index = copy.copy(self)
+        index.k1 = k1
+        index.b = b
+        index.weights = index._compute_weights()
+        index._bounds = None
+        return index
+
+    def save(self, path: str | Path) -> Path:
+        """Write postings to ``path`` (npz) and the vocabulary to ``<path>.vocab.json``.
+
+        IDF and BM25 weights depend on k1/b and are recomputed on load.
+        """
+        path = Path(path)
+        with open(path, "wb") as handle:
+            np.savez(handle, doc_lengths=self.doc_lengths, term_ptr=self.term_ptr, doc_ids=self.doc_ids, tfs=self.tfs)
+        vocab_path = path.with_name(path.name + ".vocab.json")
+        self.vocab.save(vocab_path)
+        return vocab_path
+
+    @classmethod
+    def load(cls, path: str | Path, k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        path = Path(path)
+        vocab = Vocabulary.load(path.with_name(path.name + ".vocab.json"))
+        with np.load(path) as data:
+            return cls(vocab, data["doc_lengths"], data["term_ptr"], data["doc_ids"], data["tfs"], k1=k1, b=b)
+
+    def _compute_idf(self, doc_freqs: np.ndarray) -> np.ndarray:
+        idf = np.log(self.total_docs - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+        if len(idf):
+            idf[idf < 0] = self.epsilon * float(idf.mean())
+        return idf
+
+    def _compute_weights(self) -> np.ndarray:
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / self.avgdl) if self.avgdl else np.zeros(0)
+        term_of_posting = np.repeat(np.arange(len(self.idf)), np.diff(self.term_ptr))
+        tf = self.tfs.astype(np.float64)
+        return self.idf[term_of_posting] * (tf * (self.k1 + 1) / (tf + norm[self.doc_ids]))
+
+    def score_ids(self, query_ids: Sequence[int]) -> np.ndarray:
+        scores = np.zeros(self.n_docs)
+        terms, counts = np.unique(np.asarray(query_ids, dtype=np.int64), return_counts=True)
+        for term, count in zip(terms, counts.astype(np.float64)):
+            start, end = self.term_ptr[term], self.term_ptr[term + 1]
+            scores[self.doc_ids[start:end]] += count * self.weights[start:end]
+        return scores
+
+    def score_batch(self, queries: Sequence[Sequence[int]]) -> np.ndarray:
+        """Score many queries at once, reading each term's postings once per batch.
+
+        Terms are accumulated in ascending id order with their query counts, the
+        same order ``score_ids`` uses, so each row equals the single-query scores.
+        """
+        scores = np.zeros((len(queries), self.n_docs))
+        users: Dict[int, List[Tuple[int, float]]] = {}
+        for row, query_ids in enumerate(queries):
+            terms, counts = np.unique(np.asarray(query_ids, dtype=np.int64), return_counts=True)
+            for term, count in zip(terms.tolist(), counts.tolist()):
+                users.setdefault(term, []).append((row, float(count)))
+        for term in sorted(users):
+            start, end = self.term_ptr[term], self.term_ptr[term + 1]
+            rows = np.array([row for row, _ in users[term]])
+            counts = np.array([count for _, count in users[term]])
+            scores[np.ix_(rows, self.doc_ids[start:end])] += counts[:, None] * self.weights[start:end][None, :]
+        return scores
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        lookup = self.vocab.token_to_id
+        return self.score_ids([lookup[token] for token in query if token in lookup])
+
+    def score_rows(self, query_ids: Sequence[int], rows: Sequence[int]) -> np.ndarray:
+        """Scores of the given rows only, equal to ``score_ids(query_ids)[rows]``."""
+        rows = np.asarray(rows, dtype=np.int64)
+        terms, counts = np.unique(np.asarray(query_ids, dtype=np.int64), return_counts=True)
+        order = np.argsort(rows, kind="stable")
+        scores = np.zeros(len(rows))
+        scores[order] = self._score_rows(terms, counts.astype(np.float64), rows[order], {})
+        return scores
+
+    def top_k(self, query_ids: Sequence[int], top_k: int = 10, pruning: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and scores of the best ``top_k`` documents, ties broken by row order."""
+        if pruning:
+            return self.top_k_pruned(query_ids, top_k)
+        scores = self.score_ids(query_ids)
+        rows = rank_scores(scores, top_k)
+        return rows, scores[rows]
+
+    @property
+    def bounds(self) -> "PruningBounds":
+        """Per-term and per-block weight maxima for the current k1/b, built on first use."""
+        if self._bounds is None:
+            self._bounds = PruningBounds.from_index(self)
+        return self._bounds
+
+    def _score_rows(
+        self,
+        terms: np.ndarray,
+        counts: np.ndarray,
+        rows: np.ndarray,
+        known: Dict[int, np.ndarray],
+        absent: Collection[int] = (),
+    ) -> np.ndarray:
+        """Exact scores of the sorted ``rows``, summed in the order ``score_ids`` uses.
+
+        ``known`` maps positions in ``terms`` to already gathered contributions;
+        terms at ``absent`` positions contain none of ``rows`` and are skipped.
+        """
+        scores = np.zeros(len(rows))
+        for pos, (term, count) in enumerate(zip(terms, counts)):
+            if pos in known:
+                scores += known[pos]
+                continue
+            if pos in absent:
+                continue
+            start, end = self.term_ptr[term], self.term_ptr[term + 1]
+            postings = self.doc_ids[start:end]
+            at = np.searchsorted(postings, rows)
+            found = at < len(postings)
+            found[found] = postings[at[found]] == rows[found]
+            scores[found] += count * self.weights[start:end][at[found]]
+        return scores
+
+    def top_k_pruned(self, query_ids: Sequence[int], top_k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """``top_k`` without scoring documents that provably cannot reach the result.
+
+        Terms are visited from the shortest postings list up. A document first
+        seen in a term's postings does not occur in the terms already visited,
+        so its score is at most its weight for this term plus the block maxima
+        of the terms still ahead; it is scored exactly only if that bound
+        reaches the current k-th score. The loop stops once the summed maxima of
+        the remaining terms fall below that score, so long postings lists are
+        only probed for candidates, never scanned. Queries whose result could
+        include zero or negative scores fall back to exhaustive scoring, which
+        keeps the ranking identical in every case.
+        """
+        terms, counts = np.unique(np.asarray(query_ids, dtype=np.int64), return_counts=True)
+        counts = counts.astype(np.float64)
+        bounds = self.bounds
+        if top_k <= 0 or not len(terms) or (bounds.term_min[terms] < 0).any():
+            return self.top_k(query_ids, top_k)
+
+        order = np.argsort(self.term_ptr[terms + 1] - self.term_ptr[terms], kind="stable")
+        upper = (counts * bounds.term_max[terms])[order]
+        remaining = np.append(np.cumsum(upper[::-1])[::-1], 0.0)[1:]
+        tolerance = _BOUND_SLACK * float(upper.sum())
+        # Per block: summed maxima of the terms not visited yet.
+        later = [bounds.blocks_of(terms[idx]) for idx in order[1:]]
+        block_bound = np.bincount(
+            np.concatenate([ids for ids, _ in later] + [np.zeros(0, dtype=bounds.block_ids.dtype)]),
+            np.concatenate([count * maxima for count, (_, maxima) in zip(counts[order[1:]], later)] + [np.zeros(0)]),
+            minlength=bounds.n_blocks,
+        )
+        seen = np.zeros(self.n_docs, dtype=bool)
+        rows = np.zeros(0, dtype=self.doc_ids.dtype)
+        scores = np.zeros(0)
+        threshold = -np.inf
+        for step, idx in enumerate(order):
+            if step:
+                ids, maxima = bounds.blocks_of(terms[idx])
+                block_bound[ids] -= counts[idx] * maxima
+            start, end = self.term_ptr[terms[idx]], self.term_ptr[terms[idx] + 1]
+            postings = self.doc_ids[start:end]
+            fresh = ~seen[postings]
+            new_rows = postings[fresh]
+            seen[new_rows] = True
+            own = counts[idx] * self.weights[start:end][fresh]
+            bound = own + block_bound[new_rows // self.block_size]
+            visited = set(order[:step].tolist())
+            batches = [np.arange(len(new_rows))]
+            if not np.isfinite(threshold) and len(new_rows) > top_k:
+                # Score the most promising rows first to set a threshold for the rest.
+                first = np.zeros(len(new_rows), dtype=bool)
+                first[np.argpartition(-bound, top_k - 1)[:top_k]] = True
+                batches = [np.flatnonzero(first), np.flatnonzero(~first)]
+            for batch in batches:
+                batch = batch[bound[batch] + tolerance >= threshold]
+                if not len(batch):
+                    continue
+                exact = self._score_rows(terms, counts, new_rows[batch], {idx: own[batch]}, visited)
+                rows = np.concatenate([rows, new_rows[batch]])
+                scores = np.concatenate([scores, exact])
+                if len(rows) >= top_k:
+                    threshold = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+            if threshold > 0 and remaining[step] + tolerance < threshold:
+                break
+        if not threshold > 0:
+            return self.top_k(query_ids, top_k)
+        ranked = np.lexsort((rows, -scores))[:top_k]
+        return rows[ranked].astype(np.int64), scores[ranked]
+
+    def top_k_batch(
+        self,
+        queries: Sequence[Sequence[int]],
+        top_k: int = 10,
+        max_cells: int = 1 << 25,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """``top_k`` for many queries; the dense score block is capped at ``max_cells``."""
+        step = max(1, max_cells // max(self.n_docs, 1))
+        results = []
+        for start in range(0, len(queries), step):
+            for scores in self.score_batch(queries[start : start + step]):
+                rows = rank_scores(scores, top_k)
+                results.append((rows, scores[rows]))
+        return results
+
+
+def build_postings(tokenized: TokenizedCorpus, n_terms: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """``(term_ptr, doc_ids, tfs)`` postings of ``tokenized``, documents ascending within each term."""
+    n_docs = len(tokenized)
+    doc_of_token = np.repeat(np.arange(n_docs, dtype=np.int64), tokenized.lengths)
+    keys = tokenized.ids.astype(np.int64) * max(n_docs, 1) + doc_of_token
+    unique_keys, counts = np.unique(keys, return_counts=True)
+    terms = unique_keys // max(n_docs, 1)
+    term_ptr = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(np.bincount(terms, minlength=n_terms), out=term_ptr[1:])
+    doc_ids = unique_keys % max(n_docs, 1)
+    return term_ptr, doc_ids, counts
+
+
+# Margin, relative to the query's summed term maxima, so rounding in how bounds are
+# accumulated can never prune a document whose exact score ties the threshold.
+_BOUND_SLACK = 1e-9
+
+
+class PruningBounds:
+    """Maximum BM25 weight of every term, overall and per block of rows.
+
+    Block maxima are stored like the postings: the blocks in which term ``t``
+    occurs are ``block_ids[block_ptr[t]:block_ptr[t + 1]]`` (ascending) with their
+    maxima in ``block_max``. ``term_min`` flags terms with negative weights.
+    """
+
+    def __init__(
+        self,
+        block_size: int,
+        n_blocks: int,
+        term_max: np.ndarray,
+        term_min: np.ndarray,
+        block_ptr: np.ndarray,
+        block_ids: np.ndarray,
+        block_max: np.ndarray,
+    ) -> None:
+        self.block_size = block_size
+        self.n_blocks = n_blocks
+        self.term_max = term_max
+        self.term_min = term_min
+        self.block_ptr = block_ptr
+        self.block_ids = block_ids
+        self.block_max = block_max
+
+    @classmethod
+    def from_index(cls, index: BM25Index) -> "PruningBounds":
+        n_terms = len(index.term_ptr) - 1
+        n_blocks = -(-index.n_docs // index.block_size)
+        term_max = np.zeros(n_terms)
+        term_min = np.zeros(n_terms)
+        if not len(index.weights):
+            empty = np.zeros(0, dtype=index.doc_ids.dtype)
+            block_ptr = np.zeros(n_terms + 1, dtype=np.int64)
+            return cls(index.block_size, n_blocks, term_max, term_min, block_ptr, empty, np.zeros(0))
+        term_of_posting = np.repeat(np.arange(n_terms), np.diff(index.term_ptr))
+        blocks = index.doc_ids // index.block_size
+        change = np.ones(len(blocks), dtype=bool)
+        change[1:] = (term_of_posting[1:] != term_of_posting[:-1]) | (blocks[1:] != blocks[:-1])
+        starts = np.flatnonzero(change)
+        block_max = np.maximum.reduceat(index.weights, starts)
+        block_ptr = np.searchsorted(starts, index.term_ptr)
+        nonempty = np.flatnonzero(np.diff(index.term_ptr))
+        term_max[nonempty] = np.maximum.reduceat(block_max, block_ptr[nonempty])
+        term_min[nonempty] = np.minimum.reduceat(index.weights, index.term_ptr[nonempty])
+        # Single precision halves the footprint; round up so maxima stay upper bounds.
+        rounded = block_max.astype(np.float32)
+        low = rounded < block_max
+        rounded[low] = np.nextafter(rounded[low], np.float32(np.inf))
+        return cls(index.block_size, n_blocks, term_max, term_min, block_ptr, blocks[starts], rounded)
+
+    def blocks_of(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids and weight maxima of the blocks in which ``term`` occurs."""
+        start, end = self.block_ptr[term], self.block_ptr[term + 1]
+        return self.block_ids[start:end], self.block_max[start:end]
+
+
+def rank_scores(scores: np.ndarray, top_k: int) -> np.ndarray:
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if top_k < len(scores):
+        partition = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = np.flatnonzero(scores >= scores[partition].min())
+    else:
+        candidates = np.arange(len(scores))
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order[:top_k]]
+
+
+def build_bm25(corpus: List[Dict[str, str]], k1: float = 1.2, b: float = 0.75) -> Tuple[BM25Index, TokenizedCorpus]:
+    vocab = Vocabulary()
+    tokenized = TokenizedCorpus.from_texts([doc.get("text") or "" for doc in corpus], vocab)
+    bm25 = BM25Index.from_tokenized(tokenized, vocab, k1=k1, b=b)
     return bm25, tokenized
 
 
+def index_path(corpus_path: str | Path) -> Path:
+    corpus_path = Path(corpus_path)
+    return corpus_path.with_name(corpus_path.name + ".bm25.npz")
+
+
+def index_manifest(corpus_path: str | Path, corpus_sha256: Optional[str] = None) -> Dict[str, Any]:
+    """Manifest of the persisted index; ``corpus_sha256`` stands in for the corpus file hash.
+
+    An index extended with delta segments records the running corpus hash of
+    ``segments.indexed_corpus_sha256`` instead of the file hash.
+    """
+    modules = ["retrieval", "vocab", "utils"]
+    if corpus_sha256 is None:
+        return stage_manifest("bm25_index", {"corpus": corpus_path}, modules=modules)
+    return stage_manifest("bm25_index", {}, modules=modules, input_hashes={"corpus": corpus_sha256})
+
+
+def load_or_build_bm25(
+    corpus: List[Dict[str, str]],
+    corpus_path: str | Path,
+    k1: float = 1.2,
+    b: float = 0.75,
+    force: bool = False,
+    max_segments: Optional[int] = None,
+):
+    """Reuse the index persisted next to ``corpus_path`` when the corpus is unchanged.
+
+    An index extended with delta segments (``segments.append_segment``) loads
+    as a ``segments.SegmentedIndex``; with ``max_segments`` segments or more a
+    background compaction folds them into the base index for the next load.
+    """
+    # Imported here: ``segments`` builds on this module.
+    from .segments import (
+        compact_in_background,
+        has_segments,
+        indexed_corpus_sha256,
+        load_segmented,
+        remove_segments,
+        segment_lock,
+        write_pmids,
+    )
+
+    path = index_path(corpus_path)
+    # Shared: a compaction must not replace the base index or delete segments mid-load.
+    with segment_lock(corpus_path, shared=True):
+        manifest = index_manifest(corpus_path, indexed_corpus_sha256(corpus_path))
+        if not force and is_up_to_date(path, manifest):
+            if not has_segments(corpus_path):
+                LOGGER.info("Loading BM25 index from %s", path)
+                return BM25Index.load(path, k1=k1, b=b)
+            bm25 = load_segmented(corpus_path, k1, b)
+            LOGGER.info("Loading BM25 index from %s with %s delta segments", path, len(bm25.parts) - 1)
+        else:
+            bm25 = None
+    if bm25 is not None:
+        if max_segments and len(bm25.parts) - 1 >= max_segments:
+            compact_in_background(corpus_path)
+        return bm25
+    with segment_lock(corpus_path):
+        remove_segments(corpus_path)
+        bm25, _ = build_bm25(corpus, k1, b)
+        vocab_path = bm25.save(path)
+        pmids_path = write_pmids(corpus_path, corpus)
+        write_manifest(path, index_manifest(corpus_path), outputs=[path, vocab_path, pmids_path])
+    LOGGER.info("Saved BM25 index to %s", path)
+    return bm25
+
+
 def retrieve_top_k(
     query: str,
     corpus: List[Dict[str, str]],
-    bm25: BM25Okapi,
+    bm25: BM25Index,
     top_k: int = 10,
+    cache=None,
+    pruning: bool = False,
 ) -> List[Dict[str, str]]:
-    scores = bm25.get_scores(tokenize(query))
-    ranked = sorted(range(len(corpus)), key=lambda idx: scores[idx], reverse=True)
+    """Best ``top_k`` documents for ``query``; ``cache`` is an optional ``RetrievalCache``.
+
+    ``pruning`` selects ``BM25Index.top_k_pruned``, which ranks identically.
+    """
+    hit = cache.get_top_k(bm25, query, top_k) if cache is not None else None
+    if hit is not None:
+        rows, scores = hit
+    else:
+        rows, scores = bm25.top_k(bm25.vocab.encode_text(query), top_k, pruning=pruning)
+        if cache is not None:
+            cache.put_top_k(bm25, query, top_k, rows, scores)
     results = []
-    for idx in ranked[:top_k]:
+    for idx, score in zip(rows, scores):
         doc = dict(corpus[idx])
-        doc["score"] = float(scores[idx])
+        doc["score"] = float(score)
         results.append(doc)
     return results
+
+
+class Retriever:
+    """In-process retrieval over a loaded corpus; same interface as the service client.
+
+    ``sentences`` is an optional ``passages.SentenceIndex`` over the same
+    corpus, used by ``retrieve_snippets``.
+    """
+
+    def __init__(
+        self,
+        corpus: List[Dict[str, str]],
+        bm25: BM25Index,
+        cache=None,
+        pruning: bool = False,
+        sentences=None,
+    ) -> None:
+        self.corpus = corpus
+        self.bm25 = bm25
+        self.cache = cache
+        self.pruning = pruning
+        self.sentences = sentences
+        self._rows: Optional[Dict[str, int]] = None
+
+    def retrieve(self, query: str, top_k: int = 10) -> List[Dict[str, str]]:
+        return retrieve_top_k(query, self.corpus, self.bm25, top_k, self.cache, self.pruning)
+
+    def retrieve_snippets(
+        self,
+        query: str,
+        retrieved: List[Dict[str, Any]],
+        top_n: int = 100,
+        doc_weight: float = 0.3,
+        injected: Sequence[Dict[str, Any]] = (),
+    ) -> List[Dict[str, Any]]:
+        """Corpus-wide snippet candidates fused with document scores (``passages.search_snippets``)."""
+        from .passages import search_snippets
+
+        if self._rows is None:
+            self._rows = {doc.get("pmid"): row for row, doc in enumerate(self.corpus)}
+        return search_snippets(
+            query,
+            self.sentences,
+            self.corpus,
+            self.bm25,
+            retrieved,
+            self._rows,
+            top_n,
+            doc_weight,
+            self.pruning,
+            injected,
+        )
@@ -0,0 +1,159 @@
+"""Run directories: streaming, resumable prediction output in a compact JSONL format."""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from .corpus import SentenceTable
+from .utils import ensure_dir, iter_jsonl, read_json
+
+LOGGER = logging.getLogger(__name__)
+
+
+PREDICTIONS_FILE = "predictions.jsonl"
+LEGACY_PREDICTIONS_FILE = "predictions.json"
+
+
+def snippet_ref(snippet: Dict[str, Any]) -> List[Any]:
+    return [snippet.get("pmid"), snippet.get("sentence_id"), snippet.get("score", 0.0)]
+
+
+def compact_prediction(pred: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace embedded snippet dicts with (pmid, sentence_id, score) references."""
+    record = dict(pred)
+    record["snippets"] = [snippet_ref(snippet) for snippet in pred.get("snippets") or []]
+    if "conflict_pairs" in pred:
+        record["conflict_pairs"] = [
+            [snippet_ref(pair["a"])[:2], snippet_ref(pair["b"])[:2]] for pair in pred["conflict_pairs"]
+        ]
+    return record
+
+
+def snippet_texts(pred: Dict[str, Any], sentences: Optional[SentenceTable] = None) -> List[str]:
+    """Sentence text for each predicted snippet, in either run format."""
+    texts = []
+    for snippet in pred.get("snippets") or []:
+        if isinstance(snippet, dict):
+            texts.append(snippet["sentence"])
+        elif sentences is not None:
+            texts.append(sentences.get(snippet[0], snippet[1]))
+        else:
+            raise ValueError("Compact snippet references need a corpus sentence table")
+    return texts
+
+
+RUN_META_FILE = "run.json"
+
+
+def write_json_atomic(path: str | Path, payload: Any) -> None:
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(payload, handle, ensure_ascii=False, indent=2)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_run_meta(run_dir: str | Path) -> Dict[str, Any]:
+    path = Path(run_dir) / RUN_META_FILE
+    return read_json(path) if path.exists() else {}
+
+
+def _recover_completed(path: Path) -> Set[str]:
+    """Question ids already written; a torn trailing record is truncated away."""
+    completed: Set[str] = set()
+    if not path.exists():
+        return completed
+    end = 0
+    with open(path, "rb+") as handle:
+        for line in handle:
+            if not line.endswith(b"\n"):
+                break
+            end += len(line)
+            if line.strip():
+                completed.add(json.loads(line)["question_id"])
+        if handle.seek(0, os.SEEK_END) > end:
+            LOGGER.warning("Dropping incomplete trailing record in %s", path)
+            handle.truncate(end)
+    return completed
+
+
+class RunWriter:
+    """Append one compact JSONL record per question to ``predictions.jsonl``.
+
+    Every record is flushed as soon as its question finishes, so the predictions
+    file doubles as the checkpoint of completed question ids. ``run.json`` keeps
+    the run metadata and progress. With ``resume=True`` an existing run is
+    reopened for appending and ``completed`` lists the questions to skip.
+    """
+
+    def __init__(
+        self,
+        run_dir: str | Path,
+        stressor: str = "baseline",
+        resume: bool = False,
+        meta: Optional[Dict[str, Any]] = None,
+        checkpoint_every: int = 50,
+    ) -> None:
+        self.run_dir = Path(run_dir)
+        ensure_dir(self.run_dir)
+        self.path = self.run_dir / PREDICTIONS_FILE
+        self.completed: Set[str] = _recover_completed(self.path) if resume else set()
+        self.meta = {**read_run_meta(self.run_dir), **(meta or {})} if resume else dict(meta or {})
+        self.meta.update({"run_id": self.run_dir.name, "stressor": stressor, "status": "running"})
+        self.checkpoint_every = max(1, checkpoint_every)
+        if resume and self.completed:
+            LOGGER.info("Resuming %s with %s completed questions", self.run_dir.name, len(self.completed))
+        self.handle = open(self.path, "a" if resume else "w", encoding="utf-8")
+        self.count = 0
+        self._checkpoint()
+
+    def _checkpoint(self) -> None:
+        self.handle.flush()
+        os.fsync(self.handle.fileno())
+        self.meta["completed"] = len(self.completed)
+        write_json_atomic(self.run_dir / RUN_META_FILE, self.meta)
+
+    def write(self, pred: Dict[str, Any]) -> None:
+        self.handle.write(json.dumps(compact_prediction(pred), ensure_ascii=False) + "\n")
+        self.handle.flush()
+        self.completed.add(pred["question_id"])
+        self.count += 1
+        if self.count % self.checkpoint_every == 0:
+            self._checkpoint()
+
+    def pending(self, questions: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for question in questions:
+            if question["id"] not in self.completed:
+                yield question
+
+    def close(self, status: str = "complete") -> None:
+        if self.handle.closed:
+            return
+        self.meta["status"] = status
+        self._checkpoint()
+        self.handle.close()
+
+    def __enter__(self) -> "RunWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        self.close("complete" if exc_type is None else "failed")
+
+
+def has_predictions(run_dir: str | Path) -> bool:
+    run_dir = Path(run_dir)
+    return (run_dir / PREDICTIONS_FILE).exists() or (run_dir / LEGACY_PREDICTIONS_FILE).exists()
+
+
+def iter_predictions(run_dir: str | Path) -> Iterator[Dict[str, Any]]:
+    """Stream predictions from a run directory; legacy ``predictions.json`` is loaded whole."""
+    run_dir = Path(run_dir)
+    if (run_dir / PREDICTIONS_FILE).exists():
+        yield from iter_jsonl(run_dir / PREDICTIONS_FILE)
+    elif (run_dir / LEGACY_PREDICTIONS_FILE).exists():
+        yield from read_json(run_dir / LEGACY_PREDICTIONS_FILE)
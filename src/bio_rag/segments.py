@@ -0,0 +1,535 @@
+"""Append-only delta segments for the corpus and its persisted BM25 index.
+
+``append_segment`` appends new records to ``corpus.jsonl`` and indexes only
+those documents into a segment file next to the persisted index
+(``corpus.jsonl.bm25.seg-0001.npz``, ...). The vocabulary grows by appending
+unseen tokens, and the collection statistics (N, total length, document
+frequencies) are updated by adding the segment's, so term ids, IDF and the
+average document length are those of one index over the appended corpus.
+
+An append costs time in the appended documents only. The segment log keeps a
+running hash of the corpus: the hash of the corpus the base index was built
+from, chained with the hash of every appended byte range. The index manifest
+records it in place of the corpus file hash. The PMIDs of all indexed rows are
+kept in ``corpus.jsonl.bm25.npz.pmids.txt``. Loading checks the running hash
+against the corpus file, range by range.
+
+``SegmentedIndex`` ranks the base index and every segment separately and
+merges the partial top-k lists on (-score, row), which gives exactly the
+rankings and scores of a full rebuild. ``compact`` folds the segments back into
+the base index by merging postings, without re-tokenizing;
+``load_or_build_bm25`` runs it in a background thread once
+``retrieval.max_segments`` segments have accumulated. Appends and compaction
+hold an exclusive file lock (``corpus.jsonl.bm25.npz.segments.lock``) and
+loading holds it shared, so a compaction in another process or thread never
+swaps the base index or deletes segments under an append or a load.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .manifest import file_sha256, is_up_to_date, range_sha256, read_manifest, update_manifest, write_manifest
+from .retrieval import BM25Index, CorpusStats, build_postings, index_manifest, index_path
+from .runs import write_json_atomic
+from .utils import iter_jsonl, read_json
+from .vocab import TokenizedCorpus, Vocabulary
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+LOGGER = logging.getLogger(__name__)
+
+
+# flock excludes other processes; threads of this one queue on the lock first.
+_THREAD_LOCK = threading.Lock()
+
+
+def segment_log_path(corpus_path: str | Path) -> Path:
+    path = index_path(corpus_path)
+    return path.with_name(path.name + ".segments.json")
+
+
+def _vocab_path(corpus_path: str | Path) -> Path:
+    path = index_path(corpus_path)
+    return path.with_name(path.name + ".segments.vocab.json")
+
+
+def _stats_path(corpus_path: str | Path) -> Path:
+    path = index_path(corpus_path)
+    return path.with_name(path.name + ".segments.stats.npz")
+
+
+def _segment_path(corpus_path: str | Path, number: int) -> Path:
+    path = index_path(corpus_path)
+    return path.with_name(f"{path.name[: -len('.npz')]}.seg-{number:04d}.npz")
+
+
+def _pmids_path(corpus_path: str | Path) -> Path:
+    path = index_path(corpus_path)
+    return path.with_name(path.name + ".pmids.txt")
+
+
+def _lock_path(corpus_path: str | Path) -> Path:
+    path = index_path(corpus_path)
+    return path.with_name(path.name + ".segments.lock")
+
+
+@contextmanager
+def segment_lock(corpus_path: str | Path, shared: bool = False) -> Iterator[None]:
+    """Lock on the index and segment state of ``corpus_path``, across processes.
+
+    ``append_segment`` and ``compact`` hold it exclusively, so an append from
+    another process cannot land between compaction's segment-log check and the
+    swap of the base index. Readers hold it ``shared`` from the manifest check
+    until the index is loaded. Not reentrant.
+    """
+    with _THREAD_LOCK, open(_lock_path(corpus_path), "a", encoding="utf-8") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+
+
+def has_segments(corpus_path: str | Path) -> bool:
+    return segment_log_path(corpus_path).exists()
+
+
+def _index_outputs(corpus_path: str | Path, log: Optional[Dict[str, Any]]) -> List[Path]:
+    """Files covered by the index manifest: the base index, its PMID list and any segment state."""
+    path = index_path(corpus_path)
+    outputs = [path, path.with_name(path.name + ".vocab.json")]
+    if _pmids_path(corpus_path).exists():
+        outputs.append(_pmids_path(corpus_path))
+    if log and log["segments"]:
+        outputs += [segment_log_path(corpus_path), _vocab_path(corpus_path), _stats_path(corpus_path)]
+        outputs += [path.with_name(entry["file"]) for entry in log["segments"]]
+    return outputs
+
+
+def remove_segments(corpus_path: str | Path) -> None:
+    """Delete segment files and state, e.g. after a full rebuild or a compaction."""
+    log_path = segment_log_path(corpus_path)
+    if not log_path.exists():
+        return
+    log = read_json(log_path)
+    for entry in log["segments"]:
+        index_path(corpus_path).with_name(entry["file"]).unlink(missing_ok=True)
+    _vocab_path(corpus_path).unlink(missing_ok=True)
+    _stats_path(corpus_path).unlink(missing_ok=True)
+    log_path.unlink()
+
+
+def write_pmids(corpus_path: str | Path, corpus: Sequence[Dict[str, str]]) -> Path:
+    """Write the PMIDs of the indexed rows next to the index, one per line in row order."""
+    path = _pmids_path(corpus_path)
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.writelines(f"{doc.get('pmid')}\n" for doc in corpus)
+    return path
+
+
+def _read_pmids(path: Path) -> Set[str]:
+    with open(path, encoding="utf-8") as handle:
+        return {line.rstrip("\n") for line in handle}
+
+
+def _chain_sha256(previous: str, appended: str) -> str:
+    return hashlib.sha256(f"{previous}:{appended}".encode("utf-8")).hexdigest()
+
+
+def base_corpus_state(corpus_path: str | Path) -> Dict[str, Any]:
+    """Corpus state of an index built over the whole corpus file: one base range, no appends."""
+    size = Path(corpus_path).stat().st_size
+    digest = file_sha256(corpus_path)
+    return {"base_bytes": size, "base_sha256": digest, "bytes": size, "sha256": digest}
+
+
+def extend_corpus_state(state: Dict[str, Any], appended_sha256: str, end: int) -> Dict[str, Any]:
+    """``state`` after appending bytes ``state["bytes"]:end`` whose hash is ``appended_sha256``."""
+    return dict(state, bytes=end, sha256=_chain_sha256(state["sha256"], appended_sha256))
+
+
+def corpus_ranges_sha256(corpus_path: str | Path, log: Dict[str, Any]) -> Optional[str]:
+    """Running hash of the corpus prefix ``log`` covers, if every recorded byte range still matches.
+
+    ``log["corpus"]`` holds the base range and the running hash, and every
+    segment its ``corpus_bytes`` range and ``corpus_sha256``; ``None`` when any
+    range differs. Bytes past the prefix are not checked.
+    """
+    state = log.get("corpus")
+    if not state or Path(corpus_path).stat().st_size < state["bytes"]:
+        return None
+    if range_sha256(corpus_path, 0, state["base_bytes"]) != state["base_sha256"]:
+        return None
+    running = state["base_sha256"]
+    for entry in log["segments"]:
+        start, end = entry["corpus_bytes"]
+        if range_sha256(corpus_path, start, end) != entry["corpus_sha256"]:
+            return None
+        running = _chain_sha256(running, entry["corpus_sha256"])
+    return running if running == state["sha256"] else None
+
+
+def _corpus_state(corpus_path: str | Path) -> Optional[Dict[str, Any]]:
+    """Byte length and running hash of the indexed corpus, or ``None`` if the index is not current.
+
+    Checked without hashing the corpus: it only grows by appends, so its size
+    and the manifest fingerprint, which covers the running hash and the code
+    version, stand in for the hash here. Loading verifies the hash itself.
+    """
+    stored = read_manifest(index_path(corpus_path))
+    if not stored:
+        return None
+    if has_segments(corpus_path):
+        state = read_json(segment_log_path(corpus_path)).get("corpus")
+    else:
+        record = (stored.get("inputs") or {}).get("corpus") or {}
+        state = None
+        if "bytes" in record:
+            state = {"base_bytes": record["bytes"], "base_sha256": record["sha256"]}
+            state.update(bytes=record["bytes"], sha256=record["sha256"])
+    if not state or Path(corpus_path).stat().st_size != state["bytes"]:
+        return None
+    if stored["fingerprint"] != index_manifest(corpus_path, state["sha256"])["fingerprint"]:
+        return None
+    return state
+
+
+def indexed_corpus_sha256(corpus_path: str | Path) -> Optional[str]:
+    """Running corpus hash of an index with segments, if the corpus file still matches it.
+
+    ``None`` without segments (the index manifest then holds the file hash) or
+    when any byte range differs, so that the index is rebuilt.
+    """
+    if not has_segments(corpus_path):
+        return None
+    log = read_json(segment_log_path(corpus_path))
+    if not log.get("corpus") or Path(corpus_path).stat().st_size != log["corpus"]["bytes"]:
+        return None
+    return corpus_ranges_sha256(corpus_path, log)
+
+
+def _indexed_pmids(corpus_path: Path, state: Optional[Dict[str, Any]]) -> Set[str]:
+    """PMIDs of the corpus rows; read from the PMID list when the index is current, else from the corpus."""
+    if state is not None and _pmids_path(corpus_path).exists():
+        return _read_pmids(_pmids_path(corpus_path))
+    pmids = [row.get("pmid") for row in iter_jsonl(corpus_path)]
+    if state is not None:
+        write_pmids(corpus_path, [{"pmid": pmid} for pmid in pmids])
+    return set(pmids)
+
+
+def corpus_pmids(corpus_path: str | Path) -> Set[str]:
+    """PMIDs already in the corpus, without reading it when the index is current."""
+    corpus_path = Path(corpus_path)
+    if not corpus_path.exists():
+        return set()
+    with segment_lock(corpus_path, shared=True):
+        state = _corpus_state(corpus_path)
+        if state is not None and _pmids_path(corpus_path).exists():
+            return _read_pmids(_pmids_path(corpus_path))
+        return {row.get("pmid") for row in iter_jsonl(corpus_path)}
+
+
+def _pad_term_ptr(term_ptr: np.ndarray, n_terms: int) -> np.ndarray:
+    """Extend postings offsets to a grown vocabulary; added terms have no postings."""
+    term_ptr = np.asarray(term_ptr, dtype=np.int64)
+    missing = n_terms + 1 - len(term_ptr)
+    return np.concatenate([term_ptr, np.full(missing, term_ptr[-1], dtype=np.int64)]) if missing > 0 else term_ptr
+
+
+def part_stats(path: str | Path) -> CorpusStats:
+    """Collection statistics of one saved index part on its own."""
+    with np.load(path) as data:
+        doc_lengths, term_ptr = data["doc_lengths"], data["term_ptr"]
+    return CorpusStats(len(doc_lengths), int(doc_lengths.sum()), np.diff(term_ptr))
+
+
+def delta_postings(
+    texts: Sequence[str],
+    vocab: Vocabulary,
+    stats: CorpusStats,
+) -> Tuple[TokenizedCorpus, np.ndarray, np.ndarray, np.ndarray, CorpusStats]:
+    """Tokenize ``texts`` into ``vocab`` (growing it) and build their postings.
+
+    Returns the tokenized texts, their postings and ``stats`` updated with them.
+    """
+    n_known = len(vocab)
+    tokenized = TokenizedCorpus.from_texts(texts, vocab)
+    term_ptr, doc_ids, tfs = build_postings(tokenized, len(vocab))
+    doc_freqs = np.zeros(len(vocab), dtype=np.int64)
+    doc_freqs[:n_known] = stats.doc_freqs
+    doc_freqs += np.diff(term_ptr)
+    stats = CorpusStats(stats.n_docs + len(texts), stats.total_length + int(tokenized.lengths.sum()), doc_freqs)
+    return tokenized, term_ptr, doc_ids, tfs, stats
+
+
+def save_part(
+    path: str | Path,
+    tokenized: TokenizedCorpus,
+    term_ptr: np.ndarray,
+    doc_ids: np.ndarray,
+    tfs: np.ndarray,
+) -> None:
+    with open(path, "wb") as handle:
+        np.savez(
+            handle,
+            doc_lengths=tokenized.lengths,
+            term_ptr=term_ptr,
+            doc_ids=doc_ids.astype(np.int32),
+            tfs=tfs.astype(np.int32),
+        )
+
+
+def load_part(path: str | Path, vocab: Vocabulary, stats: CorpusStats, k1: float = 1.2, b: float = 0.75) -> BM25Index:
+    """One saved part, weighted with the statistics of the whole collection."""
+    with np.load(path) as data:
+        term_ptr = _pad_term_ptr(data["term_ptr"], len(vocab))
+        return BM25Index(vocab, data["doc_lengths"], term_ptr, data["doc_ids"], data["tfs"], k1=k1, b=b, stats=stats)
+
+
+def _load_state(corpus_path: str | Path) -> Tuple[Dict[str, Any], Vocabulary, CorpusStats]:
+    """Segment log, shared vocabulary and collection statistics; derived from the base index if no segments yet."""
+    if has_segments(corpus_path):
+        log = read_json(segment_log_path(corpus_path))
+        return log, Vocabulary.load(_vocab_path(corpus_path)), CorpusStats.load(_stats_path(corpus_path))
+    path = index_path(corpus_path)
+    vocab = Vocabulary.load(path.with_name(path.name + ".vocab.json"))
+    stats = part_stats(path)
+    return {"base_docs": stats.n_docs, "segments": []}, vocab, stats
+
+
+def append_segment(corpus_path: str | Path, docs: Sequence[Dict[str, str]]) -> Optional[Dict[str, Any]]:
+    """Append ``docs`` to the corpus and index only them as a new segment.
+
+    Documents whose PMID is already in the corpus are skipped. Returns the
+    segment entry, or ``None`` when there is nothing new or no up-to-date index
+    to extend; the documents are appended either way and the next
+    ``load_or_build_bm25`` then rebuilds the index in full.
+    """
+    corpus_path = Path(corpus_path)
+    with segment_lock(corpus_path):
+        state = _corpus_state(corpus_path)
+        known = _indexed_pmids(corpus_path, state)
+        docs = [doc for doc in docs if doc.get("pmid") not in known]
+        if not docs:
+            return None
+        data = "".join(json.dumps(doc, ensure_ascii=False) + "\n" for doc in docs).encode("utf-8")
+        if state is None:
+            _append_corpus(corpus_path, data)
+            LOGGER.info(
+                "No current index for %s; appended %s docs, index is rebuilt on next load", corpus_path, len(docs)
+            )
+            return None
+
+        start = time.perf_counter()
+        log, vocab, stats = _load_state(corpus_path)
+        n_known = len(vocab)
+        tokenized, term_ptr, doc_ids, tfs, stats = delta_postings([doc.get("text") or "" for doc in docs], vocab, stats)
+        number = max((entry["number"] for entry in log["segments"]), default=0) + 1
+        entry = {
+            "number": number,
+            "file": _segment_path(corpus_path, number).name,
+            "first_row": log["base_docs"] + sum(seg["n_docs"] for seg in log["segments"]),
+            "n_docs": len(docs),
+            "corpus_bytes": [state["bytes"], state["bytes"] + len(data)],
+            "corpus_sha256": hashlib.sha256(data).hexdigest(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        save_part(_segment_path(corpus_path, number), tokenized, term_ptr, doc_ids, tfs)
+        log["segments"].append(entry)
+        log["corpus"] = extend_corpus_state(state, entry["corpus_sha256"], entry["corpus_bytes"][1])
+        vocab.save(_vocab_path(corpus_path))
+        stats.save(_stats_path(corpus_path))
+        with open(_pmids_path(corpus_path), "a", encoding="utf-8") as handle:
+            handle.writelines(f"{doc.get('pmid')}\n" for doc in docs)
+        write_json_atomic(segment_log_path(corpus_path), log)
+
+        _append_corpus(corpus_path, data)
+        changed = [
+            _segment_path(corpus_path, number),
+            _vocab_path(corpus_path),
+            _stats_path(corpus_path),
+            _pmids_path(corpus_path),
+            segment_log_path(corpus_path),
+        ]
+        update_manifest(
+            index_path(corpus_path),
+            index_manifest(corpus_path, log["corpus"]["sha256"]),
+            outputs=_index_outputs(corpus_path, log),
+            changed=changed,
+        )
+        LOGGER.info(
+            "Indexed %s new docs as segment %s (%s new terms) in %.2fs",
+            len(docs),
+            number,
+            len(vocab) - n_known,
+            time.perf_counter() - start,
+        )
+        return entry
+
+
+def _append_corpus(corpus_path: Path, data: bytes) -> None:
+    # ``data`` is serialized as by ``utils.write_jsonl``.
+    with open(corpus_path, "ab") as handle:
+        handle.write(data)
+
+
+def load_segmented(corpus_path: str | Path, k1: float = 1.2, b: float = 0.75) -> "SegmentedIndex":
+    """Base index plus all segments, every part weighted with the collection statistics.
+
+    Call under ``segment_lock(corpus_path, shared=True)``, as ``load_or_build_bm25`` does.
+    """
+    path = index_path(corpus_path)
+    log, vocab, stats = _load_state(corpus_path)
+    files = [(path.name, 0)] + [(entry["file"], entry["first_row"]) for entry in log["segments"]]
+    parts = [load_part(path.with_name(name), vocab, stats, k1, b) for name, _ in files]
+    return SegmentedIndex(parts, [first_row for _, first_row in files])
+
+
+class SegmentedIndex:
+    """Base index and delta segments queried as one collection; same query interface as ``BM25Index``.
+
+    Part ``i`` holds corpus rows ``offsets[i]:offsets[i] + parts[i].n_docs``.
+    Parts share the vocabulary and the collection statistics, so each document
+    scores as in a single index, and partial top-k lists merge on
+    (-score, row) with the same tie-break.
+    """
+
+    def __init__(self, parts: Sequence[BM25Index], offsets: Sequence[int]) -> None:
+        self.parts = list(parts)
+        self.offsets = [int(offset) for offset in offsets]
+        self.vocab = self.parts[0].vocab
+        self.k1 = self.parts[0].k1
+        self.b = self.parts[0].b
+        self.stats = self.parts[0].stats
+        self.avgdl = self.parts[0].avgdl
+        self.idf = self.parts[0].idf
+        self.n_docs = sum(part.n_docs for part in self.parts)
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            sha = hashlib.sha256()
+            for part, offset in zip(self.parts, self.offsets):
+                sha.update(f"{offset}:{part.fingerprint}\n".encode("utf-8"))
+            self._fingerprint = sha.hexdigest()[:16]
+        return self._fingerprint
+
+    def reweighted(self, k1: float, b: float) -> "SegmentedIndex":
+        return SegmentedIndex([part.reweighted(k1, b) for part in self.parts], self.offsets)
+
+    def score_ids(self, query_ids: Sequence[int]) -> np.ndarray:
+        return np.concatenate([part.score_ids(query_ids) for part in self.parts])
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        lookup = self.vocab.token_to_id
+        return self.score_ids([lookup[token] for token in query if token in lookup])
+
+    def score_rows(self, query_ids: Sequence[int], rows: Sequence[int]) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        scores = np.zeros(len(rows))
+        for part, offset in zip(self.parts, self.offsets):
+            mine = (rows >= offset) & (rows < offset + part.n_docs)
+            if mine.any():
+                scores[mine] = part.score_rows(query_ids, rows[mine] - offset)
+        return scores
+
+    def _merge(self, partials: Sequence[Tuple[np.ndarray, np.ndarray]], top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        rows = np.concatenate([local + offset for (local, _), offset in zip(partials, self.offsets)])
+        scores = np.concatenate([scores for _, scores in partials])
+        ranked = np.lexsort((rows, -scores))[:top_k]
+        return rows[ranked], scores[ranked]
+
+    def top_k(self, query_ids: Sequence[int], top_k: int = 10, pruning: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        return self._merge([part.top_k(query_ids, top_k, pruning=pruning) for part in self.parts], top_k)
+
+    def top_k_pruned(self, query_ids: Sequence[int], top_k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        return self.top_k(query_ids, top_k, pruning=True)
+
+    def top_k_batch(self, queries: Sequence[Sequence[int]], top_k: int = 10) -> List[Tuple[np.ndarray, np.ndarray]]:
+        per_part = [part.top_k_batch(queries, top_k) for part in self.parts]
+        return [self._merge([results[idx] for results in per_part], top_k) for idx in range(len(queries))]
+
+
+def compact(corpus_path: str | Path) -> bool:
+    """Merge all segments into the base index; returns False if there was nothing (current) to compact.
+
+    Postings are concatenated per term in row order, so the result equals the
+    index ``build_bm25`` would produce for the whole corpus.
+    """
+    corpus_path = Path(corpus_path)
+    path = index_path(corpus_path)
+    with segment_lock(corpus_path):
+        if not has_segments(corpus_path):
+            return False
+        corpus_sha256 = indexed_corpus_sha256(corpus_path)
+        if corpus_sha256 is None or not is_up_to_date(path, index_manifest(corpus_path, corpus_sha256)):
+            LOGGER.warning("Index for %s is stale; skipping compaction", corpus_path)
+            return False
+        start = time.perf_counter()
+        log, vocab, _ = _load_state(corpus_path)
+        files = [(path.name, 0)] + [(entry["file"], entry["first_row"]) for entry in log["segments"]]
+        lengths, terms, doc_ids, tfs = [], [], [], []
+        for name, first_row in files:
+            with np.load(path.with_name(name)) as data:
+                term_ptr = _pad_term_ptr(data["term_ptr"], len(vocab))
+                lengths.append(data["doc_lengths"])
+                terms.append(np.repeat(np.arange(len(vocab), dtype=np.int64), np.diff(term_ptr)))
+                doc_ids.append(data["doc_ids"].astype(np.int64) + first_row)
+                tfs.append(data["tfs"])
+        terms = np.concatenate(terms)
+        # Stable: within a term, postings stay in part order, i.e. ascending rows.
+        order = np.argsort(terms, kind="stable")
+        term_ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocab)), out=term_ptr[1:])
+        merged = BM25Index(
+            vocab, np.concatenate(lengths), term_ptr, np.concatenate(doc_ids)[order], np.concatenate(tfs)[order]
+        )
+
+        # Appends from any process wait on the lock, so the segment log is still ``log``.
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_vocab = merged.save(tmp_path)
+        vocab_path = path.with_name(path.name + ".vocab.json")
+        os.replace(tmp_vocab, vocab_path)
+        os.replace(tmp_path, path)
+        # Without segments the manifest holds the corpus file hash again.
+        write_manifest(path, index_manifest(corpus_path), outputs=_index_outputs(corpus_path, None))
+        remove_segments(corpus_path)
+    LOGGER.info(
+        "Compacted %s segments into %s (%s docs) in %.2fs",
+        len(log["segments"]),
+        path,
+        merged.n_docs,
+        time.perf_counter() - start,
+    )
+    return True
+
+
+def compact_in_background(corpus_path: str | Path) -> threading.Thread:
+    """Run ``compact`` in a thread; queries keep using the loaded segments meanwhile.
+
+    The thread is not a daemon, so a short-lived script finishes the compaction
+    before exiting.
+    """
+
+    def run() -> None:
+        try:
+            compact(corpus_path)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("Compaction of %s failed", corpus_path)
+
+    thread = threading.Thread(target=run, name="bio_rag-compaction")
+    thread.start()
+    return thread
@@ -0,0 +1,332 @@
+"""Long-running retrieval service with micro-batched BM25 scoring.
+
+The server loads the corpus and index once and answers JSON requests over HTTP
+(TCP or a Unix socket):
+
+- ``POST /retrieve``  ``{"query": str, "top_k": int}`` -> ``{"documents": [...]}``
+- ``POST /snippets``  ``{"query": str, ...}`` -> ``{"documents": [...], "snippets": [...]}``
+- ``GET /stats``      queue depth, batch sizes and latency histograms
+
+Concurrent requests are gathered into micro-batches (up to ``max_batch`` queries
+or ``max_wait_ms``) and scored together with ``BM25Index.top_k_batch``.
+"""
+from __future__ import annotations
+
+import asyncio
+import http.client
+import json
+import logging
+import socket
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+
+from .retrieval import BM25Index
+from .snippets import build_candidate_snippets, score_snippets, select_top_snippets
+
+LOGGER = logging.getLogger(__name__)
+
+
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+class LatencyHistogram:
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+        self.n = 0
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000.0
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.total_ms += ms
+        self.n += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.n,
+            "mean_ms": self.total_ms / self.n if self.n else 0.0,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class MicroBatcher:
+    """Collect concurrent submissions and process them as one batch.
+
+    ``process`` receives a list of items and returns one result per item; it
+    runs on ``executor`` so the event loop keeps accepting requests meanwhile.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[List[Any]], List[Any]],
+        executor: ThreadPoolExecutor,
+        max_batch: int = 32,
+        max_wait_ms: float = 5.0,
+    ) -> None:
+        self.process = process
+        self.executor = executor
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue: "asyncio.Queue[Tuple[Any, asyncio.Future]]" = asyncio.Queue()
+        self.batch_sizes: Dict[int, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+
+    async def submit(self, item: Any) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.process, items)
+            except Exception as exc:  # pylint: disable=broad-except
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class RetrievalService:
+    """Holds the loaded corpus and index and serves batched retrieval requests."""
+
+    def __init__(
+        self,
+        corpus: List[Dict[str, str]],
+        bm25: BM25Index,
+        config: Dict[str, Any],
+        max_batch: int = 32,
+        max_wait_ms: float = 5.0,
+        workers: int = 4,
+        cache=None,
+    ) -> None:
+        self.corpus = corpus
+        self.bm25 = bm25
+        self.config = config
+        self.cache = cache
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="retrieval")
+        self.latency: Dict[str, LatencyHistogram] = {
+            "retrieve": LatencyHistogram(),
+            "snippets": LatencyHistogram(),
+            "batch": LatencyHistogram(),
+        }
+        self.batcher: Optional[MicroBatcher] = None
+
+    def retrieve_batch(self, requests: List[Tuple[str, int]]) -> List[List[Dict[str, Any]]]:
+        start = time.perf_counter()
+        ranked: List[Optional[Tuple[np.ndarray, np.ndarray]]] = [
+            self.cache.get_top_k(self.bm25, query, k) if self.cache is not None else None for query, k in requests
+        ]
+        misses = [idx for idx, hit in enumerate(ranked) if hit is None]
+        if misses:
+            top_k = max(requests[idx][1] for idx in misses)
+            queries = [self.bm25.vocab.encode_text(requests[idx][0]) for idx in misses]
+            if self.config["retrieval"].get("pruning", False):
+                computed = [self.bm25.top_k_pruned(query, top_k) for query in queries]
+            else:
+                computed = self.bm25.top_k_batch(queries, top_k)
+            for idx, (rows, scores) in zip(misses, computed):
+                query, k = requests[idx]
+                ranked[idx] = (rows[:k], scores[:k])
+                if self.cache is not None:
+                    self.cache.put_top_k(self.bm25, query, k, rows[:k], scores[:k])
+        results = []
+        for (_, k), (rows, scores) in zip(requests, ranked):
+            docs = []
+            for idx, score in zip(rows[:k], scores[:k]):
+                doc = dict(self.corpus[idx])
+                doc["score"] = float(score)
+                docs.append(doc)
+            results.append(docs)
+        self.latency["batch"].observe(time.perf_counter() - start)
+        return results
+
+    def select_snippets(self, query: str, docs: List[Dict[str, Any]], params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        snippet_cfg = self.config["snippets"]
+        candidates = build_candidate_snippets(
+            docs, int(params.get("max_sentences_per_doc", snippet_cfg["max_sentences_per_doc"]))
+        )
+        scored = score_snippets(query, candidates)
+        return select_top_snippets(
+            scored,
+            int(params.get("snippet_k", snippet_cfg["snippet_k"])),
+            float(params.get("mmr_lambda", snippet_cfg["mmr_lambda"])),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self.corpus),
+            "queue_depth": self.batcher.queue.qsize() if self.batcher else 0,
+            "batch_sizes": dict(sorted(self.batcher.batch_sizes.items())) if self.batcher else {},
+            "cache": dict(self.cache.stats) if self.cache is not None else None,
+            "latency": {name: hist.to_dict() for name, hist in self.latency.items()},
+        }
+
+    async def handle(self, method: str, path: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        if method == "GET" and path == "/stats":
+            return 200, self.stats()
+        if method != "POST" or path not in ("/retrieve", "/snippets"):
+            return 404, {"error": f"unknown endpoint {method} {path}"}
+        query = body.get("query")
+        if not isinstance(query, str):
+            return 400, {"error": "'query' must be a string"}
+        start = time.perf_counter()
+        top_k = int(body.get("top_k", self.config["retrieval"]["top_k"]))
+        docs = await self.batcher.submit((query, top_k))
+        if path == "/retrieve":
+            self.latency["retrieve"].observe(time.perf_counter() - start)
+            return 200, {"documents": docs}
+        loop = asyncio.get_running_loop()
+        snippets = await loop.run_in_executor(self.executor, self.select_snippets, query, docs, body)
+        self.latency["snippets"].observe(time.perf_counter() - start)
+        return 200, {"documents": docs, "snippets": snippets}
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                raw = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+                try:
+                    body = json.loads(raw) if raw else {}
+                    status, payload = await self.handle(method, urlparse(target).path, body)
+                except json.JSONDecodeError:
+                    status, payload = 400, {"error": "invalid JSON body"}
+                except Exception as exc:  # pylint: disable=broad-except
+                    LOGGER.exception("Request failed")
+                    status, payload = 500, {"error": str(exc)}
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                reason = http.client.responses.get(status, "")
+                writer.write(
+                    f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1")
+                    + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, unix_socket: Optional[str] = None) -> None:
+        self.batcher = MicroBatcher(self.retrieve_batch, self.executor, self.max_batch, self.max_wait_ms)
+        self.batcher.start()
+        if unix_socket:
+            server = await asyncio.start_unix_server(self._serve_connection, path=unix_socket)
+            LOGGER.info("Retrieval service listening on unix:%s", unix_socket)
+        else:
+            server = await asyncio.start_server(self._serve_connection, host, port)
+            LOGGER.info("Retrieval service listening on http://%s:%s", host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+            self.executor.shutdown(wait=False)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class RetrievalClient:
+    """Keep-alive client for the retrieval service.
+
+    ``address`` is ``http://host:port`` or ``unix:/path/to.sock``. ``retrieve``
+    has the same signature and return shape as ``retrieval.Retriever.retrieve``.
+    """
+
+    def __init__(self, address: str, timeout: float = 60.0) -> None:
+        self.address = address
+        self.timeout = timeout
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            if self.address.startswith("unix:"):
+                self._conn = _UnixHTTPConnection(self.address[len("unix:") :], self.timeout)
+            else:
+                parsed = urlparse(self.address)
+                self._conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=self.timeout)
+        return self._conn
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        body = json.dumps(payload or {}).encode("utf-8")
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+                response = conn.getresponse()
+                data = json.loads(response.read() or b"{}")
+                break
+            except (ConnectionError, http.client.HTTPException):
+                self.close()
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise RuntimeError(f"Retrieval service error {response.status}: {data.get('error')}")
+        return data
+
+    def retrieve(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
+        return self._request("POST", "/retrieve", {"query": query, "top_k": top_k})["documents"]
+
+    def snippets(self, query: str, top_k: int = 10, **params: Any) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        data = self._request("POST", "/snippets", {"query": query, "top_k": top_k, **params})
+        return data["documents"], data["snippets"]
+
+    def stats(self) -> Dict[str, Any]:
+        return self._request("GET", "/stats")
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,445 @@
+"""BM25 retrieval over a corpus split into PMID-range shards.
+
+``build_shards`` splits ``corpus.jsonl`` into PMID ranges and indexes each
+range in its own process. Vocabularies and collection statistics (N, average
+document length, document frequencies) are then merged, with term ids assigned
+in the order a single index would assign them, so every shard scores documents
+exactly like ``build_bm25`` over the whole corpus. Shards remember the corpus
+row of each document; partial top-k lists merged on (-score, row) give the same
+ranking and tie-break as one index.
+
+Each shard is served by a worker process (``serve_shard``) speaking
+``multiprocessing.connection``, either started locally by ``ShardedRetriever``
+or on other hosts with ``11_serve_shard.py``.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .corpus import load_corpus
+from .manifest import is_up_to_date, stage_manifest, write_manifest
+from .retrieval import BM25Index, CorpusStats, build_postings
+from .utils import ensure_dir, iter_jsonl, read_json, safe_get_env
+from .vocab import TokenizedCorpus, Vocabulary
+
+LOGGER = logging.getLogger(__name__)
+
+
+SHARDS_FILE = "shards.json"
+VOCAB_FILE = "vocab.json"
+STATS_FILE = "stats.npz"
+
+AUTHKEY_ENV = "BIO_RAG_SHARD_KEY"
+
+
+def shard_dir_for(corpus_path: str | Path) -> Path:
+    corpus_path = Path(corpus_path)
+    return corpus_path.with_name(corpus_path.name + ".shards")
+
+
+def default_authkey() -> bytes:
+    """Shared key of remote shard workers; there is no fallback, since connections carry pickles."""
+    key = safe_get_env(AUTHKEY_ENV)
+    if not key:
+        raise RuntimeError(f"{AUTHKEY_ENV} must be set to serve or query remote shard workers")
+    return key.encode("utf-8")
+
+
+def _pmid_key(pmid: Any) -> int:
+    """Numeric PMID; anything else sorts first."""
+    try:
+        return int(pmid)
+    except (TypeError, ValueError):
+        return -1
+
+
+def _shard_name(shard: int) -> str:
+    return f"shard-{shard:03d}"
+
+
+# Building
+
+
+def split_corpus(
+    corpus_path: str | Path,
+    out_dir: str | Path,
+    n_shards: int,
+) -> Tuple[List[Dict[str, Any]], List[np.ndarray]]:
+    """Write one JSONL per PMID range and return shard descriptions plus the corpus rows of each shard.
+
+    Boundaries are PMID quantiles, so shards hold about equal numbers of
+    documents. The corpus is streamed twice and never held in memory.
+    """
+    out_dir = Path(out_dir)
+    pmids = np.fromiter((_pmid_key(row.get("pmid")) for row in iter_jsonl(corpus_path)), dtype=np.int64)
+    if not len(pmids):
+        raise ValueError(f"{corpus_path} contains no documents")
+    n_shards = max(1, min(n_shards, len(pmids)))
+    ordered = np.sort(pmids)
+    bounds = np.unique(ordered[np.arange(1, n_shards) * len(pmids) // n_shards])
+    shard_of_row = np.searchsorted(bounds, pmids, side="right")
+
+    names = [_shard_name(shard) for shard in range(len(bounds) + 1)]
+    handles = [open(out_dir / f"{name}.jsonl", "w", encoding="utf-8") for name in names]
+    try:
+        with open(corpus_path, "r", encoding="utf-8") as source:
+            row = 0
+            # Same line filter as ``iter_jsonl`` so rows match ``load_corpus``.
+            for line in source:
+                if not line.strip():
+                    continue
+                handles[shard_of_row[row]].write(line.strip() + "\n")
+                row += 1
+    finally:
+        for handle in handles:
+            handle.close()
+
+    shards, rows = [], []
+    for shard, name in enumerate(names):
+        shard_rows = np.flatnonzero(shard_of_row == shard)
+        shard_pmids = pmids[shard_rows]
+        shards.append(
+            {
+                "shard": shard,
+                "pmid_min": int(shard_pmids.min()),
+                "pmid_max": int(shard_pmids.max()),
+                "n_docs": int(len(shard_rows)),
+                "docs": f"{name}.jsonl",
+                "index": f"{name}.bm25.npz",
+            }
+        )
+        rows.append(shard_rows)
+    return shards, rows
+
+
+def _index_shard(task: Tuple[str, Dict[str, Any], np.ndarray]) -> Dict[str, Any]:
+    """Pool worker: tokenize one shard with a local vocabulary and record where each token first occurs."""
+    out_dir, shard, rows = task
+    out_dir = Path(out_dir)
+    vocab = Vocabulary()
+    texts = [doc.get("text") or "" for doc in iter_jsonl(out_dir / shard["docs"])]
+    tokenized = TokenizedCorpus.from_texts(texts, vocab)
+    term_ptr, doc_ids, tfs = build_postings(tokenized, len(vocab))
+    # Local ids follow first appearance, so id j first occurs at its first index.
+    _, first = np.unique(tokenized.ids, return_index=True)
+    doc = np.searchsorted(tokenized.offsets, first, side="right") - 1
+    local_path = out_dir / f"{_shard_name(shard['shard'])}.local.npz"
+    with open(local_path, "wb") as handle:
+        np.savez(
+            handle,
+            doc_lengths=tokenized.lengths,
+            term_ptr=term_ptr,
+            doc_ids=doc_ids,
+            tfs=tfs,
+            first_row=rows[doc],
+            first_pos=first - tokenized.offsets[doc],
+        )
+    vocab.save(local_path.with_suffix(".vocab.json"))
+    return {"shard": shard["shard"], "total_length": int(tokenized.lengths.sum())}
+
+
+def _remap_shard(task: Tuple[str, Dict[str, Any], np.ndarray, np.ndarray, int]) -> np.ndarray:
+    """Pool worker: rewrite a shard's postings with shared term ids; returns its document frequencies."""
+    out_dir, shard, rows, local_to_global, n_terms = task
+    out_dir = Path(out_dir)
+    local_path = out_dir / f"{_shard_name(shard['shard'])}.local.npz"
+    with np.load(local_path) as data:
+        doc_lengths, term_ptr, doc_ids, tfs = data["doc_lengths"], data["term_ptr"], data["doc_ids"], data["tfs"]
+    terms = local_to_global[np.repeat(np.arange(len(term_ptr) - 1), np.diff(term_ptr))]
+    order = np.lexsort((doc_ids, terms))
+    doc_freqs = np.bincount(terms, minlength=n_terms)
+    global_ptr = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(doc_freqs, out=global_ptr[1:])
+    with open(out_dir / shard["index"], "wb") as handle:
+        np.savez(
+            handle, doc_lengths=doc_lengths, term_ptr=global_ptr, doc_ids=doc_ids[order], tfs=tfs[order], rows=rows
+        )
+    local_path.with_suffix(".vocab.json").unlink()
+    local_path.unlink()
+    return doc_freqs
+
+
+def merge_vocabularies(out_dir: Path, shards: Sequence[Dict[str, Any]]) -> Tuple[Vocabulary, List[np.ndarray]]:
+    """Shared vocabulary ordered by first occurrence in the corpus, plus each shard's local-to-shared id map."""
+    first: Dict[str, int] = {}
+    local_tokens = []
+    for shard in shards:
+        local_path = out_dir / f"{_shard_name(shard['shard'])}.local.npz"
+        with open(local_path.with_suffix(".vocab.json"), "r", encoding="utf-8") as handle:
+            tokens = json.load(handle)
+        with np.load(local_path) as data:
+            # (row, position) packed into one sortable integer.
+            keys = (data["first_row"].astype(np.int64) << 24) | data["first_pos"].astype(np.int64)
+        for token, key in zip(tokens, keys.tolist()):
+            if key < first.get(token, key + 1):
+                first[token] = key
+        local_tokens.append(tokens)
+    vocab = Vocabulary(sorted(first, key=first.__getitem__))
+    lookup = vocab.token_to_id
+    maps = [np.array([lookup[token] for token in tokens], dtype=np.int64) for tokens in local_tokens]
+    return vocab, maps
+
+
+def build_shards(
+    corpus_path: str | Path,
+    out_dir: str | Path,
+    n_shards: int,
+    workers: Optional[int] = None,
+    force: bool = False,
+) -> Dict[str, Any]:
+    """Split and index ``corpus_path`` into ``out_dir``; reuses an up-to-date build."""
+    out_dir = Path(out_dir)
+    layout_path = out_dir / SHARDS_FILE
+    manifest = stage_manifest(
+        "bm25_shards",
+        {"corpus": corpus_path},
+        modules=["retrieval", "shards", "utils", "vocab"],
+        params={"n_shards": n_shards},
+    )
+    if not force and is_up_to_date(layout_path, manifest):
+        LOGGER.info("Shards in %s are up to date", out_dir)
+        return read_json(layout_path)
+    ensure_dir(out_dir)
+
+    shards, rows = split_corpus(corpus_path, out_dir, n_shards)
+    LOGGER.info("Split %s documents into %s shards", sum(shard["n_docs"] for shard in shards), len(shards))
+    with multiprocessing.get_context("spawn").Pool(min(workers or os.cpu_count() or 1, len(shards))) as pool:
+        lengths = pool.map(_index_shard, [(str(out_dir), shard, shard_rows) for shard, shard_rows in zip(shards, rows)])
+        vocab, maps = merge_vocabularies(out_dir, shards)
+        vocab.save(out_dir / VOCAB_FILE)
+        doc_freqs = np.zeros(len(vocab), dtype=np.int64)
+        tasks = [(str(out_dir), shard, shard_rows, m, len(vocab)) for shard, shard_rows, m in zip(shards, rows, maps)]
+        for shard_freqs in pool.imap_unordered(_remap_shard, tasks):
+            doc_freqs += shard_freqs
+
+    stats = CorpusStats(sum(len(r) for r in rows), sum(item["total_length"] for item in lengths), doc_freqs)
+    stats.save(out_dir / STATS_FILE)
+    layout = {"corpus": str(corpus_path), "n_docs": stats.n_docs, "n_terms": len(vocab), "shards": shards}
+    with open(layout_path, "w", encoding="utf-8") as handle:
+        json.dump(layout, handle, indent=2)
+    outputs = [layout_path, out_dir / VOCAB_FILE, out_dir / STATS_FILE]
+    outputs += [out_dir / shard[key] for shard in shards for key in ("docs", "index")]
+    write_manifest(layout_path, manifest, outputs=outputs)
+    LOGGER.info("Indexed %s shards (%s terms) in %s", len(shards), len(vocab), out_dir)
+    return layout
+
+
+# Serving
+
+
+def load_shard(
+    shard_dir: str | Path,
+    shard: int,
+    k1: float = 1.2,
+    b: float = 0.75,
+) -> Tuple[BM25Index, np.ndarray, List[Dict[str, str]]]:
+    """Index, corpus rows and documents of one shard, weighted with the collection statistics."""
+    shard_dir = Path(shard_dir)
+    meta = read_json(shard_dir / SHARDS_FILE)["shards"][shard]
+    stats = CorpusStats.load(shard_dir / STATS_FILE)
+    with np.load(shard_dir / meta["index"]) as data:
+        # Workers receive queries as shared term ids, so they need no vocabulary.
+        bm25 = BM25Index(
+            Vocabulary(), data["doc_lengths"], data["term_ptr"], data["doc_ids"], data["tfs"], k1=k1, b=b, stats=stats
+        )
+        rows = data["rows"]
+    return bm25, rows, load_corpus(str(shard_dir / meta["docs"]))
+
+
+def _serve_client(
+    conn: Connection,
+    bm25: BM25Index,
+    rows: np.ndarray,
+    docs: List[Dict[str, str]],
+    pruning: bool,
+) -> None:
+    try:
+        while True:
+            try:
+                command, *params = conn.recv()
+            except EOFError:
+                break
+            try:
+                if command == "top_k":
+                    queries, top_k = params
+                    result = []
+                    for query_ids in queries:
+                        local, scores = bm25.top_k(query_ids, top_k, pruning=pruning)
+                        result.append((rows[local], scores, [docs[idx] for idx in local]))
+                elif command == "info":
+                    result = {"n_docs": bm25.n_docs, "k1": bm25.k1, "b": bm25.b}
+                else:
+                    raise ValueError(f"unknown command {command!r}")
+                conn.send(("ok", result))
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.exception("Shard request failed")
+                conn.send(("error", repr(exc)))
+    finally:
+        conn.close()
+
+
+def serve_shard(
+    shard_dir: str | Path,
+    shard: int,
+    address: Any = None,
+    authkey: Optional[bytes] = None,
+    k1: float = 1.2,
+    b: float = 0.75,
+    pruning: bool = False,
+    ready: Optional[Connection] = None,
+) -> None:
+    """Answer top-k requests for one shard until killed; one thread per client connection.
+
+    ``address`` is a ``(host, port)`` pair or a Unix socket path (``None`` picks
+    a fresh local socket). The bound address is sent through ``ready`` once the
+    shard is loaded.
+    """
+    bm25, rows, docs = load_shard(shard_dir, shard, k1, b)
+    with Listener(address, authkey=authkey or default_authkey()) as listener:
+        LOGGER.info("Shard %s (%s docs) listening on %s", shard, bm25.n_docs, listener.address)
+        if ready is not None:
+            ready.send(listener.address)
+            ready.close()
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError) as exc:
+                # Failed handshakes (wrong authkey, port scans) must not stop the shard.
+                LOGGER.warning("Rejected shard connection: %s", exc)
+                continue
+            threading.Thread(target=_serve_client, args=(conn, bm25, rows, docs, pruning), daemon=True).start()
+
+
+def parse_address(address: str) -> Any:
+    """``host:port`` -> ``(host, port)``; anything containing ``/`` is a Unix socket path."""
+    if "/" in address:
+        return address
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+class ShardedRetriever:
+    """Retrieval fanned out to shard workers; same interface as ``retrieval.Retriever``.
+
+    Without ``addresses`` one local worker process per shard is started (and
+    stopped by ``close``); otherwise ``addresses`` lists running workers in
+    shard order.
+    """
+
+    def __init__(
+        self,
+        shard_dir: str | Path,
+        addresses: Optional[Sequence[str]] = None,
+        authkey: Optional[bytes] = None,
+        k1: float = 1.2,
+        b: float = 0.75,
+        pruning: bool = False,
+    ) -> None:
+        self.shard_dir = Path(shard_dir)
+        layout = read_json(self.shard_dir / SHARDS_FILE)
+        self.vocab = Vocabulary.load(self.shard_dir / VOCAB_FILE)
+        self.processes: List[multiprocessing.process.BaseProcess] = []
+        if addresses is None:
+            self.authkey = authkey or os.urandom(16)
+            resolved = self._start_local(len(layout["shards"]), k1, b, pruning)
+        else:
+            if len(addresses) != len(layout["shards"]):
+                raise ValueError(f"expected {len(layout['shards'])} shard addresses, got {len(addresses)}")
+            self.authkey = authkey or default_authkey()
+            resolved = [parse_address(address) for address in addresses]
+        self.connections = [Client(address, authkey=self.authkey) for address in resolved]
+
+    def _start_local(self, n_shards: int, k1: float, b: float, pruning: bool) -> List[Any]:
+        context = multiprocessing.get_context("spawn")
+        pipes = []
+        for shard in range(n_shards):
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=serve_shard,
+                args=(self.shard_dir, shard, None, self.authkey, k1, b, pruning, sender),
+                daemon=True,
+                name=f"bio_rag-shard-{shard}",
+            )
+            process.start()
+            sender.close()
+            self.processes.append(process)
+            pipes.append(receiver)
+        addresses = []
+        for shard, receiver in enumerate(pipes):
+            try:
+                addresses.append(receiver.recv())
+            except EOFError:
+                self.close()
+                raise RuntimeError(f"shard worker {shard} exited during startup") from None
+        LOGGER.info("Started %s local shard workers", n_shards)
+        return addresses
+
+    def _call(self, command: str, *params: Any) -> List[Any]:
+        for conn in self.connections:
+            conn.send((command, *params))
+        replies = []
+        for shard, conn in enumerate(self.connections):
+            status, payload = conn.recv()
+            if status != "ok":
+                raise RuntimeError(f"shard {shard} failed: {payload}")
+            replies.append(payload)
+        return replies
+
+    def retrieve_batch(self, queries: Sequence[str], top_k: int = 10) -> List[List[Dict[str, Any]]]:
+        """Every shard ranks all queries; partial lists merge on (-score, corpus row)."""
+        encoded = [self.vocab.encode_text(query) for query in queries]
+        partials = self._call("top_k", encoded, top_k)
+        results = []
+        for idx in range(len(queries)):
+            rows = np.concatenate([partial[idx][0] for partial in partials])
+            scores = np.concatenate([partial[idx][1] for partial in partials])
+            docs = [doc for partial in partials for doc in partial[idx][2]]
+            merged = []
+            for pos in np.lexsort((rows, -scores))[:top_k]:
+                doc = dict(docs[pos])
+                doc["score"] = float(scores[pos])
+                merged.append(doc)
+            results.append(merged)
+        return results
+
+    def retrieve(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
+        return self.retrieve_batch([query], top_k)[0]
+
+    def info(self) -> List[Dict[str, Any]]:
+        return self._call("info")
+
+    def close(self) -> None:
+        for conn in getattr(self, "connections", []):
+            conn.close()
+        self.connections = []
+        for process in self.processes:
+            process.terminate()
+            process.join()
+        self.processes = []
+
+    def __enter__(self) -> "ShardedRetriever":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def sharded_retriever_from_config(shard_dir: str | Path, config: Dict[str, Any]) -> ShardedRetriever:
+    """Workers at ``shards.addresses`` when configured, local worker processes otherwise."""
+    addresses = config.get("shards", {}).get("addresses") or None
+    return ShardedRetriever(
+        shard_dir,
+        addresses,
+        k1=config["retrieval"]["bm25_k1"],
+        b=config["retrieval"]["bm25_b"],
+        pruning=config["retrieval"].get("pruning", False),
+    )
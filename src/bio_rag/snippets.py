@@ -2,14 +2,15 @@
 from __future__ import annotations
 
 import logging
-from typing import Dict, List, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
 
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
 from .utils import normalize_whitespace, simple_sentence_split
 
+if TYPE_CHECKING:
+    from .dedup import DuplicateMap
+
 LOGGER = logging.getLogger(__name__)
 
 
@@ -20,10 +21,11 @@ def build_candidate_snippets(
     snippets: List[Dict[str, str]] = []
     for doc in docs:
         sentences = simple_sentence_split(doc.get("text") or "")[:max_sentences_per_doc]
-        for sent in sentences:
+        for sentence_id, sent in enumerate(sentences):
             snippets.append(
                 {
                     "pmid": doc.get("pmid"),
+                    "sentence_id": sentence_id,
                     "sentence": normalize_whitespace(sent),
                     "doc_score": doc.get("score", 0.0),
                 }
@@ -32,6 +34,9 @@ def build_candidate_snippets(
 
 
 def score_snippets(query: str, snippets: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
     if not snippets:
         return []
     texts = [query] + [s["sentence"] for s in snippets]
@@ -45,11 +50,30 @@ def score_snippets(query: str, snippets: List[Dict[str, str]]) -> List[Dict[str,
     return snippets
 
 
+def collapse_duplicate_snippets(snippets: List[Dict[str, Any]], duplicates: "DuplicateMap") -> List[Dict[str, Any]]:
+    """Keep the best-ranked snippet of each near-duplicate sentence group, in candidate order.
+
+    Sentences map to their group through ``duplicates.canonical_sentence``;
+    ranking follows ``select_top_snippets`` (score, then document score).
+    """
+    best: Dict[Tuple[str, int], Tuple[Tuple[float, float], int]] = {}
+    for idx, snippet in enumerate(snippets):
+        key = duplicates.canonical_sentence(snippet["pmid"], snippet["sentence_id"])
+        rank = (snippet.get("score", 0.0), snippet.get("doc_score", 0.0))
+        if key not in best or rank > best[key][0]:
+            best[key] = (rank, idx)
+    kept = sorted(idx for _, idx in best.values())
+    return [snippets[idx] for idx in kept]
+
+
 def select_top_snippets(
     snippets: List[Dict[str, str]],
     snippet_k: int = 10,
     mmr_lambda: float = 0.7,
 ) -> List[Dict[str, str]]:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
     if not snippets:
         return []
     ranked = sorted(snippets, key=lambda s: (s.get("score", 0.0), s.get("doc_score", 0.0)), reverse=True)
@@ -3,10 +3,12 @@ from __future__ import annotations
 
 import logging
 import random
-from typing import Dict, Iterable, List, Tuple
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
 
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from .llm import AsyncLLMClient
+
+if TYPE_CHECKING:
+    from .dedup import DuplicateMap
 
 LOGGER = logging.getLogger(__name__)
 
@@ -26,7 +28,15 @@ def inject_noise(
     return retrieved + noise
 
 
-def detect_conflicts(snippets: List[Dict[str, str]], threshold: float = 0.3) -> List[Tuple[Dict[str, str], Dict[str, str]]]:
+def detect_conflicts(
+    snippets: List[Dict[str, str]],
+    threshold: float = 0.3,
+    duplicates: Optional[DuplicateMap] = None,
+) -> List[Tuple[Dict[str, str], Dict[str, str]]]:
+    """Similar snippet pairs from different records; pairs of near-duplicates in ``duplicates`` are skipped."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
     if len(snippets) < 2:
         return []
     texts = [s["sentence"] for s in snippets]
@@ -37,10 +47,42 @@ def detect_conflicts(snippets: List[Dict[str, str]], threshold: float = 0.3) ->
     for i in range(len(snippets)):
         for j in range(i + 1, len(snippets)):
             if sim[i, j] > threshold and snippets[i]["pmid"] != snippets[j]["pmid"]:
+                if duplicates is not None and duplicates.same_snippet(snippets[i], snippets[j]):
+                    continue
                 conflicts.append((snippets[i], snippets[j]))
     return conflicts
 
 
+def conflict_judge_messages(snippet_a: str, snippet_b: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": "Decide if the two snippets are contradictory. Reply JSON {conflict: true|false}."},
+        {"role": "user", "content": f"Snippet A: {snippet_a}\nSnippet B: {snippet_b}"},
+    ]
+
+
+def judge_conflicts(
+    pairs: Sequence[Tuple[Dict[str, str], Dict[str, str]]],
+    client: AsyncLLMClient,
+) -> List[bool]:
+    """Ask the LLM judge about all candidate pairs at once.
+
+    Pairs whose request fails, or whose reply is not a JSON object, are kept as
+    conflicts, matching the similarity-only behaviour when no judge is configured.
+    """
+    conversations = [conflict_judge_messages(a["sentence"], b["sentence"]) for a, b in pairs]
+    verdicts = []
+    for result in client.complete_json_batch(conversations, {"type": "json_object"}):
+        if isinstance(result, Exception):
+            LOGGER.warning("LLM conflict judge failed: %s", result)
+            verdicts.append(True)
+        elif not isinstance(result, dict):
+            LOGGER.warning("LLM conflict judge returned %s instead of a JSON object", type(result).__name__)
+            verdicts.append(True)
+        else:
+            verdicts.append(bool(result.get("conflict", False)))
+    return verdicts
+
+
 def remove_supporting_snippets(snippets: List[Dict[str, str]], remove_top_n: int = 2) -> List[Dict[str, str]]:
     ranked = sorted(snippets, key=lambda s: s.get("score", 0.0), reverse=True)
     return ranked[remove_top_n:]
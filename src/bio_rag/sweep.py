@@ -0,0 +1,119 @@
+"""BM25 hyperparameter sweeps scored directly against gold PMIDs.
+
+The index (raw term frequencies, document lengths, IDF) is built once; each
+(k1, b) point only recomputes the posting weights and re-ranks all questions in
+batches. Rankings for the largest ``top_k`` are computed once per point and
+truncated for the smaller cut-offs.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from itertools import product
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .instrumentation import NULL_INSTRUMENTATION, Instrumentation
+from .retrieval import BM25Index
+
+LOGGER = logging.getLogger(__name__)
+
+
+DEFAULT_K1 = [0.4, 0.6, 0.8, 1.0, 1.2, 1.4, 1.6, 1.8, 2.0, 2.4]
+DEFAULT_B = [0.3, 0.5, 0.65, 0.75, 0.9]
+DEFAULT_TOP_K = [10, 50, 100]
+
+
+def gold_qrels(questions: Iterable[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Question id -> gold PMIDs, parsed like ``evaluation.evaluate_run``; questions without gold map to []."""
+    qrels = {}
+    for question in questions:
+        pmids = [doc.split("/")[-1] for doc in question.get("documents") or [] if isinstance(doc, str)]
+        qrels[question["id"]] = sorted(set(pmids))
+    return qrels
+
+
+def hit_matrix(ranked_rows: np.ndarray, gold_rows: Sequence[np.ndarray]) -> np.ndarray:
+    """(questions x top_k) count of gold PMIDs each ranked document covers.
+
+    ``gold_rows`` may repeat a row when several gold PMIDs were folded into one
+    canonical record; counts above one only matter for recall.
+    """
+    hits = np.zeros(ranked_rows.shape, dtype=np.int64)
+    for idx, gold in enumerate(gold_rows):
+        rows, counts = np.unique(gold, return_counts=True)
+        at = np.searchsorted(rows, ranked_rows[idx])
+        found = at < len(rows)
+        found[found] = rows[at[found]] == ranked_rows[idx][found]
+        hits[idx][found] = counts[at[found]]
+    return hits
+
+
+def ranking_metrics(hits: np.ndarray, n_gold: np.ndarray, top_k: int) -> Dict[str, float]:
+    """Mean recall@k and MAP@k; AP@k is normalized by ``min(n_gold, k)``. Questions without gold score 0."""
+    counts = hits[:, :top_k].astype(np.float64)
+    hits = (counts > 0).astype(np.float64)
+    has_gold = n_gold > 0
+    recall = np.zeros(len(n_gold))
+    recall[has_gold] = counts[has_gold].sum(axis=1) / n_gold[has_gold]
+    precision_at = np.cumsum(hits, axis=1) / np.arange(1, hits.shape[1] + 1)
+    average_precision = np.zeros(len(n_gold))
+    average_precision[has_gold] = (precision_at * hits)[has_gold].sum(axis=1) / np.minimum(n_gold[has_gold], top_k)
+    return {f"recall@{top_k}": float(recall.mean()), f"map@{top_k}": float(average_precision.mean())}
+
+
+def sweep_bm25(
+    bm25: BM25Index,
+    corpus: Sequence[Dict[str, str]],
+    questions: Iterable[Dict[str, Any]],
+    k1_values: Sequence[float] = DEFAULT_K1,
+    b_values: Sequence[float] = DEFAULT_B,
+    top_k_values: Sequence[int] = DEFAULT_TOP_K,
+    inst: Instrumentation = NULL_INSTRUMENTATION,
+) -> List[Dict[str, Any]]:
+    """One row per (k1, b) with recall and MAP at every ``top_k``.
+
+    Gold PMIDs missing from the corpus still count in the denominators, gold
+    PMIDs listed under a record's ``duplicate_pmids`` are found through that
+    record, and questions without gold score 0, so recall matches what
+    ``07_evaluate_runs.py`` reports for the same run.
+    """
+    questions = list(questions)
+    qrels = gold_qrels(questions)
+    bodies = {question["id"]: question["body"] for question in questions}
+    qids = list(bodies)
+    if not any(qrels[qid] for qid in qids):
+        LOGGER.warning("No questions with gold documents; nothing to sweep")
+        return []
+
+    row_of_pmid = {
+        pmid: row for row, doc in enumerate(corpus) for pmid in [doc.get("pmid"), *(doc.get("duplicate_pmids") or [])]
+    }
+    gold_rows = [np.array([row_of_pmid[p] for p in qrels[qid] if p in row_of_pmid], dtype=np.int64) for qid in qids]
+    n_gold = np.array([len(qrels[qid]) for qid in qids], dtype=np.float64)
+    queries = [bm25.vocab.encode_text(bodies[qid]) for qid in qids]
+    max_k = max(top_k_values)
+
+    results = []
+    for k1, b in product(k1_values, b_values):
+        start = time.perf_counter()
+        with inst.stage("reweight"):
+            index = bm25.reweighted(k1, b)
+        with inst.stage("retrieve"):
+            ranked = np.full((len(qids), max_k), -1, dtype=np.int64)
+            for idx, (rows, _) in enumerate(index.top_k_batch(queries, max_k)):
+                ranked[idx, : len(rows)] = rows
+        with inst.stage("score"):
+            hits = hit_matrix(ranked, gold_rows)
+            row = {"k1": k1, "b": b}
+            for top_k in sorted(top_k_values):
+                row.update(ranking_metrics(hits, n_gold, top_k))
+        row["seconds"] = round(time.perf_counter() - start, 3)
+        results.append(row)
+        LOGGER.info("k1=%s b=%s %s", k1, b, {key: round(value, 4) for key, value in row.items() if "@" in key})
+    return results
+
+
+def best_setting(results: List[Dict[str, Any]], metric: str) -> Optional[Dict[str, Any]]:
+    return max(results, key=lambda row: row[metric]) if results else None
@@ -7,7 +7,7 @@ import os
 import re
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Iterable, List
+from typing import Any, Dict, Iterable, Iterator, List
 
 
 def setup_logging(level: str = "INFO") -> None:
@@ -33,15 +33,17 @@ def write_jsonl(path: str | Path, rows: Iterable[Dict[str, Any]]) -> None:
             handle.write(json.dumps(row, ensure_ascii=False) + "\n")
 
 
-def read_jsonl(path: str | Path) -> List[Dict[str, Any]]:
-    rows: List[Dict[str, Any]] = []
+def iter_jsonl(path: str | Path) -> Iterator[Dict[str, Any]]:
     with open(path, "r", encoding="utf-8") as handle:
         for line in handle:
             line = line.strip()
             if not line:
                 continue
-            rows.append(json.loads(line))
-    return rows
+            yield json.loads(line)
+
+
+def read_jsonl(path: str | Path) -> List[Dict[str, Any]]:
+    return list(iter_jsonl(path))
 
 
 def ensure_dir(path: str | Path) -> None:
@@ -77,5 +79,8 @@ def safe_get_env(key: str, default: str | None = None) -> str | None:
     return os.getenv(key, default)
 
 
+TOKEN_RE = re.compile(r"[A-Za-z0-9]+")
+
+
 def tokenize(text: str) -> List[str]:
-    return re.findall(r"[A-Za-z0-9]+", text.lower())
+    return TOKEN_RE.findall(text.lower())
@@ -0,0 +1,103 @@
+"""Interned token vocabulary and flat token-id corpus storage."""
+from __future__ import annotations
+
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .utils import TOKEN_RE
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Vocabulary:
+    """Map lowercase alphanumeric tokens to dense int32 ids."""
+
+    def __init__(self, tokens: Optional[Iterable[str]] = None) -> None:
+        self.token_to_id: Dict[str, int] = {}
+        self.id_to_token: List[str] = []
+        for token in tokens or []:
+            self.add(token)
+
+    def __len__(self) -> int:
+        return len(self.id_to_token)
+
+    def __contains__(self, token: str) -> bool:
+        return token in self.token_to_id
+
+    def add(self, token: str) -> int:
+        token_id = self.token_to_id.get(token)
+        if token_id is None:
+            token_id = len(self.id_to_token)
+            self.token_to_id[token] = token_id
+            self.id_to_token.append(token)
+        return token_id
+
+    def encode_text(self, text: str, grow: bool = False) -> np.ndarray:
+        """Token ids for ``text``; unknown tokens are dropped unless ``grow`` is set."""
+        tokens = TOKEN_RE.findall((text or "").lower())
+        if grow:
+            return np.fromiter((self.add(token) for token in tokens), dtype=np.int32, count=len(tokens))
+        lookup = self.token_to_id
+        return np.array([lookup[token] for token in tokens if token in lookup], dtype=np.int32)
+
+    def encode_batch(self, texts: Sequence[str], grow: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """Tokenize many texts into flat ids plus int64 offsets (``len(texts) + 1``)."""
+        encoded = [self.encode_text(text, grow=grow) for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        if encoded:
+            np.cumsum([len(ids) for ids in encoded], out=offsets[1:])
+            ids = np.concatenate(encoded) if offsets[-1] else np.zeros(0, dtype=np.int32)
+        else:
+            ids = np.zeros(0, dtype=np.int32)
+        return ids.astype(np.int32, copy=False), offsets
+
+    def decode(self, ids: Iterable[int]) -> List[str]:
+        return [self.id_to_token[int(token_id)] for token_id in ids]
+
+    def save(self, path: str | Path) -> None:
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(self.id_to_token, handle, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "Vocabulary":
+        with open(path, "r", encoding="utf-8") as handle:
+            return cls(json.load(handle))
+
+
+class TokenizedCorpus:
+    """Corpus tokenization stored once as flat int32 token ids plus offsets.
+
+    Document ``i`` owns ``ids[offsets[i]:offsets[i + 1]]``.
+    """
+
+    def __init__(self, ids: np.ndarray, offsets: np.ndarray) -> None:
+        self.ids = np.asarray(ids, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> np.ndarray:
+        return self.ids[self.offsets[idx] : self.offsets[idx + 1]]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    @classmethod
+    def from_texts(cls, texts: Sequence[str], vocab: Vocabulary) -> "TokenizedCorpus":
+        ids, offsets = vocab.encode_batch(texts, grow=True)
+        return cls(ids, offsets)
+
+    def save(self, path: str | Path) -> None:
+        with open(path, "wb") as handle:
+            np.savez(handle, ids=self.ids, offsets=self.offsets)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "TokenizedCorpus":
+        with np.load(path) as data:
+            return cls(data["ids"], data["offsets"])